@@ -6,6 +6,7 @@ from alembic import context
 from app.core.config import settings
 from app.database import Base
 from app.models import User, Post
+from app.models.post_fts import FTS_TABLE_NAME
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -16,7 +17,8 @@ config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # 遷移在應用程式啟動時執行，不能把 app 已建立的 logger (例如慢查詢日誌) 停用
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -24,6 +26,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    # FTS5 虛擬資料表與其影子資料表 (post_fts_data 等) 由遷移手動維護，autogenerate 不要處理
+    if type_ == "table" and name.startswith(FTS_TABLE_NAME):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +54,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -61,6 +70,7 @@ def run_migrations_online() -> None:
         context.configure(
             connection=connection, 
             target_metadata=target_metadata,
+            include_object=include_object,
             render_as_batch=True
         )
         with context.begin_transaction():
@@ -0,0 +1,50 @@
+"""hot path indexes
+
+Revision ID: 3dc6118c4fc9
+Revises: 6faf805c4d1b
+Create Date: 2026-10-18 13:40:07.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3dc6118c4fc9'
+down_revision: Union[str, Sequence[str], None] = '6faf805c4d1b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_parent_id_createdDateTime', ['parent_id', 'createdDateTime', 'id'], unique=False)
+        batch_op.create_index('ix_post_owner_id_createdDateTime', ['owner_id', 'createdDateTime', 'id'], unique=False)
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.create_index('ix_like_post_id', ['post_id'], unique=False)
+
+    with op.batch_alter_table('blacklist', schema=None) as batch_op:
+        batch_op.create_index('ix_blacklist_blocked_user_id', ['blocked_user_id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_createdDateTime', ['createdDateTime'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_createdDateTime')
+
+    with op.batch_alter_table('blacklist', schema=None) as batch_op:
+        batch_op.drop_index('ix_blacklist_blocked_user_id')
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.drop_index('ix_like_post_id')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_owner_id_createdDateTime')
+        batch_op.drop_index('ix_post_parent_id_createdDateTime')
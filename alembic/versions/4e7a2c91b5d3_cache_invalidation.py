@@ -0,0 +1,42 @@
+"""cache invalidation log
+
+Revision ID: 4e7a2c91b5d3
+Revises: 9b1f3c7d2e84
+Create Date: 2026-10-18 21:12:44.302915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a2c91b5d3'
+down_revision: Union[str, Sequence[str], None] = '9b1f3c7d2e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cache_invalidation',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('cache', sa.String(length=32), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('origin', sa.String(length=32), nullable=False),
+    sa.Column('createdDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='建立時間'),
+    sa.Column('updatedDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='最後更新時間'),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('cache_invalidation', schema=None) as batch_op:
+        batch_op.create_index('ix_cache_invalidation_createdDateTime', ['createdDateTime'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('cache_invalidation', schema=None) as batch_op:
+        batch_op.drop_index('ix_cache_invalidation_createdDateTime')
+
+    op.drop_table('cache_invalidation')
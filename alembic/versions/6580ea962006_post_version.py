@@ -0,0 +1,30 @@
+"""post version
+
+Revision ID: 6580ea962006
+Revises: 3dc6118c4fc9
+Create Date: 2026-10-18 15:02:44.671209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6580ea962006'
+down_revision: Union[str, Sequence[str], None] = '3dc6118c4fc9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False, comment='內容版本 (ETag 用)'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,36 @@
+"""post likes_count
+
+Revision ID: 6faf805c4d1b
+Revises: cb056a44bffd
+Create Date: 2026-10-18 10:12:31.402715
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6faf805c4d1b'
+down_revision: Union[str, Sequence[str], None] = 'cb056a44bffd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False, comment='按讚數 (由 toggle_like 維護)'))
+
+    # 依現有的按讚紀錄回填計數
+    op.execute(
+        'UPDATE post SET likes_count = '
+        '(SELECT COUNT(*) FROM "like" WHERE "like".post_id = post.id)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('likes_count')
@@ -0,0 +1,53 @@
+"""post full-text search
+
+Revision ID: 9b1f3c7d2e84
+Revises: ece608d56cca
+Create Date: 2026-10-18 18:32:10.418263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1f3c7d2e84'
+down_revision: Union[str, Sequence[str], None] = 'ece608d56cca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # external content：索引只存分詞結果，內文仍從 post 讀取；trigram 讓中文可以做子字串搜尋
+    op.execute(
+        "CREATE VIRTUAL TABLE post_fts USING fts5("
+        "content, content='post', content_rowid='rowid', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER post_fts_ai AFTER INSERT ON post BEGIN "
+        "INSERT INTO post_fts(rowid, content) VALUES (new.rowid, new.content); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER post_fts_ad AFTER DELETE ON post BEGIN "
+        "INSERT INTO post_fts(post_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER post_fts_au AFTER UPDATE OF content ON post BEGIN "
+        "INSERT INTO post_fts(post_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+        "INSERT INTO post_fts(rowid, content) VALUES (new.rowid, new.content); "
+        "END"
+    )
+    # 為既有的貼文建立索引
+    op.execute("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS post_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS post_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS post_fts_ai")
+    op.execute("DROP TABLE IF EXISTS post_fts")
@@ -0,0 +1,37 @@
+"""like counter slots
+
+Revision ID: c3d81f6a0e57
+Revises: 4e7a2c91b5d3
+Create Date: 2026-10-18 23:05:17.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d81f6a0e57'
+down_revision: Union[str, Sequence[str], None] = '4e7a2c91b5d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('like_counter',
+    sa.Column('post_id', sa.UUID(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('likes_delta', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('version_delta', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('createdDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='建立時間'),
+    sa.Column('updatedDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='最後更新時間'),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'slot')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('like_counter')
@@ -0,0 +1,71 @@
+"""follow graph and timeline
+
+Revision ID: ece608d56cca
+Revises: 6580ea962006
+Create Date: 2026-10-18 18:05:26.988534
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ece608d56cca'
+down_revision: Union[str, Sequence[str], None] = '6580ea962006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('follow',
+    sa.Column('follower_id', sa.UUID(), nullable=False),
+    sa.Column('followee_id', sa.UUID(), nullable=False),
+    sa.Column('createdDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='建立時間'),
+    sa.Column('updatedDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='最後更新時間'),
+    sa.ForeignKeyConstraint(['followee_id'], ['user.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['follower_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('follower_id', 'followee_id')
+    )
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.create_index('ix_follow_followee_id', ['followee_id'], unique=False)
+
+    op.create_table('timeline',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('post_id', sa.UUID(), nullable=False),
+    sa.Column('author_id', sa.UUID(), nullable=False),
+    sa.Column('createdDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='建立時間'),
+    sa.Column('updatedDateTime', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False, comment='最後更新時間'),
+    sa.ForeignKeyConstraint(['author_id'], ['user.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_user_id_createdDateTime', ['user_id', 'createdDateTime', 'post_id'], unique=False)
+
+    # 尚無追蹤關係，只需把每位作者既有的主貼文回填到自己的時間軸
+    op.execute(
+        'INSERT INTO timeline (user_id, post_id, author_id, "createdDateTime", "updatedDateTime") '
+        'SELECT owner_id, id, owner_id, "createdDateTime", CURRENT_TIMESTAMP FROM post WHERE parent_id IS NULL'
+    )
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False, comment='追蹤者人數 (由 FollowService 維護)'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('followers_count')
+
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_user_id_createdDateTime')
+
+    op.drop_table('timeline')
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.drop_index('ix_follow_followee_id')
+
+    op.drop_table('follow')
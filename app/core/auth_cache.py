@@ -0,0 +1,100 @@
+import hashlib
+import time
+import uuid
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.schemas.user import UserPublic
+
+# 已解碼 Token 的快取，key 為 Token 的 SHA-256 摘要，存活到 Token 過期為止
+# 只在無狀態模式 (AUTH_STATELESS) 且使用者資料來自 Token 的 claims 時使用：
+# 這時 claims 本來就信任到 Token 過期，快取不會讓資料更舊；查 DB 的模式一律走 user_cache 的 TTL
+token_cache = LRUCache(max_entries=settings.AUTH_TOKEN_CACHE_SIZE)
+
+# 使用者資料快取 (key 為 email)，給仍需查 DB 的情況使用
+# 角色變更最多延遲 AUTH_USER_CACHE_TTL_SECONDS 才會生效 (呼叫 invalidate_user 時立即生效)
+user_cache = LRUCache(
+    max_entries=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS
+)
+
+# 被標記失效的使用者 -> 失效時間 (epoch 秒)
+# 在這之前簽發 (iat) 的 Token 不再信任其中的 claims，改回查 DB
+_revoked_at: dict[uuid.UUID, float] = {}
+
+class AuthCache:
+    @staticmethod
+    def token_digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_token_user(digest: str) -> UserPublic | None:
+        if not settings.AUTH_STATELESS:
+            return None
+        return token_cache.get(digest)
+
+    @staticmethod
+    def put_token_user(digest: str, user: UserPublic, expire_at: float) -> None:
+        """
+        expire_at 為 Token 的 exp (epoch 秒)，快取只保留到 Token 過期
+        """
+        if not settings.AUTH_STATELESS:
+            return
+        token_cache.put(digest, user, ttl=expire_at - time.time())
+
+    @staticmethod
+    def get_user(email: str) -> UserPublic | None:
+        return user_cache.get(email)
+
+    @staticmethod
+    def user_generation() -> int:
+        """
+        查 DB 前先取得，回填時交給 put_user：查詢期間使用者被標記失效就不寫入快取
+        """
+        return user_cache.generation()
+
+    @staticmethod
+    def put_user(user: UserPublic, generation: int | None = None) -> None:
+        user_cache.put(user.email, user, generation)
+
+    @staticmethod
+    def is_revoked(user_id: uuid.UUID, issued_at: float) -> bool:
+        revoked_at = _revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    @staticmethod
+    def invalidate_user(user_id: uuid.UUID) -> None:
+        """
+        使用者角色變更或被刪除時呼叫。
+        清除該使用者的快取；在此之前簽發的 Token 不再信任 claims，下次請求會重新查 DB。
+        """
+        AuthCache._revoke(user_id)
+        invalidation_bus.publish("user", user_id)
+
+    @staticmethod
+    def _revoke(user_id: uuid.UUID) -> None:
+        now = time.time()
+        _revoked_at[user_id] = now
+        token_cache.invalidate_where(lambda user: user.id == user_id)
+        user_cache.invalidate_where(lambda user: user.id == user_id)
+        # Token 最長只活 ACCESS_TOKEN_EXPIRE_MINUTES，更早的失效紀錄已經沒有作用
+        horizon = now - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        for stale_id in [k for k, v in _revoked_at.items() if v < horizon]:
+            del _revoked_at[stale_id]
+
+    @staticmethod
+    def stats() -> dict:
+        return {
+            "token": token_cache.stats(),
+            "user": user_cache.stats(),
+            "revoked_users": len(_revoked_at)
+        }
+
+def _apply_remote(keys: list[str]) -> None:
+    """
+    其他 worker 變更使用者時只標記本機的失效
+    """
+    for key in keys:
+        AuthCache._revoke(uuid.UUID(key))
+
+invalidation_bus.register("user", _apply_remote)
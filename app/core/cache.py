@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# 行程內 (in-process) LRU 快取
+# 同時以筆數 (max_entries) 與權重 (max_weight，用來估算記憶體用量) 限制大小，超過時從最久未使用的開始淘汰。
+# 可選擇設定 ttl (秒)，過期的項目在讀取時視為未命中。
+# 只在 event loop 內使用，不需要加鎖。
+class LRUCache:
+    def __init__(
+        self,
+        max_entries: int,
+        max_weight: int | None = None,
+        weigher: Callable[[Any], int] | None = None,
+        ttl: float | None = None
+    ):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda value: 1)
+        self.ttl = ttl
+        # key -> (value, weight, expires_at)
+        self._data: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self._weight = 0
+        # 每次失效都會遞增，用來丟棄「查詢期間資料已被修改」的回填
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        讀取但不影響 LRU 順序與命中統計
+        """
+        entry = self._data.get(key)
+        if entry is None or (entry[2] is not None and entry[2] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def generation(self) -> int:
+        """
+        查 DB 前先取得目前世代，回填時交給 put 比對
+        """
+        return self._generation
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: int | None = None,
+        ttl: float | None = None
+    ) -> None:
+        """
+        寫入快取。若有傳入 generation 且期間發生過失效，代表查到的資料可能已過期，直接放棄寫入。
+        ttl 可覆寫預設的存活秒數。
+        """
+        if generation is not None and generation != self._generation:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        weight = self.weigher(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            # 單筆就超過上限，不放進快取
+            self._remove(key)
+            return
+        self._remove(key)
+        self._data[key] = (value, weight, expires_at)
+        self._weight += weight
+        self._evict()
+
+    def invalidate(self, *keys: Hashable) -> None:
+        self._generation += 1
+        for key in keys:
+            self._remove(key)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> None:
+        """
+        移除值符合條件的項目 (會走過所有項目，只適合不常發生的失效，例如使用者角色變更)
+        """
+        self._generation += 1
+        for key in [key for key, entry in self._data.items() if predicate(entry[0])]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._data.clear()
+        self._weight = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "weight": self._weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._weight -= entry[1]
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_weight is not None and self._weight > self.max_weight)
+        ):
+            _, (_, weight, _) = self._data.popitem(last=False)
+            self._weight -= weight
+            self.evictions += 1
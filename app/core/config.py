@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):    
@@ -6,6 +7,94 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     DEBUG_MODE : bool = False
+
+    # 啟動時的資料庫遷移
+    # auto：DB 記錄的版本與遷移腳本的 head 相同時跳過 Alembic，不同才執行 upgrade
+    # always：每次都執行 Alembic upgrade；off：完全不檢查 (由部署流程另外執行遷移)
+    STARTUP_MIGRATION: Literal["auto", "always", "off"] = "auto"
+    # 啟動時建立預設管理員與測試資料 (會雜湊多組 bcrypt 密碼，只建議在開發環境開啟)
+    SEED_ON_STARTUP: bool = False
+
+    # 黑名單快取 (每個 worker 各自一份)
+    BLACKLIST_CACHE_ENABLED: bool = True
+    BLACKLIST_CACHE_MAX_USERS: int = 10000
+    # 記憶體上限：所有快取名單加總的 ID 數量
+    BLACKLIST_CACHE_MAX_IDS: int = 1000000
+
+    # 驗證快取
+    # 開啟後 Token 會帶 id/role/name，驗證時直接信任 claims 不查 DB；
+    # 角色變更或刪除使用者時需呼叫 AuthCache.invalidate_user，否則要等舊 Token 過期才會生效
+    AUTH_STATELESS: bool = False
+    # 無狀態模式下已解碼 Token 的快取筆數
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    # 查 DB 模式的使用者資料快取，未呼叫 AuthCache.invalidate_user 時角色變更最多延遲 AUTH_USER_CACHE_TTL_SECONDS 生效
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+
+    # 密碼雜湊池：thread 或 process
+    PASSWORD_HASH_POOL: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    # 同時進行的雜湊數量上限，未設定時等於 PASSWORD_HASH_WORKERS
+    PASSWORD_HASH_CONCURRENCY: int | None = None
+
+    # SQLite 連線設定
+    # tuned：WAL、synchronous=NORMAL 等 PRAGMA，並拆成讀取池與寫入池 (寫入交易以 BEGIN IMMEDIATE 取得寫入鎖)
+    # default：維持 SQLite 預設值，讀寫共用同一個連線池
+    SQLITE_PROFILE: Literal["default", "tuned"] = "tuned"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # 每條連線的 page cache 大小 (KiB)
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    # 讀取連線池大小，未設定時等於 CPU 核心數
+    SQLITE_READ_POOL_SIZE: int | None = None
+    # 寫入連線池大小；同一時間仍只有一條連線持有寫入鎖，其餘在 SQLite 內最多等待 SQLITE_BUSY_TIMEOUT_MS
+    SQLITE_WRITE_POOL_SIZE: int = 4
+
+    # 按讚延遲寫入：切換只更新記憶體，定期或累積到一定數量時批次寫入
+    LIKE_WRITE_BEHIND: bool = False
+    LIKE_FLUSH_INTERVAL_MS: int = 200
+    LIKE_FLUSH_BATCH_SIZE: int = 500
+
+    # 按讚計數分槽：按讚數的增減分散寫到每篇貼文的 LIKE_COUNTER_SLOTS 個槽位 (like_counter)，讀取時加總，
+    # 熱門貼文的按讚不再都更新同一列 post；背景工作每隔 LIKE_COUNTER_COMPACT_INTERVAL_MS 把槽位併回 post (0 = 直接更新 post)
+    LIKE_COUNTER_SLOTS: int = 0
+    LIKE_COUNTER_COMPACT_INTERVAL_MS: int = 5000
+    # 每次合併最多處理的貼文數，超過時下一輪繼續
+    LIKE_COUNTER_COMPACT_BATCH_SIZE: int = 1000
+
+    # 貼文分片：貼文、留言與按讚依主貼文 id 的雜湊分散到 N 個 SQLite 檔案 (0 = 不分片，只支援檔案型 SQLite)
+    # 需在還沒有任何貼文的資料庫上開啟，之後也不能再變更分片數
+    POST_SHARDS: int = 0
+
+    # 貼文內容快取 (get_by_id 中與檢視者無關的部分)
+    POST_CACHE_ENABLED: bool = True
+    POST_CACHE_MAX_ENTRIES: int = 2000
+    POST_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # 多個 worker 之間的快取失效匯流排 (uvicorn --workers N 時開啟)
+    # 本機快取失效時寫入 cache_invalidation，其他 worker 每隔 CACHE_BUS_POLL_INTERVAL_MS 輪詢並套用
+    CACHE_BUS_ENABLED: bool = False
+    CACHE_BUS_POLL_INTERVAL_MS: int = 100
+    # 失效紀錄保留的秒數
+    CACHE_BUS_RETENTION_SECONDS: int = 300
+
+    # 匯出貼文 (NDJSON) 時每次從資料庫游標取出、每塊回應寫出的筆數
+    EXPORT_BATCH_SIZE: int = 500
+
+    # 執行超過這個毫秒數的 SQL 記到慢查詢日誌 (0 = 關閉)
+    SLOW_QUERY_MS: float = 200
+    # 超過路由宣告的查詢次數上限時直接讓請求失敗 (開發/測試用)；關閉時只記警告
+    QUERY_BUDGET_ENFORCE: bool = False
+
+    # 巢狀留言單次查詢最多回傳的節點數
+    THREAD_MAX_NODES: int = 500
+
+    # 首頁動態：追蹤者超過此人數的帳號發文時不寫入追蹤者的時間軸 (fan-out-on-write)，改由讀取時合併 (fan-out-on-read)
+    # 追蹤者降回此人數時，會把該帳號最近 TIMELINE_BACKFILL_SIZE 篇主貼文補進所有追蹤者的時間軸
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10000
+    # 追蹤時從對方最近的主貼文回填到自己時間軸的筆數
+    TIMELINE_BACKFILL_SIZE: int = 50
     
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -56,6 +56,18 @@ class CommentErrors:
         def __init__(self):
             super().__init__(status.HTTP_400_BAD_REQUEST, "該留言不屬於此貼文，或留言不存在")
             
+# --- 搜尋相關 (Search) ---
+class SearchErrors:
+    class EmptyQuery(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_400_BAD_REQUEST, "請輸入搜尋關鍵字")
+
+# --- 分頁相關 (Pagination) ---
+class PaginationErrors:
+    class InvalidCursor(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_400_BAD_REQUEST, "分頁游標格式錯誤")
+
 # --- 黑名單相關 (Blacklist) ---
 class BlacklistErrors:
     class SelfBlock(ServiceException):
@@ -73,4 +85,26 @@ class BlacklistErrors:
     class NotInBlacklist(ServiceException):
         def __init__(self):
             super().__init__(status.HTTP_404_NOT_FOUND, "黑名單中找不到該使用者")            
-    
\ No newline at end of file
+    
+
+# --- 追蹤相關 (Follow) ---
+class FollowErrors:
+    class SelfFollow(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_400_BAD_REQUEST, "不能追蹤自己")
+
+    class TargetNotFound(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_404_NOT_FOUND, "目標使用者不存在")
+
+    class AlreadyFollowing(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_400_BAD_REQUEST, "已經追蹤該使用者")
+
+    class NotFollowing(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_400_BAD_REQUEST, "尚未追蹤該使用者")
+
+    class Blocked(ServiceException):
+        def __init__(self):
+            super().__init__(status.HTTP_403_FORBIDDEN, "由於封鎖關係，無法追蹤該使用者")
@@ -0,0 +1,27 @@
+import hashlib
+
+# ETag / If-None-Match 條件式回應
+class ETagHelper:
+    @staticmethod
+    def make(*parts) -> str:
+        """
+        由組成內容的各個版本資訊產生強 ETag
+        """
+        raw = "|".join(str(part) for part in parts)
+        return '"' + hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+    @staticmethod
+    def matches(if_none_match: str | None, etag: str) -> bool:
+        """
+        If-None-Match 是否符合目前的 ETag (可能是逗號分隔的多個值或 *)
+        """
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            # If-None-Match 使用弱比較，W/ 前綴不影響
+            if candidate.removeprefix("W/") == etag:
+                return True
+        return False
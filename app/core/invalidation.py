@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Hashable
+from sqlalchemy import select, insert, delete, func
+from app.core.config import settings
+from app.database import async_session_factory, read_session_factory
+from app.models import CacheInvalidation
+
+# 同一台主機上多個 worker 之間的快取失效匯流排 (SQLite change-log 輪詢)
+# 每個 worker 各有一份記憶體快取 (使用者、黑名單、貼文內容)，本機失效時同時 publish，
+# 背景工作把待送出的失效批次寫入 cache_invalidation，並輪詢其他 worker 寫入的紀錄 (id 遞增的範圍查詢)，
+# 套用到本機的快取。其他 worker 最多延遲一個 CACHE_BUS_POLL_INTERVAL_MS 才會看到失效。
+# 只用既有的資料庫，不需要額外的行程或服務；worker 重啟時快取本來就是空的，從目前最新的 id 開始輪詢即可。
+
+# 每次輪詢最多讀取的紀錄數，超過時下一輪繼續
+POLL_BATCH_SIZE = 1000
+# 每隔幾輪清除一次過期紀錄
+PRUNE_EVERY_POLLS = 100
+
+class InvalidationBus:
+    def __init__(self, poll_interval: float, retention: float):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # 只用來辨識自己發出的紀錄
+        self.worker_id = uuid.uuid4().hex
+        # 快取名稱 -> 套用遠端失效的函式 (參數為 key 字串)
+        self._handlers: dict[str, Callable[[list[str]], None]] = {}
+        self._outbox: list[tuple[str, str]] = []
+        self._last_id = 0
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        # 統計
+        self.published = 0
+        self.received = 0
+        self.polls = 0
+        self.failed_polls = 0
+        self.pruned = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CACHE_BUS_ENABLED
+
+    def register(self, cache: str, handler: Callable[[list[str]], None]) -> None:
+        """
+        註冊快取收到其他 worker 失效時的處理函式 (只清本機快取，不可再 publish)
+        """
+        self._handlers[cache] = handler
+
+    def publish(self, cache: str, *keys: Hashable) -> None:
+        """
+        通知其他 worker 讓快取中的這些 key 失效 (本機快取由呼叫端自行處理)
+        """
+        if self._task is None or not keys:
+            # 未啟動 (單一 worker 或工具程式) 時不需要通知
+            return
+        self._outbox.extend((cache, str(key)) for key in keys)
+        self._wake.set()
+
+    async def _send(self) -> None:
+        if not self._outbox:
+            return
+        batch, self._outbox = self._outbox, []
+        try:
+            async with async_session_factory() as db:
+                await db.execute(
+                    insert(CacheInvalidation),
+                    [{"cache": cache, "key": key, "origin": self.worker_id} for cache, key in batch]
+                )
+                await db.commit()
+        except BaseException:
+            # 放回待送出區，下一輪重試
+            self._outbox[:0] = batch
+            raise
+        self.published += len(batch)
+
+    async def _poll(self) -> None:
+        async with read_session_factory() as db:
+            result = await db.execute(
+                select(CacheInvalidation.id, CacheInvalidation.cache, CacheInvalidation.key, CacheInvalidation.origin)
+                .where(CacheInvalidation.id > self._last_id)
+                .order_by(CacheInvalidation.id)
+                .limit(POLL_BATCH_SIZE)
+            )
+            rows = result.all()
+        if not rows:
+            return
+        keys: dict[str, list[str]] = {}
+        for row in rows:
+            if row.origin != self.worker_id:
+                keys.setdefault(row.cache, []).append(row.key)
+        for cache, cache_keys in keys.items():
+            handler = self._handlers.get(cache)
+            if handler is not None:
+                handler(cache_keys)
+                self.received += len(cache_keys)
+        self._last_id = rows[-1].id
+        if len(rows) == POLL_BATCH_SIZE:
+            self._wake.set()
+
+    async def _prune(self) -> None:
+        # 與 CURRENT_TIMESTAMP 相同，以 UTC 比較
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.retention)
+        async with async_session_factory() as db:
+            result = await db.execute(delete(CacheInvalidation).where(CacheInvalidation.createdDateTime < cutoff))
+            await db.commit()
+        self.pruned += result.rowcount or 0
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.shield(self._send())
+                await self._poll()
+                self.polls += 1
+                if self.polls % PRUNE_EVERY_POLLS == 0:
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_polls += 1
+                logging.error(f"快取失效匯流排輪詢失敗，下次重試: {e}")
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        # 啟動前的失效與本機無關 (快取還是空的)，從目前最新的紀錄之後開始
+        async with read_session_factory() as db:
+            self._last_id = (await db.execute(select(func.max(CacheInvalidation.id)))).scalar() or 0
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        停止背景工作並送出剩下的失效
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._send()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "pending": len(self._outbox),
+            "last_id": self._last_id,
+            "published": self.published,
+            "received": self.received,
+            "polls": self.polls,
+            "failed_polls": self.failed_polls,
+            "pruned": self.pruned
+        }
+
+invalidation_bus = InvalidationBus(
+    poll_interval=settings.CACHE_BUS_POLL_INTERVAL_MS / 1000,
+    retention=settings.CACHE_BUS_RETENTION_SECONDS
+)
@@ -0,0 +1,213 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# 請求層級的指標 (Prometheus 文字格式)
+# MetricsMiddleware 記錄每個路由的延遲分佈、狀態碼與進行中的請求數；
+# 引擎事件把每句 SQL 的次數與耗時算到目前的請求上，同樣依路由彙總。
+# 路由以樣板 (例如 /posts/{post_id}/) 為標籤，不會因為 id 不同而產生大量時間序列。
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# 沒有對應到任何路由 (404) 的請求統一歸在這個標籤
+UNMATCHED_ROUTE = "<unmatched>"
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: dict[str, str]) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(self.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+# 單一請求累積的 DB 成本，存在 contextvar 中，同一個請求內的查詢都會加到這裡
+@dataclass(slots=True)
+class RequestStats:
+    method: str
+    path: str
+    scope: dict
+    route: str = UNMATCHED_ROUTE
+    queries: int = 0
+    db_time: float = 0.0
+
+    def resolve_route(self) -> str:
+        """
+        路由比對後 FastAPI 會把 APIRoute 放進 scope，取它的路徑樣板
+        """
+        route = self.scope.get("route")
+        if route is not None and getattr(route, "path", None):
+            self.route = route.path
+        return self.route
+
+_current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+def current_request() -> RequestStats | None:
+    return _current_request.get()
+
+class RequestMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: dict[tuple[str, str, int], int] = defaultdict(int)
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.db_queries: dict[tuple[str, str], Histogram] = {}
+        self.db_seconds: dict[tuple[str, str], Histogram] = {}
+        # 背景工作 (例如按讚批次寫入) 的查詢不屬於任何請求
+        self.background_queries = 0
+        self.background_db_seconds = 0.0
+
+    def record(self, stats: RequestStats, status: int, elapsed: float) -> None:
+        key = (stats.method, stats.route)
+        self.requests[(stats.method, stats.route, status)] += 1
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.db_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.db_seconds[key] = Histogram(LATENCY_BUCKETS)
+        self.latency[key].observe(elapsed)
+        self.db_queries[key].observe(stats.queries)
+        self.db_seconds[key].observe(stats.db_time)
+
+    def render(self) -> list[str]:
+        lines = [
+            "# HELP http_requests_in_flight 目前處理中的請求數",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total 依路由與狀態碼統計的請求數",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{_labels({'method': method, 'route': route, 'status': str(status)})} {count}")
+
+        for name, help, histograms in (
+            ("http_request_duration_seconds", "請求延遲 (秒)", self.latency),
+            ("http_request_db_queries", "每個請求執行的 SQL 數", self.db_queries),
+            ("http_request_db_seconds", "每個請求花在 DB 的時間 (秒)", self.db_seconds),
+        ):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), histogram in sorted(histograms.items()):
+                lines.extend(histogram.render(name, {"method": method, "route": route}))
+
+        lines += [
+            "# HELP db_background_queries_total 不屬於任何請求的 SQL 數",
+            "# TYPE db_background_queries_total counter",
+            f"db_background_queries_total {self.background_queries}",
+            "# HELP db_background_seconds_total 不屬於任何請求的 SQL 耗時 (秒)",
+            "# TYPE db_background_seconds_total counter",
+            f"db_background_seconds_total {_number(self.background_db_seconds)}",
+        ]
+        return lines
+
+request_metrics = RequestMetrics()
+
+class MetricsMiddleware:
+    """
+    純 ASGI middleware (不用 BaseHTTPMiddleware，避免額外的 task 與 contextvar 複製)
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(method=scope["method"], path=scope["path"], scope=scope)
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_metrics.in_flight += 1
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            request_metrics.in_flight -= 1
+            stats.resolve_route()
+            request_metrics.record(stats, status, elapsed)
+            _current_request.reset(token)
+
+def install_query_metrics(engine: AsyncEngine) -> None:
+    """
+    在引擎上掛 SQL 計時事件，把次數與耗時加到目前的請求
+    """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        stats = _current_request.get()
+        if stats is None:
+            request_metrics.background_queries += 1
+            request_metrics.background_db_seconds += elapsed
+        else:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        # 執行失敗時 after_cursor_execute 不會觸發，把開始時間丟掉
+        started = context.connection.info.get("query_started_at") if context.connection is not None else None
+        if started:
+            started.pop()
+
+def gauge(name: str, help: str, samples: list[tuple[dict[str, str], float]], type: str = "gauge") -> list[str]:
+    """
+    產生一組 gauge/counter 的文字格式 (給快取、連線池等其他元件使用)
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+def histogram(name: str, help: str, samples: list[tuple[dict[str, str], Histogram]]) -> list[str]:
+    """
+    產生一組 histogram 的文字格式 (給請求以外的元件使用，例如密碼雜湊池)
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for labels, value in samples:
+        lines.extend(value.render(name, labels))
+    return lines
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from app.core import errors
+
+# 游標分頁 (Keyset Pagination)
+# 以 (createdDateTime, id) 作為排序鍵，游標只記錄上一頁最後一筆的排序鍵，
+# 下一頁直接從該位置往後掃描，不論翻到第幾頁成本都與第一頁相同。
+class CursorHelper:
+    @staticmethod
+    def encode(created: datetime, id: uuid.UUID) -> str:
+        """
+        將排序鍵編碼成不透明的游標字串 (base64url)
+        """
+        raw = json.dumps([created.isoformat(sep=" "), str(id)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str) -> tuple[str, uuid.UUID]:
+        """
+        解碼游標，回傳 (createdDateTime 的儲存字串, id)。
+        createdDateTime 保持字串，與 SQLite 以 CURRENT_TIMESTAMP 寫入的格式一致才能正確比較。
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created, id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            datetime.fromisoformat(created)
+            return created, uuid.UUID(id)
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            raise errors.PaginationErrors.InvalidCursor()
+
+    @staticmethod
+    def encode_rank(rank: float, id: uuid.UUID) -> str:
+        """
+        以相關度分數作為排序鍵的游標 (全文檢索用)
+        """
+        raw = json.dumps([rank, str(id)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_rank(cursor: str) -> tuple[float, uuid.UUID]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            rank, id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            if isinstance(rank, bool) or not isinstance(rank, (int, float)):
+                raise ValueError(rank)
+            return float(rank), uuid.UUID(id)
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            raise errors.PaginationErrors.InvalidCursor()
@@ -0,0 +1,136 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.config import settings
+from app.core.metrics import RequestStats, current_request
+
+# SQL 的慢查詢日誌與查詢次數預算
+# 慢查詢：執行超過 SLOW_QUERY_MS 的 SQL 以 warning 記到 app.slow_query，附上語句、參數、耗時與來源路由。
+# 查詢預算：路由 (或測試中的一段程式) 宣告最多可以執行幾句 SQL，
+# 超過時開啟 QUERY_BUDGET_ENFORCE (或在測試中使用 query_budget) 會直接丟出例外，否則只記警告；
+# 改動不小心多了 N+1 或多餘的來回時可以馬上發現。
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+MAX_STATEMENT_LENGTH = 2000
+MAX_PARAMETERS_LENGTH = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@dataclass
+class QueryBudget:
+    limit: int
+    label: str
+    enforce: bool = True
+    statements: list[str] = field(default_factory=list)
+    reported: bool = False
+
+    def count(self, statement: str) -> None:
+        self.statements.append(_compact(statement, 200))
+        if len(self.statements) <= self.limit:
+            return
+        if self.enforce:
+            # 在多出來的這句送出前就失敗
+            raise QueryBudgetExceeded(self.describe())
+        if not self.reported:
+            self.reported = True
+            slow_query_logger.warning(self.describe())
+
+    def describe(self) -> str:
+        lines = [f"{self.label} 執行了 {len(self.statements)} 句 SQL，超過預算 {self.limit} 句："]
+        lines.extend(f"  {i}. {statement}" for i, statement in enumerate(self.statements, 1))
+        return "\n".join(lines)
+
+# query_budget 區塊的預算 (可以包住多個請求)
+_block_budget: ContextVar[QueryBudget | None] = ContextVar("query_budget", default=None)
+# 路由宣告的預算，與設定它的請求綁在一起；
+# 同一個 task 連續處理多個請求時 (例如測試用的 ASGITransport) 上一個請求的預算不會延續到下一個
+_route_budget: ContextVar[tuple[RequestStats, QueryBudget] | None] = ContextVar("route_query_budget", default=None)
+
+@contextmanager
+def query_budget(limit: int, label: str = "區塊"):
+    """
+    測試用：區塊內執行的 SQL 超過 limit 句時丟出 QueryBudgetExceeded
+
+        with query_budget(3, "get_by_id"):
+            await PostService.get_by_id(db, post_id, user_id)
+    """
+    budget = QueryBudget(limit=limit, label=label)
+    token = _block_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _block_budget.reset(token)
+
+def route_query_budget(limit: int, per_shard: int = 0):
+    """
+    路由用的 dependency：宣告這個 API 每個請求最多執行幾句 SQL (含驗證身分的查詢)
+    per_shard 為會在每個貼文分片各執行一次的查詢數，開啟 POST_SHARDS 時每多一個分片預算就多這麼多句
+
+        @router.get("/{post_id}/", dependencies=[Depends(route_query_budget(4))])
+    """
+    limit += per_shard * max(settings.POST_SHARDS - 1, 0)
+
+    async def set_budget():
+        request = current_request()
+        if request is None:
+            return
+        # async dependency 與路由函式在同一個 context 中執行，設定的 contextvar 對整個請求有效
+        budget = QueryBudget(
+            limit=limit,
+            label=f"{request.method} {request.resolve_route()}",
+            enforce=settings.QUERY_BUDGET_ENFORCE
+        )
+        _route_budget.set((request, budget))
+    return set_budget
+
+def _route() -> str:
+    request = current_request()
+    if request is None:
+        return "<background>"
+    return f"{request.method} {request.resolve_route()}"
+
+def _compact(statement: str, max_length: int) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    if len(statement) > max_length:
+        return statement[:max_length] + "..."
+    return statement
+
+def install_query_guard(engine: AsyncEngine) -> None:
+    """
+    在引擎上掛慢查詢日誌與查詢預算的事件
+    """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        block_budget = _block_budget.get()
+        if block_budget is not None:
+            block_budget.count(statement)
+        route_budget = _route_budget.get()
+        if route_budget is not None and route_budget[0] is current_request():
+            route_budget[1].count(statement)
+        conn.info.setdefault("guard_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["guard_started_at"].pop()) * 1000
+        if settings.SLOW_QUERY_MS and elapsed_ms >= settings.SLOW_QUERY_MS:
+            slow_query_logger.warning(
+                f"慢查詢 {elapsed_ms:.1f} ms [{_route()}] "
+                f"{_compact(statement, MAX_STATEMENT_LENGTH)} "
+                f"參數={_compact(repr(parameters), MAX_PARAMETERS_LENGTH)}"
+                + (" (executemany)" if executemany else "")
+            )
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("guard_started_at") if context.connection is not None else None
+        if started:
+            started.pop()
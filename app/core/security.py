@@ -1,25 +1,119 @@
+import asyncio
+import time
 import bcrypt
 import jwt
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Union
 from app.core.config import settings
+from app.core.metrics import LATENCY_BUCKETS, Histogram
+
+# bcrypt 實際運算，放在模組層級才能被 ProcessPoolExecutor pickle
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _check_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+# 密碼雜湊專用的執行緒/行程池
+# bcrypt 每次要花數十毫秒，直接在 async handler 裡執行會卡住整個 event loop。
+# 這裡把運算丟到獨立的池子，並用 semaphore 限制同時運算的數量，
+# 登入尖峰時只有登入請求需要排隊，其他 API 不受影響。
+class PasswordHashPool:
+    def __init__(self, kind: str, workers: int, concurrency: int):
+        self.kind = kind
+        self.workers = workers
+        self.concurrency = concurrency
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        # 統計
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        # 排隊等待與實際雜湊耗時的分佈 (/metrics)
+        self.wait_seconds = Histogram(LATENCY_BUCKETS)
+        self.run_seconds = Histogram(LATENCY_BUCKETS)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            finished_at = time.perf_counter()
+            self.running -= 1
+            self._semaphore.release()
+            self.completed += 1
+            self.total_wait_seconds += started_at - queued_at
+            self.total_run_seconds += finished_at - started_at
+            self.max_run_seconds = max(self.max_run_seconds, finished_at - started_at)
+            self.wait_seconds.observe(started_at - queued_at)
+            self.run_seconds.observe(finished_at - started_at)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.running,
+            "completed": self.completed,
+            "avg_wait_ms": self.total_wait_seconds / self.completed * 1000 if self.completed else 0.0,
+            "avg_run_ms": self.total_run_seconds / self.completed * 1000 if self.completed else 0.0,
+            "max_run_ms": self.max_run_seconds * 1000
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+password_hash_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_POOL,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    concurrency=settings.PASSWORD_HASH_CONCURRENCY or settings.PASSWORD_HASH_WORKERS
+)
 
 # 
 class SecurityHelper:
     @staticmethod
     # 定義密碼hash
     def get_password_hash(password: str) -> str:        
-        pwd_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(pwd_bytes, salt).decode('utf-8')
+        return _hash_password(password)
 
     # 驗證密碼
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:        
-        return bcrypt.checkpw(
-            password.encode('utf-8'),
-            hashed_password.encode('utf-8')
-        )
+        return _check_password(password, hashed_password)
+
+    # 非同步版本：在 async handler 裡請使用這兩個，避免阻塞 event loop
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        return await password_hash_pool.run(_hash_password, password)
+
+    @staticmethod
+    async def verify_password_async(password: str, hashed_password: str) -> bool:
+        return await password_hash_pool.run(_check_password, password, hashed_password)
 
     # 建立授權token
     @ staticmethod
@@ -30,7 +124,7 @@ class SecurityHelper:
         else:
             expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         
-        to_encode.update({"exp": expire})
+        to_encode.update({"exp": expire, "iat": datetime.now(timezone.utc)})
         # 從環境變數讀取 SECRET_KEY
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
\ No newline at end of file
@@ -0,0 +1,92 @@
+import uuid
+import orjson
+from fastapi import Response
+
+# 回應序列化的快速路徑
+# 列表與貼文內容直接由查詢結果組成與 Schema 欄位順序相同的 dict，以 orjson 編碼後直接回傳 Response，
+# 略過 Pydantic 建立模型、FastAPI 依 response_model 的再次驗證與標準庫 json。
+# 輸出的 JSON 與原本逐位元組相同 (欄位順序、UUID 與日期格式、非 ASCII 字元不跳脫)；
+# 路由上仍保留 response_model，OpenAPI 文件不受影響。
+
+def user_public(id: uuid.UUID, email: str, name: str | None, role: int) -> dict:
+    """
+    與 UserPublic 相同的輸出
+    """
+    return {"email": email, "id": id, "name": name, "role": role}
+
+def post_simple(id: uuid.UUID, content: str, owner: dict | None, createdDateTime, likes_count: int, is_liked: bool) -> dict:
+    """
+    與 PostSimple 相同的輸出
+    """
+    return {
+        "content": content,
+        "id": id,
+        "owner": owner,
+        "createdDateTime": createdDateTime,
+        "likes_count": likes_count,
+        "is_liked": is_liked,
+    }
+
+def post_public(
+    simple: dict,
+    updatedDateTime,
+    parent_id: uuid.UUID | None,
+    top_comment: dict | None,
+    comment: list[dict]
+) -> dict:
+    """
+    與 PostPublic 相同的輸出 (PostSimple 的欄位之後接上詳細內容)
+    """
+    return {
+        **simple,
+        "updatedDateTime": updatedDateTime,
+        "parent_id": parent_id,
+        "top_comment": top_comment,
+        "comment": comment,
+    }
+
+def post_export(
+    id: uuid.UUID,
+    parent_id: uuid.UUID | None,
+    content: str,
+    createdDateTime,
+    updatedDateTime,
+    likes_count: int
+) -> dict:
+    """
+    匯出 (NDJSON) 的一行：貼文或留言本身，parent_id 為 None 時是主貼文
+    """
+    return {
+        "id": id,
+        "parent_id": parent_id,
+        "content": content,
+        "createdDateTime": createdDateTime,
+        "updatedDateTime": updatedDateTime,
+        "likes_count": likes_count,
+    }
+
+class PostPayload:
+    """
+    已組好輸出內容的貼文，另外帶著產生 ETag 與封鎖檢查需要、但不會輸出的欄位
+    """
+    __slots__ = ("id", "owner_id", "version", "data")
+
+    def __init__(self, id: uuid.UUID, owner_id: uuid.UUID, version: int, data: dict):
+        self.id = id
+        self.owner_id = owner_id
+        self.version = version
+        self.data = data
+
+def ndjson(items) -> bytes:
+    """
+    每個項目編碼成一行 JSON (NDJSON)
+    """
+    return b"".join(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE) for item in items)
+
+def json_response(content, status_code: int = 200, headers: dict[str, str] | None = None) -> Response:
+    return Response(
+        content=orjson.dumps(content),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json"
+    )
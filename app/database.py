@@ -1,15 +1,175 @@
+import ast
+import asyncio
+import glob
+import hashlib
 import logging
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy import select
-from typing import AsyncGenerator
+import os
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy import select, event, make_url, text
+from sqlalchemy.exc import OperationalError
+from typing import AsyncGenerator, Awaitable, Callable, TypeVar
 from app.core.config import settings
-from app.core.security import SecurityHelper
-from .models import Base, User, UserRole, Post
+from app.core.metrics import install_query_metrics
+from app.core.query_guard import install_query_guard
+from .models import Base, User, UserRole, Post, Like, LikeCounter
+from .models.post_fts import FTS_SHARD_DDL
 
 DATABASE_URL = settings.DATABASE_URL
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def is_file_sqlite(url: str) -> bool:
+    """
+    是否為檔案型的 SQLite (記憶體資料庫無法跨連線共用，不能拆讀寫池)
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return False
+    return parsed.database not in (None, "", ":memory:") and parsed.query.get("mode") != "memory"
+
+def apply_sqlite_pragmas(target: AsyncEngine, read_only: bool = False):
+    """
+    每條新連線建立時套用 PRAGMA。
+    WAL 讓讀取不會被寫入擋住；synchronous=NORMAL 在 WAL 下仍能保證不損毀，只是斷電可能遺失最後幾筆交易。
+    """
+    @event.listens_for(target.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+def use_immediate_transactions(target: AsyncEngine):
+    """
+    寫入引擎的交易一律以 BEGIN IMMEDIATE 開始：交易一開始就取得寫入鎖，同時寫入的其他連線在 SQLite 內依 busy_timeout 排隊，
+    不會先讀了資料、升級成寫入鎖時才失敗 (WAL 下會直接得到 SQLITE_BUSY，不等待)。
+    寫入由 SQLite 的鎖排隊，連線池可以有多條連線，沒在寫入的 Session (例如等待其他 I/O) 不會擋住其他請求取得連線。
+    """
+    @event.listens_for(target.sync_engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        # 關閉 pysqlite 在 DML 前自動送出的 BEGIN，改由下面的 begin 事件決定
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(target.sync_engine, "begin")
+    def begin_immediate(conn):
+        # 直接以 DBAPI cursor 送出，不算進查詢預算與 /metrics 的 SQL 次數
+        cursor = conn.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.close()
+
 # 等同於Connection Pool
-engine = create_async_engine(DATABASE_URL, echo=settings.DEBUG_MODE)
+if settings.SQLITE_PROFILE == "tuned" and is_file_sqlite(DATABASE_URL):
+    # SQLite 同時只能有一個寫入者：寫入交易以 BEGIN IMMEDIATE 在 SQLite 內排隊，不靠只有一條連線的連線池排隊
+    engine = create_async_engine(
+        DATABASE_URL, echo=settings.DEBUG_MODE, pool_size=settings.SQLITE_WRITE_POOL_SIZE, max_overflow=0
+    )
+    # WAL 模式下讀取可以與寫入並行，讀取池大小隨 CPU 核心數擴展
+    read_pool_size = settings.SQLITE_READ_POOL_SIZE or os.cpu_count() or 4
+    read_engine = create_async_engine(
+        DATABASE_URL, echo=settings.DEBUG_MODE, pool_size=read_pool_size, max_overflow=read_pool_size
+    )
+    apply_sqlite_pragmas(engine)
+    use_immediate_transactions(engine)
+    apply_sqlite_pragmas(read_engine, read_only=True)
+else:
+    engine = create_async_engine(DATABASE_URL, echo=settings.DEBUG_MODE)
+    read_engine = engine
+
+# 貼文分片 (POST_SHARDS > 0)
+# 貼文、留言與按讚依主貼文 id 的雜湊放在 N 個 SQLite 檔案，每個檔案各有自己的寫入鎖，
+# 不同分片的發文與按讚可以同時寫入；使用者、黑名單、追蹤與時間軸留在主資料庫。
+# 分片的唯讀連線會以 ATTACH 掛上主資料庫：SQL 中未指定 schema 的資料表先找分片本身 (post、like、like_counter、post_fts)，
+# 找不到才找主資料庫 (user、blacklist、follow、timeline)，既有的 JOIN 查詢不需要改寫。
+# 分片的寫入連線不掛主資料庫：BEGIN IMMEDIATE 會對所有 ATTACH 的檔案取得寫入鎖，掛上後所有分片的寫入都會排在主資料庫的鎖後面。
+# 寫入分片的交易只能碰分片的資料表，時間軸等主資料庫的資料由主資料庫的 Session 另外寫入。
+# 留言的 id 會挑選與主貼文落在同一個分片的值，因此任何貼文 id 都能直接算出所在的分片。
+GLOBAL_SCHEMA = "global_db"
+
+# 分片只存放這些資料表 (不能有 user 等主資料庫的資料表，否則會蓋掉 ATTACH 進來的同名資料表)
+SHARDED_TABLES = [Post.__table__, Like.__table__, LikeCounter.__table__]
+
+def shard_urls() -> list[str]:
+    """
+    分片的連線字串：與主資料庫放在同一個目錄，例如 test.db -> test.shard0.db、test.shard1.db ...
+    """
+    url = make_url(DATABASE_URL)
+    stem, ext = os.path.splitext(url.database)
+    return [url.set(database=f"{stem}.shard{i}{ext or '.db'}").render_as_string(hide_password=False)
+            for i in range(settings.POST_SHARDS)]
+
+def attach_global_db(target: AsyncEngine) -> None:
+    """
+    分片的唯讀連線建立時掛上主資料庫 (需在其他 PRAGMA 之前，journal_mode 才會一併套用)
+    """
+    global_path = os.path.abspath(make_url(DATABASE_URL).database)
+
+    @event.listens_for(target.sync_engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {GLOBAL_SCHEMA}", (global_path,))
+        cursor.execute(f"PRAGMA {GLOBAL_SCHEMA}.synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.close()
+
+shard_engines: list[AsyncEngine] = []
+shard_read_engines: list[AsyncEngine] = []
+if settings.POST_SHARDS:
+    if not is_file_sqlite(DATABASE_URL):
+        raise RuntimeError("POST_SHARDS 只支援檔案型 SQLite")
+    # 分片就是為了分散寫入，一律使用 WAL 與 BEGIN IMMEDIATE 的寫入池
+    shard_read_pool_size = settings.SQLITE_READ_POOL_SIZE or os.cpu_count() or 4
+    for shard_url in shard_urls():
+        shard_engine = create_async_engine(
+            shard_url, echo=settings.DEBUG_MODE, pool_size=settings.SQLITE_WRITE_POOL_SIZE, max_overflow=0
+        )
+        shard_read_engine = create_async_engine(
+            shard_url, echo=settings.DEBUG_MODE, pool_size=shard_read_pool_size, max_overflow=shard_read_pool_size
+        )
+        attach_global_db(shard_read_engine)
+        apply_sqlite_pragmas(shard_engine)
+        use_immediate_transactions(shard_engine)
+        apply_sqlite_pragmas(shard_read_engine, read_only=True)
+        shard_engines.append(shard_engine)
+        shard_read_engines.append(shard_read_engine)
+
+def all_engines() -> dict[str, AsyncEngine]:
+    """
+    所有引擎 (名稱 -> 引擎)，給指標與就緒檢查使用
+    """
+    engines = {"writer": engine}
+    if read_engine is not engine:
+        engines["reader"] = read_engine
+    for i, (writer, reader) in enumerate(zip(shard_engines, shard_read_engines)):
+        engines[f"shard{i}_writer"] = writer
+        engines[f"shard{i}_reader"] = reader
+    return engines
+
+# 查詢預算超過時在 before_cursor_execute 就丟出例外，必須比計時的事件先註冊，
+# 否則計時事件已記下開始時間卻等不到結束
+# 每句 SQL 的次數與耗時記到目前的請求 (/metrics)
+for _target in all_engines().values():
+    install_query_guard(_target)
+    install_query_metrics(_target)
+
+def pool_stats(target: AsyncEngine) -> dict:
+    """
+    連線池目前的使用狀況 (記憶體資料庫使用的 StaticPool 沒有這些數字)
+    """
+    pool = target.pool
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            stats[name] = method()
+    return stats
 
 # 相似於efcore的 dbcontext 內部模擬做完sql在送到真實db做處理 或是ado 的Transaction Container
 # 扮演 Unit of Work (工作單元) 角色，內部追蹤物件狀態，最後再統一 Flush/Commit 到真實 DB。
@@ -19,6 +179,87 @@ async_session_factory = async_sessionmaker(
     expire_on_commit=False # Commit 後不清除物件快取，確保非同步環境下資料可讀
 )
 
+# 唯讀 Session，走讀取連線池
+read_session_factory = async_sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+shard_session_factories = [
+    async_sessionmaker(bind=target, class_=AsyncSession, expire_on_commit=False) for target in shard_engines
+]
+shard_read_session_factories = [
+    async_sessionmaker(bind=target, class_=AsyncSession, expire_on_commit=False) for target in shard_read_engines
+]
+
+def is_sharded() -> bool:
+    return bool(shard_engines)
+
+def shard_of(post_id: uuid.UUID) -> int:
+    """
+    貼文所在的分片 (未分片時一律為 0)
+    """
+    if not shard_engines:
+        return 0
+    return post_id.int % len(shard_engines)
+
+def new_post_id(shard: int) -> uuid.UUID:
+    """
+    產生落在指定分片的貼文 id (隨機產生直到符合，平均只需重試分片數次)
+    """
+    while True:
+        post_id = uuid.uuid4()
+        if shard_of(post_id) == shard:
+            return post_id
+
+def group_by_shard(post_ids) -> dict[int, list[uuid.UUID]]:
+    groups: dict[int, list[uuid.UUID]] = {}
+    for post_id in post_ids:
+        groups.setdefault(shard_of(post_id), []).append(post_id)
+    return groups
+
+def post_session_factory(post_id: uuid.UUID, write: bool = False) -> async_sessionmaker:
+    """
+    給沒有現成 Session 的背景工作使用：貼文所在資料庫的 Session 工廠
+    """
+    if not shard_engines:
+        return async_session_factory if write else read_session_factory
+    factories = shard_session_factories if write else shard_read_session_factories
+    return factories[shard_of(post_id)]
+
+@asynccontextmanager
+async def post_session(db: AsyncSession, post_id: uuid.UUID, write: bool = False):
+    """
+    存取單一貼文 (與其留言、按讚) 用的 Session。
+    未分片時直接使用傳入的 db；分片時開啟該貼文所在分片的 Session，寫入時同樣由呼叫端 commit。
+    """
+    if not shard_engines:
+        yield db
+        return
+    factories = shard_session_factories if write else shard_read_session_factories
+    async with factories[shard_of(post_id)]() as session:
+        yield session
+
+T = TypeVar("T")
+
+async def gather_shards(
+    db: AsyncSession,
+    fn: Callable[[AsyncSession, int], Awaitable[T]],
+    shards: list[int] | None = None
+) -> list[T]:
+    """
+    在每個分片 (或指定的分片) 各開一個唯讀 Session 並行執行 fn(session, 分片編號)，依分片順序回傳結果。
+    未分片時只以傳入的 db 執行一次。
+    """
+    if not shard_engines:
+        return [await fn(db, 0)]
+
+    async def run(shard: int) -> T:
+        async with shard_read_session_factories[shard]() as session:
+            return await fn(session, shard)
+    return await asyncio.gather(*(run(shard) for shard in (range(len(shard_engines)) if shards is None else shards)))
+
 # DI註入db
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
@@ -27,9 +268,182 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
+# DI註入唯讀db，只查詢不寫入的 API 請使用這個
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+def startup_lock_path() -> str:
+    """
+    啟動鎖的檔案：檔案型 SQLite 放在資料庫旁邊，其他資料庫依連線字串放在暫存目錄
+    """
+    if is_file_sqlite(DATABASE_URL):
+        return os.path.abspath(make_url(DATABASE_URL).database) + ".startup.lock"
+    digest = hashlib.sha256(DATABASE_URL.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"app-startup-{digest}.lock")
+
+def _lock_file(f, blocking: bool) -> bool:
+    """
+    對檔案取得獨占鎖，blocking 為 False 時拿不到就回傳 False。
+    行程結束時作業系統會自動釋放，持有鎖的 worker 當掉也不會卡住其他 worker。
+    """
+    if os.name == "nt":
+        import msvcrt
+        # msvcrt 鎖的是目前位置起的位元組，固定鎖第一個位元組
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                # msvcrt 沒有無限等待的模式，稍等後重試
+                time.sleep(0.1)
+    import fcntl
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+def _unlock_file(f) -> None:
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
 # 資料庫初始化（建立所有資料表）
 class DatabaseInitializer:
+
+    @staticmethod
+    @asynccontextmanager
+    async def startup_lock():
+        """
+        多個 worker 同時啟動時，一次只讓一個進入區塊 (檢查版本、遷移、建立測試資料)。
+        第一個拿到鎖的負責遷移；其他 worker 等它完成後才進入，這時版本已是最新，會直接跳過。
+        """
+        path = startup_lock_path()
+        loop = asyncio.get_running_loop()
+        with open(path, "a+b") as f:
+            if not _lock_file(f, blocking=False):
+                logging.info(f"其他 worker 正在初始化資料庫，等待啟動鎖 ({path})...")
+                # 等待期間不佔用 event loop
+                await loop.run_in_executor(None, _lock_file, f, True)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    @staticmethod
+    def upgrade_schema(revision: str = "head"):
+        """
+        執行 Alembic 遷移 (同步執行，async 環境請丟到 executor)
+        """
+        # Alembic 載入很慢，只在真的需要遷移時才 import
+        from alembic.config import Config
+        from alembic import command
+
+        # 取得ini檔的絕對路徑
+        ini_path = os.path.join(ROOT_DIR, "alembic.ini")
+        alembic_cfg = Config(ini_path)
+
+        # 手動指定 script_location 的絕對路徑
+        alembic_cfg.set_main_option("script_location", os.path.join(ROOT_DIR, "alembic"))
+
+        # 設定Alembic連線字串
+        alembic_cfg.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+        command.upgrade(alembic_cfg, revision)
     
+    @staticmethod
+    def script_heads() -> set[str]:
+        """
+        遷移腳本的 head 版本。
+        只用 ast 讀出每個腳本的 revision 與 down_revision (不執行腳本、不載入 Alembic)，
+        沒有被任何腳本當成 down_revision 的就是 head。
+        """
+        revisions: set[str] = set()
+        parents: set[str] = set()
+        for path in glob.glob(os.path.join(ROOT_DIR, "alembic", "versions", "*.py")):
+            with open(path, encoding="utf-8") as f:
+                tree = ast.parse(f.read(), filename=path)
+            values = {}
+            for node in tree.body:
+                if isinstance(node, ast.Assign) and len(node.targets) == 1:
+                    target, value = node.targets[0], node.value
+                elif isinstance(node, ast.AnnAssign) and node.value is not None:
+                    target, value = node.target, node.value
+                else:
+                    continue
+                if isinstance(target, ast.Name) and target.id in ("revision", "down_revision"):
+                    values[target.id] = ast.literal_eval(value)
+            if "revision" not in values:
+                continue
+            revisions.add(values["revision"])
+            down = values.get("down_revision")
+            # 合併遷移的 down_revision 是多個版本
+            if isinstance(down, str):
+                parents.add(down)
+            elif down:
+                parents.update(down)
+        return revisions - parents
+
+    @staticmethod
+    async def current_revisions() -> set[str]:
+        """
+        DB 目前記錄的遷移版本 (尚未建立 alembic_version 時為空集合)
+        """
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+                return set(result.scalars().all())
+        except OperationalError:
+            return set()
+
+    @staticmethod
+    async def needs_upgrade() -> bool:
+        """
+        依 STARTUP_MIGRATION 判斷啟動時是否要執行 Alembic upgrade
+        """
+        if settings.STARTUP_MIGRATION == "off":
+            return False
+        if settings.STARTUP_MIGRATION == "always":
+            return True
+        current = await DatabaseInitializer.current_revisions()
+        heads = DatabaseInitializer.script_heads()
+        if current == heads:
+            logging.info(f"資料庫已是最新版本 ({', '.join(sorted(current))})，跳過遷移")
+            return False
+        logging.info(f"資料庫版本 {sorted(current) or '(未建立)'} 與遷移腳本 {sorted(heads)} 不同，需要遷移")
+        return True
+
+    @staticmethod
+    async def init_shards():
+        """
+        建立分片的資料表 (已存在的會略過)。
+        分片只有貼文相關的資料表，不跑 Alembic：以不掛主資料庫的連線建立，避免把主資料庫的同名資料表當成已存在。
+        """
+        for shard_url in shard_urls():
+            target = create_async_engine(shard_url)
+            try:
+                async with target.begin() as conn:
+                    await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                    await conn.run_sync(Base.metadata.create_all, tables=SHARDED_TABLES)
+                    for statement in FTS_SHARD_DDL:
+                        await conn.exec_driver_sql(statement)
+            finally:
+                await target.dispose()
+        async with engine.connect() as conn:
+            leftover = (await conn.execute(select(Post.id).limit(1))).first()
+        if leftover is not None:
+            logging.warning("主資料庫中仍有未分片的貼文，開啟 POST_SHARDS 後這些貼文不會被讀取")
+
     @staticmethod
     async def init_db():
         async with engine.begin() as conn:        
@@ -50,6 +464,8 @@ class DatabaseInitializer:
         
     @staticmethod
     async def init_admin(session: AsyncSession):
+        from app.core.security import SecurityHelper
+
         result = await session.execute(select(User).where(User.name == "admin"))
         if result.scalar_one_or_none():
             logging.info("管理員帳號已存在，跳過。")
@@ -58,7 +474,7 @@ class DatabaseInitializer:
         new_admin = User(
             name="admin",
             email="admin@example.com",
-            password=SecurityHelper.get_password_hash("1qaz@WSX"), # 暫時密碼
+            password=await SecurityHelper.get_password_hash_async("1qaz@WSX"), # 暫時密碼
             role=UserRole.ADMIN
         )
         session.add(new_admin)
@@ -70,6 +486,9 @@ class DatabaseInitializer:
         """
         初始化測試資料：3名使用者, 3篇主貼文, 9則留言
         """
+        from app.core.security import SecurityHelper
+        from app.service.follow_service import FollowService
+
         # 1. 檢查是否已有資料 (以 user1 為指標)
         result = await session.execute(select(User).where(User.name == "user1"))
         if result.scalar_one_or_none():
@@ -84,7 +503,7 @@ class DatabaseInitializer:
                 u = User(
                     name=f"user{i}",
                     email=f"user{i}@example.com",
-                    password=SecurityHelper.get_password_hash("password123"),
+                    password=await SecurityHelper.get_password_hash_async("password123"),
                     role=UserRole.USER
                 )
                 session.add(u)
@@ -92,6 +511,13 @@ class DatabaseInitializer:
             
             await session.flush()
 
+            if is_sharded():
+                # 貼文不在主資料庫，透過 PostService 寫入各自的分片
+                await session.commit()
+                await DatabaseInitializer.init_sharded_posts(session, test_users)
+                logging.info("測試資料 Seeding 成功！")
+                return
+
             # --- 建立 3 篇主貼文 ---
             all_main_posts = []
             for i, u in enumerate(test_users):
@@ -103,6 +529,8 @@ class DatabaseInitializer:
                 all_main_posts.append(p)
             
             await session.flush()
+            for p in all_main_posts:
+                await FollowService.fan_out(session, p.id, p.owner_id, p.createdDateTime)
 
             # --- 建立 9 則留言 (Comment) ---
             for p in all_main_posts:
@@ -120,4 +548,23 @@ class DatabaseInitializer:
         except Exception as e:
             await session.rollback()
             logging.error(f"Seeding 過程發生錯誤: {e}")
-            raise        
\ No newline at end of file
+            raise
+
+    @staticmethod
+    async def init_sharded_posts(session: AsyncSession, test_users: list[User]):
+        """
+        分片模式的測試貼文：與 init_test_data 相同的 3 篇主貼文與 9 則留言
+        """
+        from app.schemas.post import PostCreate
+        from app.service.post_service import PostService
+
+        main_posts = []
+        for i, u in enumerate(test_users):
+            main_posts.append(await PostService.create_post(
+                session, PostCreate(content=f"這是由 {u.name} 發佈的主貼文內容 #測試{i+1}"), u.id
+            ))
+        for p in main_posts:
+            for u in test_users:
+                await PostService.create_post(
+                    session, PostCreate(content=f"我是 {u.name}，這是對貼文 {p.id} 的回覆留言", parent_id=p.id), u.id
+                )        
\ No newline at end of file
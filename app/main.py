@@ -1,46 +1,91 @@
-import logging, os, asyncio
-from alembic.config import Config
-from alembic import command
-from fastapi import FastAPI, Depends
+import time
+# 在載入其他模組之前記下時間，用來回報啟動時載入模組 (FastAPI、SQLAlchemy 等) 花的時間
+_import_started_at = time.perf_counter()
+
+import logging, asyncio
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from contextlib import asynccontextmanager
-from app.router import user_router, post_router, black_list_router
-from app.database import DatabaseInitializer, get_db 
+from sqlalchemy import select, text
+from contextlib import asynccontextmanager, contextmanager, AsyncExitStack
+from app.router import user_router, post_router, black_list_router, follow_router
+from app.database import (
+    DatabaseInitializer, engine, read_engine, async_session_factory, read_session_factory, pool_stats,
+    all_engines, is_sharded, shard_session_factories, shard_read_session_factories
+)
+from app.core.auth_cache import AuthCache
 from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import MetricsMiddleware, request_metrics, gauge, histogram
+from app.core.security import password_hash_pool
+from app.service.black_list_service import BlacklistService
+from app.service.like_buffer import like_buffer
+from app.service.like_counter import like_counter_compactor
+from app.service.post_service import PostService
 
 # tokenUrl 登入 API 地址
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
+# 啟動各階段的耗時 (秒)，在 /ready 與 /metrics 回報，滾動部署時用來追蹤重啟速度
+startup_phases: dict[str, float] = {}
+
+@contextmanager
+def startup_phase(name: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases[name] = time.perf_counter() - started_at
+
 # lifespan 會在程式啟動時跑一次 yield 之前的code，關閉時跑一次 yield 之後的code
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_phases.clear()
+    startup_phases["import"] = _imported_at - _import_started_at
+    started_at = time.perf_counter()
     # 這段代碼相當於 EF Core 的 Database.Migrate()
     logging.info("正在檢查資料庫遷移...")
     try:
-        # 取得ini檔的絕對路徑
-        def run_upgrade():
-            root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ini_path = os.path.join(root_dir, "alembic.ini")
-            alembic_cfg = Config(ini_path)
-            
-            # 手動指定 script_location 的絕對路徑
-            alembic_cfg.set_main_option("script_location", os.path.join(root_dir, "alembic"))
-
-            # 設定Alembic連線字串
-            alembic_cfg.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
-            # 執行 upgrade head
-            command.upgrade(alembic_cfg, "head")
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, run_upgrade)
-        logging.info("資料庫遷移完成！")
-        await DatabaseInitializer.seed_all()
-        logging.info("資料庫初始化完成！")        
+        async with AsyncExitStack() as stack:
+            # 多個 worker (uvicorn --workers N) 同時啟動時只讓一個執行遷移與建立測試資料
+            with startup_phase("startup_lock"):
+                await stack.enter_async_context(DatabaseInitializer.startup_lock())
+            # 版本已是最新時不載入 Alembic
+            with startup_phase("schema_check"):
+                needs_upgrade = await DatabaseInitializer.needs_upgrade()
+            if needs_upgrade:
+                # 執行 upgrade head
+                with startup_phase("migrate"):
+                    loop = asyncio.get_event_loop()
+                    await loop.run_in_executor(None, DatabaseInitializer.upgrade_schema)
+                logging.info("資料庫遷移完成！")
+            if is_sharded():
+                with startup_phase("shards"):
+                    await DatabaseInitializer.init_shards()
+            if settings.SEED_ON_STARTUP:
+                with startup_phase("seed"):
+                    await DatabaseInitializer.seed_all()
+                logging.info("資料庫初始化完成！")        
     except Exception as e:
         logging.error(f"資料庫遷移失敗: {e}")    
+    with startup_phase("like_buffer"):
+        await like_buffer.start()
+    await like_counter_compactor.start()
+    try:
+        with startup_phase("cache_bus"):
+            await invalidation_bus.start()
+    except Exception as e:
+        logging.error(f"快取失效匯流排啟動失敗，各 worker 的快取不會同步: {e}")
+    startup_phases["total"] = startup_phases["import"] + time.perf_counter() - started_at
+    logging.info("啟動完成：" + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in startup_phases.items()))
     yield
     logging.info("正在關閉...")
+    # 把緩衝區內尚未寫入的按讚全部寫入後才關閉
+    await like_buffer.stop()
+    await like_counter_compactor.stop()
+    # 按讚寫入也會讓貼文快取失效，停止匯流排前先送出
+    await invalidation_bus.stop()
+    password_hash_pool.shutdown()
 
 # 實例化 FastAPI
 app = FastAPI(
@@ -49,16 +94,108 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan)
 
+# 每個路由的延遲、狀態碼與 DB 成本 (/metrics)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(user_router, prefix="/users", tags=["User"])
 app.include_router(post_router, prefix="/posts", tags=["Post"])
 app.include_router(black_list_router, prefix="/blacklist", tags=["Blacklist"])
+app.include_router(follow_router, prefix="/follows", tags=["Follow"])
 
 # 測試api是否有啟用
 @app.get("/")
 async def read_root():
     return {"status": "success", "message": "FastAPI 3.13 環境啟動成功！"}
 
-# 測試db是否連線正常 (透過 DI 注入)
-@app.get("/db-check")
-async def check_db_connection(db: AsyncSession = Depends(get_db)):
-    return {"status": "connected"}
\ No newline at end of file
+# 就緒檢查：讀寫連線都要能實際執行查詢，並回報連線池狀態
+@app.get("/ready")
+@app.get("/db-check", include_in_schema=False)
+async def readiness_probe():
+    checks = {}
+    ready = True
+    targets = {"writer": (engine, async_session_factory)}
+    if read_engine is not engine:
+        targets["reader"] = (read_engine, read_session_factory)
+    engines = all_engines()
+    for i, (writer_factory, reader_factory) in enumerate(zip(shard_session_factories, shard_read_session_factories)):
+        targets[f"shard{i}_writer"] = (engines[f"shard{i}_writer"], writer_factory)
+        targets[f"shard{i}_reader"] = (engines[f"shard{i}_reader"], reader_factory)
+    for name, (target, session_factory) in targets.items():
+        check = {"pool": pool_stats(target)}
+        try:
+            async with session_factory() as db:
+                await asyncio.wait_for(db.execute(text("SELECT 1")), timeout=2)
+            check["status"] = "ok"
+        except Exception as e:
+            ready = False
+            check["status"] = "error"
+            check["error"] = str(e) or type(e).__name__
+        checks[name] = check
+    checks["password_hash"] = password_hash_pool.stats()
+    if like_buffer.enabled:
+        checks["like_buffer"] = like_buffer.stats()
+    if like_counter_compactor.enabled:
+        checks["like_counter"] = like_counter_compactor.stats()
+    if invalidation_bus.enabled:
+        checks["cache_bus"] = invalidation_bus.stats()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "unavailable",
+            "checks": checks,
+            "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in startup_phases.items()}
+        }
+    )
+
+# Prometheus 文字格式的指標
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    lines = request_metrics.render()
+
+    pools = {name: pool_stats(target) for name, target in all_engines().items()}
+    for key, help in (("size", "連線池大小"), ("checkedout", "使用中的連線數"), ("overflow", "超出連線池大小的連線數")):
+        lines += gauge(f"db_pool_{key}", help, [({"engine": name}, stats[key]) for name, stats in pools.items() if key in stats])
+
+    caches = {
+        "blacklist": BlacklistService.cache_stats(),
+        "post": PostService.cache_stats(),
+        **{f"auth_{name}": stats for name, stats in AuthCache.stats().items() if isinstance(stats, dict)}
+    }
+    lines += gauge("cache_entries", "快取筆數", [({"cache": name}, stats["entries"]) for name, stats in caches.items()])
+    lines += gauge("cache_hits_total", "快取命中次數", [({"cache": name}, stats["hits"]) for name, stats in caches.items()], "counter")
+    lines += gauge("cache_misses_total", "快取未命中次數", [({"cache": name}, stats["misses"]) for name, stats in caches.items()], "counter")
+    lines += gauge("cache_evictions_total", "快取淘汰次數", [({"cache": name}, stats["evictions"]) for name, stats in caches.items()], "counter")
+
+    hash_pool = password_hash_pool.stats()
+    lines += gauge("password_hash_queue_depth", "等待中的密碼雜湊工作數", [({}, hash_pool["queue_depth"])])
+    lines += gauge("password_hash_in_flight", "執行中的密碼雜湊工作數", [({}, hash_pool["in_flight"])])
+    lines += histogram("password_hash_wait_seconds", "密碼雜湊工作排隊等待的時間 (秒)", [({}, password_hash_pool.wait_seconds)])
+    lines += histogram("password_hash_run_seconds", "密碼雜湊的執行時間 (秒)", [({}, password_hash_pool.run_seconds)])
+    lines += gauge("password_hash_max_run_seconds", "單次密碼雜湊最長的執行時間 (秒)", [({}, hash_pool["max_run_ms"] / 1000)])
+
+    lines += gauge(
+        "app_startup_phase_seconds", "啟動各階段的耗時 (秒)",
+        [({"phase": name}, seconds) for name, seconds in startup_phases.items()]
+    )
+
+    if like_buffer.enabled:
+        buffer = like_buffer.stats()
+        lines += gauge("like_buffer_pending", "尚未寫入的按讚切換數", [({}, buffer["pending"])])
+        lines += gauge("like_buffer_failed_flushes_total", "按讚批次寫入失敗次數", [({}, buffer["failed_flushes"])], "counter")
+
+    if like_counter_compactor.enabled:
+        compactor = like_counter_compactor.stats()
+        lines += gauge("like_counter_posts_compacted_total", "按讚計數槽位併回貼文的次數", [({}, compactor["posts_compacted"])], "counter")
+        lines += gauge("like_counter_failed_compactions_total", "按讚計數槽位合併失敗次數", [({}, compactor["failed_compactions"])], "counter")
+
+    if invalidation_bus.enabled:
+        bus = invalidation_bus.stats()
+        lines += gauge("cache_bus_pending", "尚未送出的快取失效數", [({}, bus["pending"])])
+        lines += gauge("cache_bus_published_total", "送給其他 worker 的快取失效數", [({}, bus["published"])], "counter")
+        lines += gauge("cache_bus_received_total", "收到其他 worker 的快取失效數", [({}, bus["received"])], "counter")
+        lines += gauge("cache_bus_failed_polls_total", "快取失效匯流排輪詢失敗次數", [({}, bus["failed_polls"])], "counter")
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 模組載入完成 (含所有路由與相依套件)
+_imported_at = time.perf_counter()
@@ -3,7 +3,11 @@ from .base import Base
 from .user import User, UserRole
 from .post import Post
 from .like import Like
+from .like_counter import LikeCounter
 from .blacklist import Blacklist
+from .follow import Follow
+from .timeline import Timeline
+from .cache_invalidation import CacheInvalidation
 
 # SQLModel tables
-__all__ = ["Base", "User", "UserRole", "Post", "Like", "Blacklist"]
\ No newline at end of file
+__all__ = ["Base", "User", "UserRole", "Post", "Like", "LikeCounter", "Blacklist", "Follow", "Timeline", "CacheInvalidation"]
\ No newline at end of file
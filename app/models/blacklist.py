@@ -1,10 +1,14 @@
 import uuid
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
 
 class Blacklist(Base):
     __tablename__ = "blacklist"
+    __table_args__ = (
+        # 主鍵是 (user_id, blocked_user_id)，查「誰封鎖了我」需要另外的索引
+        Index("ix_blacklist_blocked_user_id", "blocked_user_id"),
+    )
 
     # 封鎖者
     user_id: Mapped[uuid.UUID] = mapped_column(
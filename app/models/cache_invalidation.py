@@ -0,0 +1,21 @@
+from sqlalchemy import Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+# 跨 worker 的快取失效紀錄 (app.core.invalidation)
+# 各 worker 依 id 遞增輪詢其他 worker 寫入的紀錄；使用 AUTOINCREMENT，清除舊紀錄後 id 也不會被重複使用
+class CacheInvalidation(Base):
+    __tablename__ = "cache_invalidation"
+    __table_args__ = (
+        # 依建立時間清除過期紀錄
+        Index("ix_cache_invalidation_createdDateTime", "createdDateTime"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # 快取名稱 (post、blacklist、user)
+    cache: Mapped[str] = mapped_column(String(32), nullable=False)
+    # 失效的 key (UUID 字串)
+    key: Mapped[str] = mapped_column(String(64), nullable=False)
+    # 發出失效的 worker，輪詢時略過自己發出的紀錄
+    origin: Mapped[str] = mapped_column(String(32), nullable=False)
@@ -0,0 +1,20 @@
+import uuid
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+class Follow(Base):
+    __tablename__ = "follow"
+    __table_args__ = (
+        # 主鍵是 (follower_id, followee_id)，發文時找出「誰追蹤了我」需要另外的索引
+        Index("ix_follow_followee_id", "followee_id"),
+    )
+
+    # 追蹤者
+    follower_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    # 被追蹤者
+    followee_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
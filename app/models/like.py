@@ -1,10 +1,14 @@
 import uuid
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
 
 class Like(Base):
     __tablename__ = "like"
+    __table_args__ = (
+        # 主鍵是 (user_id, post_id)，依貼文查詢按讚需要另外的索引
+        Index("ix_like_post_id", "post_id"),
+    )
 
     # 按讚使用者ID
     user_id: Mapped[uuid.UUID] = mapped_column(
@@ -0,0 +1,22 @@
+import uuid
+from sqlalchemy import ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+# 按讚數的分槽計數 (LIKE_COUNTER_SLOTS > 0 時使用)
+# 每次按讚隨機累加到貼文的其中一個槽位，同一篇熱門貼文的按讚分散寫到不同列，不必每次都更新 post 那一列；
+# 實際的按讚數 = post.likes_count + 各槽位 likes_delta 的總和 (version 同理)。
+# 背景工作 (app.service.like_counter) 定期把槽位加回 post 並刪除，槽位只存放尚未合併的增減。
+class LikeCounter(Base):
+    __tablename__ = "like_counter"
+
+    # 貼文ID
+    post_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("post.id", ondelete="CASCADE"), primary_key=True
+    )
+    # 槽位編號 (0 ~ LIKE_COUNTER_SLOTS - 1)
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # 尚未合併的按讚數增減
+    likes_delta: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    # 尚未合併的版本遞增 (ETag 用)
+    version_delta: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
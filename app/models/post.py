@@ -1,6 +1,6 @@
 import uuid
 from typing import Optional
-from sqlalchemy import ForeignKey, String, Text, UUID
+from sqlalchemy import ForeignKey, Index, Integer, String, Text, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import Base
 from typing import Optional,TYPE_CHECKING
@@ -11,6 +11,12 @@ if TYPE_CHECKING:
 
 class Post(Base):
     __tablename__ = "post"
+    __table_args__ = (
+        # 主貼文列表 (parent_id IS NULL) 與留言列表 (parent_id = ?) 都依建立時間排序
+        Index("ix_post_parent_id_createdDateTime", "parent_id", "createdDateTime", "id"),
+        # 依作者查詢貼文 (刪除使用者時的 CASCADE 也會用到)
+        Index("ix_post_owner_id_createdDateTime", "owner_id", "createdDateTime", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
@@ -21,6 +27,22 @@ class Post(Base):
     # 內文
     content: Mapped[str] = mapped_column(Text, nullable=False)
 
+    # 按讚數 (反正規化欄位，由 PostService.toggle_like 同步維護，避免每次讀取都載入整份按讚名單)
+    likes_count: Mapped[int] = mapped_column(
+        Integer,
+        server_default="0",
+        nullable=False,
+        comment="按讚數 (由 toggle_like 維護)"
+    )
+
+    # 內容版本：編輯、按讚、新增回覆、變更置頂留言 (含留言被按讚) 時遞增，用來產生 ETag
+    version: Mapped[int] = mapped_column(
+        Integer,
+        server_default="0",
+        nullable=False,
+        comment="內容版本 (ETag 用)"
+    )
+
     # FK：指向 User 表
     owner_id: Mapped[uuid.UUID] = mapped_column(
         ForeignKey("user.id", ondelete="CASCADE"), 
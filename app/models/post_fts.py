@@ -0,0 +1,30 @@
+from sqlalchemy import Float, Integer, Text, column, table
+
+# 貼文全文檢索 (SQLite FTS5 虛擬資料表，trigram 分詞，支援中文等沒有空白分隔的文字)
+# 以 post 的 rowid 對應 (external content)，內容由 Alembic 遷移建立的觸發程序同步，不放進 Base.metadata。
+# 注意：batch 遷移重建 post 資料表時 rowid 與觸發程序都不會保留，需在同一個遷移內重建索引與觸發程序。
+FTS_TABLE_NAME = "post_fts"
+
+post_fts = table(
+    FTS_TABLE_NAME,
+    column("rowid", Integer),
+    column("content", Text),
+    # FTS5 內建的 BM25 分數，越小越相關
+    column("rank", Float),
+)
+
+# 分片資料庫 (POST_SHARDS) 不跑 Alembic，由 DatabaseInitializer.init_shards 以下列語句建立，內容需與遷移 9b1f3c7d2e84 相同
+FTS_SHARD_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE_NAME} USING fts5("
+    "content, content='post', content_rowid='rowid', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ai AFTER INSERT ON post BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}(rowid, content) VALUES (new.rowid, new.content); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ad AFTER DELETE ON post BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_au AFTER UPDATE OF content ON post BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    f"INSERT INTO {FTS_TABLE_NAME}(rowid, content) VALUES (new.rowid, new.content); "
+    "END",
+)
@@ -0,0 +1,27 @@
+import uuid
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+# 首頁動態 (fan-out-on-write)
+# 發文時把主貼文寫進每位追蹤者的時間軸，讀取首頁時只需依 user_id 做一次游標範圍掃描。
+# createdDateTime 寫入的是貼文的建立時間 (不是這筆資料的寫入時間)，作為排序鍵。
+class Timeline(Base):
+    __tablename__ = "timeline"
+    __table_args__ = (
+        # 首頁動態依 (createdDateTime, post_id) 由新到舊掃描
+        Index("ix_timeline_user_id_createdDateTime", "user_id", "createdDateTime", "post_id"),
+    )
+
+    # 時間軸擁有者
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    # 主貼文
+    post_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("post.id", ondelete="CASCADE"), primary_key=True
+    )
+    # 貼文作者 (反正規化，讀取時直接過濾黑名單、取消追蹤時清除)
+    author_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
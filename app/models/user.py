@@ -1,7 +1,7 @@
 import uuid
 import sqlalchemy
 from enum import IntEnum
-from sqlalchemy import String, UUID
+from sqlalchemy import Index, String, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import Base
 from typing import TYPE_CHECKING
@@ -18,6 +18,10 @@ class UserRole(IntEnum):
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        # 使用者列表依建立時間排序
+        Index("ix_user_createdDateTime", "createdDateTime"),
+    )
     
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
@@ -33,6 +37,14 @@ class User(Base):
 
     role : Mapped[UserRole] = mapped_column(sqlalchemy.Integer, server_default="1", nullable=False)
 
+    # 追蹤者人數 (反正規化欄位，由 FollowService 維護，發文時據此決定是否 fan-out)
+    followers_count: Mapped[int] = mapped_column(
+        sqlalchemy.Integer,
+        server_default="0",
+        nullable=False,
+        comment="追蹤者人數 (由 FollowService 維護)"
+    )
+
     # 對posts關聯一對多    
     posts: Mapped[list["Post"]] = relationship(
         "Post", 
@@ -1,3 +1,4 @@
 from .user_router import router as user_router
 from .post_router import router as post_router
-from .black_list_router import router as black_list_router
\ No newline at end of file
+from .black_list_router import router as black_list_router
+from .follow_router import router as follow_router
\ No newline at end of file
@@ -0,0 +1,78 @@
+import uuid
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import errors
+from app.core.serialization import json_response
+from app.database import get_db, get_read_db
+from app.service.black_list_service import BlacklistService
+from app.service.follow_service import FollowService
+from app.service.user_service import UserService
+from app.schemas.user import UserPublic
+from app.router.user_router import get_current_user
+
+router = APIRouter()
+
+@router.post("/{target_user_id}", status_code=status.HTTP_201_CREATED)
+async def follow_user(
+    target_user_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPublic = Depends(get_current_user)
+):
+    """
+    追蹤該使用者，之後對方的主貼文會出現在首頁動態 (/posts/home)
+    """
+    if target_user_id == current_user.id:
+        raise errors.FollowErrors.SelfFollow()
+
+    target_user = await UserService.get_user_by_id(target_user_id, db)
+    if not target_user:
+        raise errors.FollowErrors.TargetNotFound()
+
+    if await BlacklistService.is_blocked(current_user.id, target_user_id, db):
+        raise errors.FollowErrors.Blocked()
+
+    success = await FollowService.follow(current_user.id, target_user_id, db)
+    if not success:
+        raise errors.FollowErrors.AlreadyFollowing()
+    return {"message": "已成功追蹤"}
+
+@router.delete("/{target_user_id}")
+async def unfollow_user(
+    target_user_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPublic = Depends(get_current_user)
+):
+    """
+    取消追蹤該使用者
+    """
+    success = await FollowService.unfollow(current_user.id, target_user_id, db)
+    if not success:
+        raise errors.FollowErrors.NotFollowing()
+    return {"message": "已取消追蹤"}
+
+@router.get("/following", response_model=list[UserPublic])
+async def get_following(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserPublic = Depends(get_current_user)
+):
+    """
+    我追蹤的使用者
+    """
+    users = await FollowService.get_following(current_user.id, db, skip, limit)
+    return json_response([u.public() for u in users])
+
+@router.get("/followers", response_model=list[UserPublic])
+async def get_followers(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserPublic = Depends(get_current_user)
+):
+    """
+    追蹤我的使用者
+    """
+    users = await FollowService.get_followers(current_user.id, db, skip, limit)
+    return json_response([u.public() for u in users])
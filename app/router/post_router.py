@@ -1,11 +1,15 @@
 import uuid
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core import errors
-from app.database import get_db
+from app.core.etag import ETagHelper
+from app.core.query_guard import route_query_budget
+from app.core.serialization import json_response
+from app.database import get_db, get_read_db
 from app.service.post_service import PostService
-from app.schemas.post import PostPublic, PostCreate, PostSimple
+from app.schemas.post import PostPublic, PostCreate, PostSimple, PostThread, PostBatchGet, PostLikeBatch, PostLikeState
 from app.schemas.user import UserPublic 
 from app.service.black_list_service import BlacklistService
 from app.router.user_router import get_current_user
@@ -13,42 +17,183 @@ from app.router.user_router import get_current_user
 
 router = APIRouter()
 
-@router.get("/{post_id}/", response_model=PostPublic, summary="透過 post_id 取得貼文內容")
+# 各 API 每個請求最多可執行的 SQL 句數 (快取全部未命中、含驗證身分查詢的最壞情況)
+# 改動後超過預算表示多了來回，開啟 QUERY_BUDGET_ENFORCE 時請求會直接失敗
+
+@router.get("/{post_id}/", response_model=PostPublic, summary="透過 post_id 取得貼文內容",
+    dependencies=[Depends(route_query_budget(9))]
+)
 async def get_by_id(
     post_id: uuid.UUID,    
-    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
     current_user : UserPublic = Depends(get_current_user) 
 ):
     """
     從post_id取得貼文內容
     內容包含：貼文者資訊、點讚數、點讚狀態、置頂留言以及所有回覆列表。
+    回應帶有 ETag，請求帶 If-None-Match 且內容未變更時回傳 304。
+    內容已在 Service 組成輸出格式，直接以 orjson 編碼回傳 (不再經過 response_model 驗證)。
     """
-    if not await PostService.check_post(db, post_id):
+    if if_none_match:
+        # 條件式請求：先以主鍵查版本，未變更就不用載入內容
+        meta = await PostService.get_version(db, post_id)
+        if meta is None:
+            raise errors.PostErrors.NotFound()
+        owner_id, version = meta
+        if await BlacklistService.is_blocked(owner_id, current_user.id, db):
+            raise errors.PostErrors.Blocked()
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user.id, db)
+        etag = PostService.make_etag(current_user.id, blocked_ids, [(post_id, version)])
+        if ETagHelper.matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # 存在與作者檢查直接併在貼文查詢裡，封鎖關係由黑名單快取判斷
+    post = await PostService.get_by_id(db, post_id, current_user.id)
+    if not post:
         raise errors.PostErrors.NotFound()
     
+    if await BlacklistService.is_blocked(post.owner_id, current_user.id , db):
+        raise errors.PostErrors.Blocked()
+
+    blocked_ids = await BlacklistService.get_blocked_ids(current_user.id, db)
+    etag = PostService.make_etag(current_user.id, blocked_ids, [(post.id, post.version)])
+    return json_response(post.data, headers={"ETag": etag})
+
+@router.post("/batch-get", response_model=list[PostPublic], summary="一次取得多篇貼文內容",
+    dependencies=[Depends(route_query_budget(6, per_shard=3))]
+)
+async def batch_get_posts(
+    body: PostBatchGet,
+    db: AsyncSession = Depends(get_read_db),
+    current_user : UserPublic = Depends(get_current_user)
+):
+    """
+    依 ids 一次取得多篇貼文的完整內容 (與 GET /posts/{post_id}/ 相同的格式)，依傳入順序回傳，重複的 id 只回傳一次。
+    不存在或與目前使用者有封鎖關係的貼文直接略過，不會回傳 404/403。
+    黑名單只解析一次，貼文、留言與按讚狀態各以一句 IN 查詢取得，查詢次數不隨筆數增加。
+    """
+    posts = await PostService.get_by_ids(db, body.ids, current_user.id)
+    return json_response([post.data for post in posts])
+
+@router.get("/{post_id}/thread", response_model=PostThread, summary="取得巢狀留言樹",
+    dependencies=[Depends(route_query_budget(8))]
+)
+async def get_thread(
+    post_id: uuid.UUID,
+    max_depth: int = Query(3, ge=1, le=10, description="最多展開幾層回覆"),
+    limit: int = Query(10, ge=1, le=50, description="每則貼文最多顯示幾則回覆"),
+    cursor: str | None = Query(None, description="載入 post_id 更多回覆用的游標 (replies_cursor)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user : UserPublic = Depends(get_current_user)
+):
+    """
+    一次取得貼文底下的整棵留言樹。
+    被截斷的節點會帶 has_more_replies 與 replies_cursor，可再以該節點 id 呼叫本 API 載入更多。
+    """
+    if not await PostService.check_post(db, post_id):
+        raise errors.PostErrors.NotFound()
+
     owner_id = await PostService.get_owner_id(db, post_id)
-    
+
     if await BlacklistService.is_blocked(owner_id, current_user.id , db):
         raise errors.PostErrors.Blocked()
-    
-    return await PostService.get_by_id(db, post_id, current_user.id)    
 
-@router.get("/", response_model=list[PostSimple], summary="取得貼文列表")
+    return await PostService.get_thread(db, post_id, current_user.id, max_depth, limit, cursor)
+
+@router.get("/", response_model=list[PostSimple], summary="取得貼文列表",
+    dependencies=[Depends(route_query_budget(8, per_shard=3))]
+)
 async def get_post_feed(
-    skip: int = Query(0, ge=0),
+    skip: int = Query(0, ge=0, description="舊版位移分頁，建議改用 cursor"),
     limit: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
     # 這裡直接引用你剛才貼給我的那個函數
     current_user : UserPublic = Depends(get_current_user) 
 ):
     """
     分頁取得主貼文列表。
-    1. 僅回傳 parent_id 為 null 的主貼文。
+    1. 僅回傳 parent_id 為 null 的主貼文，依建立時間由新到舊排序。
     2. 自動排除黑名單用戶的內容。
+    3. 若還有下一頁，會在回應標頭 X-Next-Cursor 帶回游標，下次請求帶入 cursor 參數即可。
+    4. 回應帶有 ETag，請求帶 If-None-Match 且該頁未變更時回傳 304。
+    列表項目已在 Service 組成輸出格式，直接以 orjson 編碼回傳 (不再經過 response_model 驗證)。
+    """
+    if if_none_match:
+        etag = await PostService.get_feed_etag(db, current_user.id, skip, limit, cursor)
+        if ETagHelper.matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    posts, next_cursor = await PostService.get_posts(db, current_user.id, skip, limit, cursor)
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    blocked_ids = await BlacklistService.get_blocked_ids(current_user.id, db)
+    headers["ETag"] = PostService.get_feed_etag_from_items(current_user.id, blocked_ids, posts, next_cursor)
+    return json_response([p.data for p in posts], headers=headers)
+
+@router.get("/home", response_model=list[PostSimple], summary="取得首頁動態",
+    dependencies=[Depends(route_query_budget(7, per_shard=3))]
+)
+async def get_home_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user : UserPublic = Depends(get_current_user)
+):
+    """
+    取得自己與追蹤對象的主貼文，依建立時間由新到舊排序。
+    1. 自動排除黑名單用戶的內容。
+    2. 若還有下一頁，會在回應標頭 X-Next-Cursor 帶回游標，下次請求帶入 cursor 參數即可。
+    """
+    posts, next_cursor = await PostService.get_home_posts(db, current_user.id, limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return json_response([p.data for p in posts], headers=headers)
+
+@router.get("/search", response_model=list[PostSimple], summary="搜尋貼文",
+    dependencies=[Depends(route_query_budget(6, per_shard=2))]
+)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200, description="關鍵字，以空白分隔，每個關鍵字都必須出現"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user : UserPublic = Depends(get_current_user)
+):
     """
-    return await PostService.get_posts(db, current_user.id, skip, limit)    
+    全文搜尋主貼文內容 (支援中文)，依相關度排序。
+    1. 以空白分隔的每個關鍵字都必須出現。
+    2. 所有關鍵字都不到 3 個字 (例如「天氣」) 時無法計算相關度，改依發文時間由新到舊排序。
+    3. 自動排除黑名單用戶的內容。
+    4. 若還有下一頁，會在回應標頭 X-Next-Cursor 帶回游標，下次請求帶入 cursor 參數即可。
+    """
+    posts, next_cursor = await PostService.search_posts(db, current_user.id, q, limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return json_response([p.data for p in posts], headers=headers)
 
-@router.post("/create", status_code=status.HTTP_201_CREATED, summary="建立新貼文")
+@router.get("/export", summary="匯出自己的所有貼文與留言 (NDJSON)",
+    dependencies=[Depends(route_query_budget(2, per_shard=1))]
+)
+async def export_my_posts(
+    db: AsyncSession = Depends(get_read_db),
+    current_user : UserPublic = Depends(get_current_user)
+):
+    """
+    以 NDJSON (每行一個 JSON) 串流匯出目前使用者寫的所有主貼文與留言，依建立時間由舊到新。
+    每行包含 id、parent_id (主貼文為 null)、content、createdDateTime、updatedDateTime、likes_count。
+    資料以資料庫游標邊讀邊送出，用戶端接收較慢時會暫停讀取，伺服器的記憶體用量不隨資料量增加。
+    """
+    return StreamingResponse(
+        PostService.export_posts(db, current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="posts.ndjson"'}
+    )
+
+@router.post("/create", status_code=status.HTTP_201_CREATED, summary="建立新貼文",
+    dependencies=[Depends(route_query_budget(6))]
+)
 async def create_new_post(
     post_in: PostCreate,
     db: AsyncSession = Depends(get_db),
@@ -60,17 +205,20 @@ async def create_new_post(
     2. parent_id 有值代表回覆某篇貼文
     """
     if post_in.parent_id:
-        parent_post = await PostService.get_by_id(db, post_in.parent_id, current_user.id)
-        if not parent_post:
+        # 只需要確認上層貼文存在並取得作者
+        parent_owner_id = await PostService.get_owner_id(db, post_in.parent_id)
+        if parent_owner_id is None:
             raise errors.PostErrors.NotFound()
             
-        is_blocked = await BlacklistService.is_blocked(parent_post.owner.id, current_user.id, db)
+        is_blocked = await BlacklistService.is_blocked(parent_owner_id, current_user.id, db)
     
         if is_blocked:
             raise errors.PostErrors.Blocked()
     return await PostService.create_post(db, post_in, user_id=current_user.id)    
 
-@router.post("/{post_id}/top-comment", summary="置頂留言")
+@router.post("/{post_id}/top-comment", summary="置頂留言",
+    dependencies=[Depends(route_query_budget(4))]
+)
 async def set_post_top_Comment(
     post_id: uuid.UUID,
     comment_id: uuid.UUID,
@@ -94,18 +242,39 @@ async def set_post_top_Comment(
     
     return {"status": status.HTTP_200_OK}
 
-@router.post("/{post_id}/like", summary="按讚貼文")
+@router.post("/{post_id}/like", summary="按讚貼文",
+    dependencies=[Depends(route_query_budget(6))]
+)
 async def toggle_post_like(
     post_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
     current_user: UserPublic = Depends(get_current_user)
 ):
     """    
     切換按讚狀態。
     若未按讚則執行按讚；若已按讚則取消按讚。
     """
-    if not await PostService.check_post(db, post_id):    
+    # 存在檢查走讀取池，延遲寫入模式下整個請求都不會占用寫入連線
+    if not await PostService.check_post(read_db, post_id):    
         raise errors.PostErrors.NotFound()
     
-    liked = await PostService.toggle_like(db, post_id, current_user.id)
-    return {"status": status.HTTP_200_OK, "is_liked": liked}
\ No newline at end of file
+    liked = await PostService.toggle_like(db, post_id, current_user.id, read_db)
+    return {"status": status.HTTP_200_OK, "is_liked": liked}
+
+@router.post("/batch-like", response_model=list[PostLikeState], summary="批次按讚/取消按讚",
+    dependencies=[Depends(route_query_budget(8, per_shard=7))]
+)
+async def batch_like_posts(
+    body: PostLikeBatch,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    current_user: UserPublic = Depends(get_current_user)
+):
+    """
+    一次設定多篇貼文的按讚狀態 (liked 為 true 按讚、false 取消按讚，已是該狀態的略過)，所有變更在同一個交易內寫入。
+    任一篇貼文不存在時回傳 404，全部都不會套用。
+    """
+    desired = {item.post_id: item.liked for item in body.items}
+    states = await PostService.set_likes(db, current_user.id, desired, read_db)
+    return [PostLikeState(post_id=post_id, is_liked=liked) for post_id, liked in states.items()]
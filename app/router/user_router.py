@@ -1,14 +1,17 @@
+import uuid
 import jwt
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core import errors
-from app.database import get_db
+from app.core.serialization import json_response
+from app.database import get_db, get_read_db
 from app.models.user import UserRole
 from app.schemas.user import UserCreate, UserLogin, UserPublic
 from app.service.user_service import UserService
 from app.core.security import SecurityHelper
+from app.core.auth_cache import AuthCache
 from app.core.config import settings
 
 
@@ -16,8 +19,15 @@ router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
-async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)) -> UserPublic: 
+async def get_current_user(db: AsyncSession = Depends(get_read_db), token: str = Depends(oauth2_scheme)) -> UserPublic: 
         credentials_exception = errors.AuthErrors.InvalidToken()
+
+        # 無狀態模式下同一個 Token 解碼過就直接使用快取結果
+        digest = AuthCache.token_digest(token)
+        cached_user = AuthCache.get_token_user(digest)
+        if cached_user is not None:
+                return cached_user
+
         try:
                 # 解碼 Token
                 payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
@@ -26,14 +36,29 @@ async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depe
                         raise credentials_exception
         except jwt.InvalidTokenError:
                 raise credentials_exception        
-        user = await UserService.get_user_by_email(email, db)
+
+        if settings.AUTH_STATELESS and "uid" in payload and "role" in payload:
+                # 無狀態模式：信任 Token 內的 claims 直到 Token 過期，除非該使用者在簽發 (iat) 後被標記失效
+                uid = uuid.UUID(payload["uid"])
+                if not AuthCache.is_revoked(uid, payload.get("iat", 0)):
+                        user = UserPublic(id=uid, email=email, name=payload.get("name"), role=payload["role"])
+                        if "exp" in payload:
+                                AuthCache.put_token_user(digest, user, payload["exp"])
+                        return user
+
+        user = AuthCache.get_user(email)
         if user is None:
-                raise credentials_exception        
-        return UserPublic.model_validate(user)
+                generation = AuthCache.user_generation()
+                db_user = await UserService.get_user_by_email(email, db)
+                if db_user is None:
+                        raise credentials_exception        
+                user = UserPublic.model_validate(db_user)
+                AuthCache.put_user(user, generation)
+        return user
 
 # 登入處理
 @router.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):    
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_read_db)):    
         user_in = UserLogin(
                 email=form_data.username, 
                 password=form_data.password
@@ -43,7 +68,10 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
                 raise errors.UserErrors.InvalidCredentials()
 
         # 驗證成功，發放 Token
-        access_token = SecurityHelper.create_access_token(data={"sub": user.email})
+        claims = {"sub": user.email}
+        if settings.AUTH_STATELESS:
+                claims.update({"uid": str(user.id), "role": int(user.role), "name": user.name})
+        access_token = SecurityHelper.create_access_token(data=claims)
         return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -53,15 +81,20 @@ async def get_my_info(current_user = Depends(get_current_user)):
         return current_user
 
 @router.get("/", response_model=list[UserPublic])
-async def get_users(name: str = None, skip: int = 0, limit: int = 20, db: AsyncSession = Depends(get_db), current_user: UserPublic = Depends(get_current_user)):
+async def get_users(name: str = None, skip: int = 0, limit: int = 20, db: AsyncSession = Depends(get_read_db), current_user: UserPublic = Depends(get_current_user)):
         if current_user.role != UserRole.ADMIN:        
                 raise errors.AuthErrors.AccessDenied()
-        return await UserService.get_users(db, name, skip, limit)
+        users = await UserService.get_users(db, name, skip, limit)
+        return json_response([u.public() for u in users])
 
 # 建立User
 @router.post("/create")
-async def create_user_api(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
-        new_user = await UserService.create_user(user_in, db)
+async def create_user_api(
+        user_in: UserCreate,
+        db: AsyncSession = Depends(get_db),
+        read_db: AsyncSession = Depends(get_read_db)
+):
+        new_user = await UserService.create_user(user_in, db, read_db)
         if new_user is None:
                 raise errors.UserErrors.AlreadyExists()
         return new_user
@@ -1,6 +1,6 @@
 # app/schemas/__init__.py
 from .user import UserCreate, UserUpdate, UserPublic
-from .post import PostCreate, PostEdit, PostPublic
+from .post import PostCreate, PostEdit, PostPublic, PostThread
 
 # ViewModel tables
-__all__ = ["UserCreate", "UserUpdate", "UserPublic", "PostCreate", "PostEdit", "PostPublic"]
\ No newline at end of file
+__all__ = ["UserCreate", "UserUpdate", "UserPublic", "PostCreate", "PostEdit", "PostPublic", "PostThread"]
\ No newline at end of file
@@ -42,5 +42,38 @@ class PostPublic(PostSimple):
     comment: list["PostSimple"] = Field([], description="該貼文下方的所有回覆貼文列表")
 
 
+# 一次取得多篇貼文 (輸入)
+class PostBatchGet(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=100, description="貼文 ID 列表 (最多 100 筆)")
+
+# 批次按讚的單筆操作
+class PostLikeChange(BaseModel):
+    post_id: uuid.UUID = Field(description="貼文 ID")
+    liked: bool = Field(description="true 為按讚、false 為取消按讚")
+
+# 批次按讚 (輸入)
+class PostLikeBatch(BaseModel):
+    items: list[PostLikeChange] = Field(min_length=1, max_length=100, description="按讚操作列表 (最多 100 筆)，同一篇貼文以最後一筆為準")
+
+# 批次按讚的結果
+class PostLikeState(BaseModel):
+    post_id: uuid.UUID = Field(description="貼文 ID")
+    is_liked: bool = Field(description="套用後是否為已按讚")
+
+# 巢狀留言樹 (單一節點)
+class PostThread(PostSimple):
+    """
+    留言樹節點，replies 為下一層回覆。
+    has_more_replies 為 True 代表還有回覆未載入：
+    replies_cursor 有值時帶著它呼叫 /posts/{id}/thread 取得後續回覆；
+    沒有值時 (超過深度限制) 直接呼叫 /posts/{id}/thread 展開。
+    """
+    parent_id: Optional[uuid.UUID] = Field(None, description="上層貼文id")
+    replies: list["PostThread"] = Field([], description="下一層回覆")
+    has_more_replies: bool = Field(False, description="是否還有未載入的回覆")
+    replies_cursor: Optional[str] = Field(None, description="載入更多回覆用的游標")
+
+
 # 執行重建，讓PostPublic.replies的 list["PostPublic"] 產生效果
-PostPublic.model_rebuild()
\ No newline at end of file
+PostPublic.model_rebuild()
+PostThread.model_rebuild()
\ No newline at end of file
@@ -1,8 +1,22 @@
 import uuid
 from sqlalchemy import select, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
 from app.models import Blacklist
 
+# 每位使用者的雙向封鎖名單快取，key 為 user_id，value 為 frozenset
+# 以所有名單的 ID 總數 (+1 計入空名單) 作為記憶體上限
+blocked_ids_cache = LRUCache(
+    max_entries=settings.BLACKLIST_CACHE_MAX_USERS,
+    max_weight=settings.BLACKLIST_CACHE_MAX_IDS,
+    weigher=lambda ids: len(ids) + 1
+)
+
+# 其他 worker 的封鎖/解除封鎖：無法推算名單，直接讓雙方的快取失效
+invalidation_bus.register("blacklist", lambda keys: blocked_ids_cache.invalidate(*map(uuid.UUID, keys)))
+
 class BlacklistService:
     @staticmethod
     async def block_user(user_id: uuid.UUID, blocked_user_id: uuid.UUID, db: AsyncSession):
@@ -19,6 +33,18 @@ class BlacklistService:
         db.add(new_block)
         await db.commit()
         await db.refresh(new_block)
+
+        # write-through：雙方的名單都要加上對方
+        cached = {
+            user_id: blocked_ids_cache.peek(user_id),
+            blocked_user_id: blocked_ids_cache.peek(blocked_user_id)
+        }
+        blocked_ids_cache.invalidate(user_id, blocked_user_id)
+        if cached[user_id] is not None:
+            blocked_ids_cache.put(user_id, cached[user_id] | {blocked_user_id})
+        if cached[blocked_user_id] is not None:
+            blocked_ids_cache.put(blocked_user_id, cached[blocked_user_id] | {user_id})
+        invalidation_bus.publish("blacklist", user_id, blocked_user_id)
         return new_block
 
     @staticmethod
@@ -36,6 +62,9 @@ class BlacklistService:
         if target:
             await db.delete(target)
             await db.commit()
+            # 對方可能也封鎖了自己，名單無法直接推算，讓雙方下次讀取時重新查詢
+            blocked_ids_cache.invalidate(user_id, blocked_user_id)
+            invalidation_bus.publish("blacklist", user_id, blocked_user_id)
             return True
         return False
 
@@ -44,6 +73,10 @@ class BlacklistService:
         """
         檢查user_a與user_b是否在有封鎖關係
         """
+        if settings.BLACKLIST_CACHE_ENABLED:
+            # 名單本身就是雙向的，直接用快取判斷
+            return user_b in await BlacklistService.get_blocked_ids(user_a, db)
+
         query = select(Blacklist).where(
                 or_(
                     and_(Blacklist.user_id == user_a, Blacklist.blocked_user_id == user_b),
@@ -54,15 +87,32 @@ class BlacklistService:
         return result.scalar_one_or_none() is not None
         
     @staticmethod
-    async def get_blocked_ids(user_id: uuid.UUID, db: AsyncSession) -> set[uuid.UUID]:
+    async def get_blocked_ids(user_id: uuid.UUID, db: AsyncSession) -> frozenset[uuid.UUID]:
         """
         取得雙向封鎖名單 ID。
-        使用 set 是為了自動去除重複的 ID。
+        使用 set 是為了自動去除重複的 ID；回傳 frozenset 避免呼叫端改到快取內容。
         """
+        if settings.BLACKLIST_CACHE_ENABLED:
+            cached = blocked_ids_cache.get(user_id)
+            if cached is not None:
+                return cached
+        generation = blocked_ids_cache.generation()
+
         # 我封鎖的人  
         query1 = select(Blacklist.blocked_user_id).where(Blacklist.user_id == user_id)
         # 封鎖我的人
         query2 = select(Blacklist.user_id).where(Blacklist.blocked_user_id == user_id)
         res1 = await db.execute(query1)
         res2 = await db.execute(query2)
-        return set(res1.scalars().all()) | set(res2.scalars().all())
\ No newline at end of file
+        blocked_ids = frozenset(res1.scalars().all()) | frozenset(res2.scalars().all())
+
+        if settings.BLACKLIST_CACHE_ENABLED:
+            blocked_ids_cache.put(user_id, blocked_ids, generation)
+        return blocked_ids
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """
+        黑名單快取的命中統計
+        """
+        return blocked_ids_cache.stats()
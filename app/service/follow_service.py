@@ -0,0 +1,174 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import select, insert, delete, update, literal, bindparam, true, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.database import is_sharded
+from app.models import Follow, Post, Timeline, User
+from app.service import read_queries
+from app.service.read_queries import UserRecord
+
+class FollowService:
+    @staticmethod
+    async def follow(follower_id: uuid.UUID, followee_id: uuid.UUID, db: AsyncSession) -> bool:
+        """
+        追蹤使用者，已經追蹤過時回傳 False。
+        對方不是大量追蹤者的帳號時，把對方最近的主貼文回填到自己的時間軸；
+        大量追蹤者的帳號本來就是讀取時合併，不需要回填。
+        """
+        # 以 INSERT OR IGNORE 的影響列數判斷是否已追蹤：先查再寫在同時送出的重複請求下會撞主鍵變成 500
+        result = await db.execute(
+            insert(Follow).prefix_with("OR IGNORE").values(follower_id=follower_id, followee_id=followee_id)
+        )
+        if result.rowcount == 0:
+            return False
+
+        result = await db.execute(
+            update(User)
+            .where(User.id == followee_id)
+            .values(followers_count=User.followers_count + 1, updatedDateTime=User.updatedDateTime)
+            .returning(User.followers_count)
+        )
+        followers_count = result.scalar_one()
+
+        if followers_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+            await FollowService._backfill(db, followee_id, follower_id)
+        await db.commit()
+        return True
+
+    @staticmethod
+    async def unfollow(follower_id: uuid.UUID, followee_id: uuid.UUID, db: AsyncSession) -> bool:
+        """
+        取消追蹤，並從自己的時間軸移除對方的貼文
+        """
+        result = await db.execute(
+            delete(Follow).where(Follow.follower_id == follower_id, Follow.followee_id == followee_id)
+        )
+        if result.rowcount == 0:
+            return False
+
+        result = await db.execute(
+            update(User)
+            .where(User.id == followee_id)
+            .values(followers_count=User.followers_count - 1, updatedDateTime=User.updatedDateTime)
+            .returning(User.followers_count)
+        )
+        if result.scalar_one() == settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+            # 剛降回門檻：之後的發文會 fan-out，讀取首頁時也不再合併這位作者，
+            # 超過門檻期間只寫入作者自己時間軸的貼文要補進其餘追蹤者的時間軸，否則會從首頁消失
+            await FollowService._backfill(db, followee_id)
+        await db.execute(
+            delete(Timeline).where(Timeline.user_id == follower_id, Timeline.author_id == followee_id)
+        )
+        await db.commit()
+        return True
+
+    @staticmethod
+    async def _backfill(db: AsyncSession, followee_id: uuid.UUID, follower_id: uuid.UUID | None = None) -> None:
+        """
+        把作者最近的 TIMELINE_BACKFILL_SIZE 篇主貼文寫進追蹤者的時間軸，已存在的略過 (由呼叫端 commit)。
+        follower_id 為 None 時寫進該作者所有追蹤者的時間軸 (追蹤者數量從門檻之上降回門檻時)。
+        """
+        columns = ["user_id", "post_id", "author_id", "createdDateTime"]
+        followers = [Follow.followee_id == followee_id]
+        if follower_id is not None:
+            followers.append(Follow.follower_id == follower_id)
+
+        if is_sharded():
+            # 分片時貼文不在主資料庫，先從各分片取出最近的主貼文再寫入時間軸
+            recent_keys = await read_queries.fetch_recent_post_keys(db, followee_id, settings.TIMELINE_BACKFILL_SIZE)
+            if recent_keys:
+                # 以 Core 的資料表執行：多組參數時 ORM 會把 insert(Timeline) 當成批次新增，不支援 INSERT ... SELECT
+                await db.execute(
+                    insert(read_queries.timeline_table)
+                    .prefix_with("OR IGNORE")
+                    .from_select(columns, select(
+                        Follow.follower_id,
+                        bindparam("b_post_id", type_=Timeline.post_id.type),
+                        literal(followee_id, Timeline.author_id.type),
+                        bindparam("b_created", type_=String)
+                    ).where(*followers)),
+                    [{"b_post_id": id, "b_created": created} for id, _, created in recent_keys]
+                )
+            return
+
+        recent = (
+            select(Post.id, Post.owner_id, Post.createdDateTime)
+            .where(Post.owner_id == followee_id, Post.parent_id == None)
+            .order_by(Post.createdDateTime.desc(), Post.id.desc())
+            .limit(settings.TIMELINE_BACKFILL_SIZE)
+            .subquery()
+        )
+        await db.execute(
+            insert(Timeline)
+            .prefix_with("OR IGNORE")
+            .from_select(columns, select(
+                Follow.follower_id, recent.c.id, recent.c.owner_id, recent.c.createdDateTime
+            ).join_from(Follow, recent, true()).where(*followers))
+        )
+
+    @staticmethod
+    async def is_following(follower_id: uuid.UUID, followee_id: uuid.UUID, db: AsyncSession) -> bool:
+        result = await db.execute(
+            select(Follow.follower_id).where(Follow.follower_id == follower_id, Follow.followee_id == followee_id)
+        )
+        return result.first() is not None
+
+    @staticmethod
+    async def get_following(user_id: uuid.UUID, db: AsyncSession, skip: int = 0, limit: int = 20) -> list[UserRecord]:
+        """
+        我追蹤的使用者
+        """
+        return await read_queries.fetch_follow_users(db, user_id, followers=False, skip=skip, limit=limit)
+
+    @staticmethod
+    async def get_followers(user_id: uuid.UUID, db: AsyncSession, skip: int = 0, limit: int = 20) -> list[UserRecord]:
+        """
+        追蹤我的使用者
+        """
+        return await read_queries.fetch_follow_users(db, user_id, followers=True, skip=skip, limit=limit)
+
+    @staticmethod
+    async def fan_out(db: AsyncSession, post_id: uuid.UUID, author_id: uuid.UUID, created: datetime) -> None:
+        """
+        fan-out-on-write：把新的主貼文寫進作者自己與追蹤者的時間軸 (由呼叫端 commit)。
+        時間軸在主資料庫：未分片時與發文同一個交易；分片時貼文先在分片提交，再以主資料庫的 Session 寫入。
+        追蹤者超過 TIMELINE_FANOUT_MAX_FOLLOWERS 的作者只寫入自己的時間軸，追蹤者讀取首頁時再合併。
+        """
+        # 與 SQLite 以 CURRENT_TIMESTAMP 寫入貼文的字串格式相同 (時間軸的游標以字串比較)
+        created_at = literal(created.isoformat(sep=" "), String)
+        await db.execute(
+            insert(Timeline).values(user_id=author_id, post_id=post_id, author_id=author_id, createdDateTime=created_at)
+        )
+        followers_count = select(User.followers_count).where(User.id == author_id).scalar_subquery()
+        await db.execute(
+            insert(Timeline).from_select(
+                ["user_id", "post_id", "author_id", "createdDateTime"],
+                select(
+                    Follow.follower_id,
+                    literal(post_id, Timeline.post_id.type),
+                    literal(author_id, Timeline.author_id.type),
+                    created_at
+                )
+                .where(
+                    Follow.followee_id == author_id,
+                    followers_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+                )
+            )
+        )
+
+    @staticmethod
+    async def get_high_fanout_followees(user_id: uuid.UUID, db: AsyncSession) -> list[uuid.UUID]:
+        """
+        我追蹤的人之中發文不會 fan-out 的帳號 (讀取首頁時需另外合併他們的貼文)
+        """
+        query = (
+            select(Follow.followee_id)
+            .join(User, User.id == Follow.followee_id)
+            .where(
+                Follow.follower_id == user_id,
+                User.followers_count > settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+            )
+        )
+        result = await db.execute(query)
+        return list(result.scalars().all())
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from sqlalchemy import select, insert, delete, tuple_
+from app.core.config import settings
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import group_by_shard, post_session, post_session_factory
+from app.models import Like
+from app.service import like_counter
+from app.service.post_cache import invalidate_posts
+
+# 按讚延遲寫入 (write-behind) 緩衝區
+# 開啟 LIKE_WRITE_BEHIND 後，toggle_like 只更新記憶體中每個 (user, post) 的狀態並立即回應，
+# 背景工作每隔 LIKE_FLUSH_INTERVAL_MS 或累積到 LIKE_FLUSH_BATCH_SIZE 筆時，
+# 把同一對 (user, post) 的多次切換合併成最終狀態，以單一交易批次寫入。
+class LikeWriteBuffer:
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # (user_id, post_id) -> (DB 原本的狀態, 目前的狀態)
+        self._pending: dict[tuple[uuid.UUID, uuid.UUID], tuple[bool, bool]] = {}
+        # 正在寫入中的批次，寫入完成前讀取仍要算進去
+        self._flushing: dict[tuple[uuid.UUID, uuid.UUID], tuple[bool, bool]] = {}
+        # post_id -> 尚未寫入的按讚數增減
+        self._pending_delta: dict[uuid.UUID, int] = defaultdict(int)
+        self._flushing_delta: dict[uuid.UUID, int] = {}
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        # 統計
+        self.toggles = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.LIKE_WRITE_BEHIND
+
+    def _current(self, key: tuple[uuid.UUID, uuid.UUID]) -> tuple[bool, bool] | None:
+        if key in self._pending:
+            return self._pending[key]
+        if key in self._flushing:
+            # 寫入中的狀態視為 DB 已經是這個狀態
+            desired = self._flushing[key][1]
+            return desired, desired
+        return None
+
+    async def toggle(self, db: AsyncSession, post_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+        """
+        切換按讚狀態並回傳切換後的狀態 (True = 已按讚)，實際寫入由背景批次處理
+        db 為請求已在使用的 Session (建議用唯讀的)：同一個請求不再另外向連線池要第二條連線，
+        大量同時按讚時不會因為每個請求都占著一條、又在等另一條而把連線池卡死
+        """
+        key = (user_id, post_id)
+        state = self._current(key)
+        if state is None:
+            async with post_session(db, post_id) as pdb:
+                result = await pdb.execute(
+                    select(Like.post_id).where(Like.user_id == user_id, Like.post_id == post_id)
+                )
+                liked = result.first() is not None
+            # 查詢期間可能已有同一對的切換，以記憶體中的狀態為準
+            state = self._current(key) or (liked, liked)
+
+        baseline, desired = state
+        desired = not desired
+        self._record(key, baseline, desired)
+        return desired
+
+    def set_liked(self, user_id: uuid.UUID, desired: dict[uuid.UUID, bool], db_liked: set[uuid.UUID]) -> None:
+        """
+        批次設定按讚狀態 (不是切換)，已是目標狀態的略過
+        db_liked 為呼叫端查出 DB 中已按讚的貼文，緩衝區內有尚未寫入的狀態時以緩衝區為準
+        """
+        for post_id, liked in desired.items():
+            key = (user_id, post_id)
+            baseline, current = self._current(key) or (post_id in db_liked, post_id in db_liked)
+            if current != liked:
+                self._record(key, baseline, liked)
+
+    def _record(self, key: tuple[uuid.UUID, uuid.UUID], baseline: bool, desired: bool) -> None:
+        if desired == baseline:
+            # 來回切換後與 DB 相同，不需要寫入
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] = (baseline, desired)
+        self._pending_delta[key[1]] += 1 if desired else -1
+        self.toggles += 1
+
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def apply_liked(self, user_id: uuid.UUID, post_ids: list[uuid.UUID], liked_ids: set[uuid.UUID]) -> set[uuid.UUID]:
+        """
+        以尚未寫入的狀態修正 DB 查到的按讚貼文
+        """
+        if not self._pending and not self._flushing:
+            return liked_ids
+        liked_ids = set(liked_ids)
+        for post_id in post_ids:
+            state = self._current((user_id, post_id))
+            if state is None:
+                continue
+            if state[1]:
+                liked_ids.add(post_id)
+            else:
+                liked_ids.discard(post_id)
+        return liked_ids
+
+    def likes_count(self, post_id: uuid.UUID, db_count: int) -> int:
+        """
+        以尚未寫入的增減修正 DB 的按讚數
+        """
+        return db_count + self._pending_delta.get(post_id, 0) + self._flushing_delta.get(post_id, 0)
+
+    async def flush(self) -> int:
+        """
+        把目前累積的切換寫入 DB，回傳寫入 (新增 + 刪除) 的筆數
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                self._pending_delta.clear()
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            self._flushing_delta, self._pending_delta = dict(self._pending_delta), defaultdict(int)
+            started_at = time.perf_counter()
+            try:
+                written = await self._write(self._flushing)
+            except BaseException:
+                self._restore()
+                self.failed_flushes += 1
+                raise
+            finally:
+                self._flushing = {}
+                self._flushing_delta = {}
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = (time.perf_counter() - started_at) * 1000
+            return written
+
+    def _restore(self) -> None:
+        """
+        寫入失敗時把批次放回待寫入區，期間又被切換的以最新狀態為準
+        """
+        for key, (baseline, desired) in self._flushing.items():
+            if key in self._pending:
+                desired = self._pending[key][1]
+            if desired == baseline:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = (baseline, desired)
+        for post_id, delta in self._flushing_delta.items():
+            self._pending_delta[post_id] += delta
+
+    async def _write(self, entries: dict[tuple[uuid.UUID, uuid.UUID], tuple[bool, bool]]) -> int:
+        """
+        分片時每個分片各以一個交易寫入。
+        某個分片失敗時整批會放回待寫入區重試，已寫入的分片會依 DB 的實際狀態略過，不會重複計算。
+        """
+        by_post: dict[uuid.UUID, list] = {}
+        for key in entries:
+            by_post.setdefault(key[1], []).append(key)
+        written = 0
+        for post_ids in group_by_shard(by_post).values():
+            keys = [key for post_id in post_ids for key in by_post[post_id]]
+            written += await self._write_shard(keys, entries)
+        return written
+
+    async def _write_shard(self, keys: list, entries: dict[tuple[uuid.UUID, uuid.UUID], tuple[bool, bool]]) -> int:
+        async with post_session_factory(keys[0][1], write=True)() as db:
+            # 以交易內實際的 DB 狀態為準，只寫入真的有變化的資料，按讚數也依此計算
+            existing = set()
+            for i in range(0, len(keys), 500):
+                result = await db.execute(
+                    select(Like.user_id, Like.post_id)
+                    .where(tuple_(Like.user_id, Like.post_id).in_(keys[i:i + 500]))
+                )
+                existing.update((row.user_id, row.post_id) for row in result)
+
+            to_insert = [key for key in keys if entries[key][1] and key not in existing]
+            to_delete = [key for key in keys if not entries[key][1] and key in existing]
+            deltas: dict[uuid.UUID, int] = defaultdict(int)
+            for _, post_id in to_insert:
+                deltas[post_id] += 1
+            for _, post_id in to_delete:
+                deltas[post_id] -= 1
+
+            if to_insert:
+                await db.execute(
+                    insert(Like),
+                    [{"user_id": user_id, "post_id": post_id} for user_id, post_id in to_insert]
+                )
+            for i in range(0, len(to_delete), 500):
+                await db.execute(
+                    delete(Like).where(tuple_(Like.user_id, Like.post_id).in_(to_delete[i:i + 500]))
+                )
+            parent_ids = await like_counter.apply_deltas(db, deltas)
+            await db.commit()
+        # 交易完成後才清除快取，避免在提交前被舊資料回填
+        invalidate_posts(*deltas, *parent_ids)
+        return len(to_insert) + len(to_delete)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # shield：關閉時取消背景工作不會中斷寫到一半的批次
+                await asyncio.shield(self.flush())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"按讚批次寫入失敗，下次重試: {e}")
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        停止背景工作並把剩下的切換全部寫入
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "toggles": self.toggles,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+like_buffer = LikeWriteBuffer(
+    flush_interval=settings.LIKE_FLUSH_INTERVAL_MS / 1000,
+    batch_size=settings.LIKE_FLUSH_BATCH_SIZE
+)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from sqlalchemy import select, update, delete, func, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from app.core.config import settings
+from app.database import async_session_factory, shard_session_factories
+from app.models import LikeCounter, Post
+
+# 按讚數的分槽計數 (LIKE_COUNTER_SLOTS > 0)
+# 按讚時不更新 post 那一列，而是把按讚數增減與版本遞增累加到該貼文隨機的一個槽位 (like_counter)，
+# 熱門貼文的大量按讚分散寫到 K 列，post 列 (內文、索引) 也不會被反覆改寫。
+# 讀取時以相關子查詢把槽位加回 post.likes_count 與 post.version，輸出與 ETag 都與直接更新時相同。
+# 背景工作定期把槽位的總和併回 post 並刪除槽位 (同一個交易內)，實際的按讚數與版本在合併前後不變，不需要清除快取。
+
+counter_table = LikeCounter.__table__
+post_table = Post.__table__
+
+def enabled() -> bool:
+    return settings.LIKE_COUNTER_SLOTS > 0
+
+def _pending_sum(post, column):
+    return (
+        select(func.coalesce(func.sum(column), 0))
+        .where(counter_table.c.post_id == post.c.id)
+        .scalar_subquery()
+    )
+
+def likes_column(post=post_table):
+    """
+    實際按讚數的欄位：未開啟分槽時就是 post.likes_count，否則加上尚未合併的槽位
+    """
+    if not enabled():
+        return post.c.likes_count
+    return (post.c.likes_count + _pending_sum(post, counter_table.c.likes_delta)).label("likes_count")
+
+def version_column(post=post_table):
+    """
+    實際版本的欄位 (ETag 用)，與 likes_column 相同規則
+    """
+    if not enabled():
+        return post.c.version
+    return (post.c.version + _pending_sum(post, counter_table.c.version_delta)).label("version")
+
+async def add(db, changes: list[tuple[uuid.UUID, int, int]]) -> None:
+    """
+    把 (貼文, 按讚數增減, 版本遞增) 累加到各貼文隨機的一個槽位，由呼叫端 commit
+    """
+    statement = insert(counter_table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[counter_table.c.post_id, counter_table.c.slot],
+        set_={
+            "likes_delta": counter_table.c.likes_delta + statement.excluded.likes_delta,
+            "version_delta": counter_table.c.version_delta + statement.excluded.version_delta
+        }
+    )
+    await db.execute(statement, [
+        {
+            "post_id": post_id,
+            "slot": random.randrange(settings.LIKE_COUNTER_SLOTS),
+            "likes_delta": likes_delta,
+            "version_delta": version_delta
+        }
+        for post_id, likes_delta, version_delta in changes
+    ])
+
+async def apply_deltas(db, deltas: dict[uuid.UUID, int]) -> set[uuid.UUID]:
+    """
+    寫入各貼文的按讚數增減並遞增版本 (開啟分槽時寫到槽位，否則直接更新 post)，由呼叫端 commit。
+    留言的按讚數顯示在上層貼文中，上層貼文的版本也要遞增。
+    回傳上層貼文 id，供呼叫端在提交後清除快取。
+    """
+    changed = [{"b_id": post_id, "b_delta": delta} for post_id, delta in deltas.items() if delta]
+    parent_ids: set[uuid.UUID] = set()
+    if not changed:
+        return parent_ids
+    changed_ids = [row["b_id"] for row in changed]
+    for i in range(0, len(changed_ids), 500):
+        result = await db.execute(
+            select(post_table.c.parent_id)
+            .where(post_table.c.id.in_(changed_ids[i:i + 500]), post_table.c.parent_id.is_not(None))
+        )
+        parent_ids.update(result.scalars())
+
+    if enabled():
+        await add(
+            db,
+            [(row["b_id"], row["b_delta"], 1) for row in changed]
+            + [(parent_id, 0, 1) for parent_id in parent_ids]
+        )
+        return parent_ids
+
+    # 按讚不算編輯貼文，保留原本的 updatedDateTime；版本遞增讓 ETag 失效
+    await db.execute(
+        update(post_table)
+        .where(post_table.c.id == bindparam("b_id"))
+        .values(
+            likes_count=post_table.c.likes_count + bindparam("b_delta"),
+            version=post_table.c.version + 1,
+            updatedDateTime=post_table.c.updatedDateTime
+        ),
+        changed
+    )
+    parent_list = list(parent_ids)
+    for i in range(0, len(parent_list), 500):
+        await db.execute(
+            update(post_table)
+            .where(post_table.c.id.in_(parent_list[i:i + 500]))
+            .values(version=post_table.c.version + 1, updatedDateTime=post_table.c.updatedDateTime)
+        )
+    return parent_ids
+
+class LikeCounterCompactor:
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+        # 統計
+        self.compactions = 0
+        self.failed_compactions = 0
+        self.posts_compacted = 0
+        self.last_compact_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return enabled()
+
+    async def compact(self) -> int:
+        """
+        把所有資料庫 (分片時為每個分片) 的槽位併回 post，回傳合併的貼文數
+        """
+        started_at = time.perf_counter()
+        total = 0
+        for session_factory in shard_session_factories or [async_session_factory]:
+            while True:
+                merged = await self._compact_batch(session_factory)
+                total += merged
+                if merged < self.batch_size:
+                    break
+        self.compactions += 1
+        self.posts_compacted += total
+        self.last_compact_ms = (time.perf_counter() - started_at) * 1000
+        return total
+
+    async def _compact_batch(self, session_factory) -> int:
+        async with session_factory() as db:
+            # 先刪除再加回：DELETE 一開始就取得寫入鎖，期間新的按讚要等這個交易完成後才會寫入新的槽位
+            pending_posts = (
+                select(counter_table.c.post_id)
+                .group_by(counter_table.c.post_id)
+                .limit(self.batch_size)
+            )
+            result = await db.execute(
+                delete(counter_table)
+                .where(counter_table.c.post_id.in_(pending_posts))
+                .returning(counter_table.c.post_id, counter_table.c.likes_delta, counter_table.c.version_delta)
+            )
+            totals: dict[uuid.UUID, list[int]] = {}
+            for row in result:
+                total = totals.setdefault(row.post_id, [0, 0])
+                total[0] += row.likes_delta
+                total[1] += row.version_delta
+            if totals:
+                # 合併不算編輯貼文，保留原本的 updatedDateTime
+                await db.execute(
+                    update(post_table)
+                    .where(post_table.c.id == bindparam("b_id"))
+                    .values(
+                        likes_count=post_table.c.likes_count + bindparam("b_likes"),
+                        version=post_table.c.version + bindparam("b_version"),
+                        updatedDateTime=post_table.c.updatedDateTime
+                    ),
+                    [{"b_id": post_id, "b_likes": likes, "b_version": version} for post_id, (likes, version) in totals.items()]
+                )
+            await db.commit()
+        return len(totals)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # shield：關閉時取消背景工作不會中斷合併到一半的交易
+                await asyncio.shield(self.compact())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_compactions += 1
+                logging.error(f"按讚計數槽位合併失敗，下次重試: {e}")
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        停止背景工作 (尚未合併的槽位留在資料庫，讀取時仍會加總)
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slots": settings.LIKE_COUNTER_SLOTS,
+            "compactions": self.compactions,
+            "failed_compactions": self.failed_compactions,
+            "posts_compacted": self.posts_compacted,
+            "last_compact_ms": self.last_compact_ms
+        }
+
+like_counter_compactor = LikeCounterCompactor(
+    interval=settings.LIKE_COUNTER_COMPACT_INTERVAL_MS / 1000,
+    batch_size=settings.LIKE_COUNTER_COMPACT_BATCH_SIZE
+)
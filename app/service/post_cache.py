@@ -0,0 +1,51 @@
+import uuid
+from dataclasses import dataclass
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+
+# 貼文內容 (get_by_id) 中與檢視者無關的部分
+# is_liked 與黑名單過濾因人而異，每次請求再套用，所以封鎖/解除封鎖不需要讓快取失效
+# 作者、置頂留言與留言直接存成輸出格式的 dict (app.core.serialization)，回應時不需再轉換
+@dataclass(slots=True)
+class CachedPost:
+    id: uuid.UUID
+    content: str
+    owner: dict
+    createdDateTime: object
+    updatedDateTime: object
+    parent_id: uuid.UUID | None
+    likes_count: int
+    version: int
+    top_comment: dict | None
+    # 全部留言 (不含置頂留言)，依建立時間排序，尚未過濾黑名單
+    # 作者被檢視者封鎖時不載入留言 (None)，這種結果不放進快取
+    comments: list[dict] | None
+
+def _weigh(entry: CachedPost) -> int:
+    """
+    以內文長度加上每筆固定成本估算佔用的記憶體 (bytes)
+    """
+    size = 512 + len(entry.content) * 4
+    for comment in entry.comments:
+        size += 512 + len(comment["content"]) * 4
+    if entry.top_comment:
+        size += 512 + len(entry.top_comment["content"]) * 4
+    return size
+
+post_cache = LRUCache(
+    max_entries=settings.POST_CACHE_MAX_ENTRIES,
+    max_weight=settings.POST_CACHE_MAX_BYTES,
+    weigher=_weigh
+)
+
+def invalidate_posts(*post_ids: uuid.UUID | None) -> None:
+    """
+    讓指定貼文的快取失效 (None 會被忽略，方便直接傳入 parent_id)
+    """
+    post_ids = tuple(post_id for post_id in post_ids if post_id is not None)
+    post_cache.invalidate(*post_ids)
+    invalidation_bus.publish("post", *post_ids)
+
+# 其他 worker 修改貼文時只清本機快取
+invalidation_bus.register("post", lambda keys: post_cache.invalidate(*map(uuid.UUID, keys)))
@@ -1,25 +1,59 @@
 import uuid
+from contextlib import aclosing
+from typing import AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, not_
-from sqlalchemy.orm import selectinload
-from app.models import Post, Like
-from app.schemas.post import PostCreate, PostPublic, PostSimple
+from sqlalchemy import (
+    select, insert, update, delete, and_, or_, tuple_, type_coerce, literal, literal_column,
+    table, column, union_all, Integer, String
+)
+from sqlalchemy.orm import aliased
+from app.core import errors, serialization
+from app.core.config import settings
+from app.core.etag import ETagHelper
+from app.core.pagination import CursorHelper
+from app.core.serialization import PostPayload
+from app.database import gather_shards, group_by_shard, new_post_id, post_session, shard_of
+from app.models import Post, Like, User
+from app.schemas.post import PostCreate, PostThread
+from app.schemas.user import UserPublic
 from app.service.black_list_service import BlacklistService
+from app.service.follow_service import FollowService
+from app.service.like_buffer import like_buffer
+from app.service.post_cache import CachedPost, post_cache, invalidate_posts
+from app.service import like_counter, read_queries
+from app.service.read_queries import PostRecord
 
 class PostService:    
     @staticmethod
     async def create_post(db: AsyncSession, obj_in: PostCreate, user_id: uuid.UUID):
         """
         建立新貼文 or 回覆    
+        分片時回覆的 id 會落在上層貼文的分片，整串討論都在同一個分片
         """
-        db_obj = Post(            
-            content=obj_in.content,
-            parent_id=obj_in.parent_id, # 如果是 None 就是發文，有值就是留言
-            owner_id=user_id
-        )
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj, attribute_names=["id", "createdDateTime"])
+        post_id = new_post_id(shard_of(obj_in.parent_id)) if obj_in.parent_id else uuid.uuid4()
+        async with post_session(db, post_id, write=True) as pdb:
+            db_obj = Post(            
+                id=post_id,
+                content=obj_in.content,
+                parent_id=obj_in.parent_id, # 如果是 None 就是發文，有值就是留言
+                owner_id=user_id
+            )
+            pdb.add(db_obj)
+            if obj_in.parent_id:
+                # 新增回覆會改變上層貼文的留言列表
+                await pdb.execute(PostService._version_update(Post.id == obj_in.parent_id))
+            else:
+                # 主貼文寫入追蹤者的首頁時間軸 (時間軸在主資料庫，未分片時與發文同一個交易)
+                await pdb.flush()
+                if pdb is db:
+                    await FollowService.fan_out(db, db_obj.id, user_id, db_obj.createdDateTime)
+            await pdb.commit()
+            invalidate_posts(obj_in.parent_id)
+            await pdb.refresh(db_obj, attribute_names=["id", "createdDateTime"])
+        if obj_in.parent_id is None and pdb is not db:
+            # 分片的寫入連線不掛主資料庫 (各分片的寫入鎖互不影響)，貼文提交後再取得主資料庫的寫入鎖寫入時間軸
+            await FollowService.fan_out(db, db_obj.id, user_id, db_obj.createdDateTime)
+            await db.commit()
         return db_obj
     
     @staticmethod
@@ -32,70 +66,383 @@ class PostService:
         query = (
             update(Post)
             .where(Post.id == post_id, Post.owner_id == owner_id)
-            .values(top_comment_id=top_comment_id)
+            .values(top_comment_id=top_comment_id, version=Post.version + 1)
         )
         
-        result = await db.execute(query)
-        await db.commit()
+        async with post_session(db, post_id, write=True) as pdb:
+            result = await pdb.execute(query)
+            await pdb.commit()
+        invalidate_posts(post_id)
             
         return result.rowcount > 0
     
     @staticmethod
-    async def get_by_id(db: AsyncSession, post_id: uuid.UUID, current_user_id: uuid.UUID):             
+    async def get_by_id(db: AsyncSession, post_id: uuid.UUID, current_user_id: uuid.UUID) -> PostPayload | None:
+        """
+        取得貼文完整內容 (作者、置頂留言、留言列表)，回傳已組好輸出格式 (PostPublic) 的內容。
+        1. 與檢視者無關的內容放在 post_cache，命中時只需查詢按讚狀態。
+        2. 若作者與目前使用者有封鎖關係，不回傳留言，呼叫端需自行回傳 403。
+        3. 黑名單使用者的留言與按讚狀態每次依檢視者套用。
+        """
         blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
-                           
-        query = (
-            select(Post)
-            .options(
-                selectinload(Post.liked_by_users),  # 抓出按讚名單
-                selectinload(Post.user),           # 抓出發文者(owner)
-                selectinload(Post.comments).selectinload(Post.user),         # 抓出子貼文(留言)
-                selectinload(Post.top_comment).selectinload(Post.user)       # 抓出置頂留言
+
+        cached = post_cache.get(post_id) if settings.POST_CACHE_ENABLED else None
+        if cached is None:
+            generation = post_cache.generation()
+            # 要放進快取的內容不能先過濾黑名單；不使用快取時直接在 SQL 端過濾
+            async with post_session(db, post_id) as pdb:
+                cached = await PostService._load_post(
+                    pdb, post_id, frozenset() if settings.POST_CACHE_ENABLED else blocked_ids
+                )
+            if cached is None:
+                return None
+            if settings.POST_CACHE_ENABLED and cached.comments is not None:
+                post_cache.put(post_id, cached, generation)
+
+        owner_id = cached.owner["id"]
+        if owner_id in blocked_ids:
+            simple = serialization.post_simple(cached.id, cached.content, cached.owner, cached.createdDateTime, 0, False)
+            data = serialization.post_public(simple, cached.updatedDateTime, cached.parent_id, None, [])
+            return PostPayload(cached.id, owner_id, cached.version, data)
+
+        visible_comments, top_comment = PostService._visible_parts(cached, blocked_ids)
+        # 主貼文、留言與置頂留言的按讚狀態一次查出
+        liked_ids = await PostService.get_liked_post_ids(
+            db, current_user_id, PostService._liked_targets(cached, visible_comments, top_comment)
+        )
+        return PostService._to_payload(cached, visible_comments, top_comment, liked_ids)
+
+    @staticmethod
+    async def get_by_ids(db: AsyncSession, post_ids: list[uuid.UUID], current_user_id: uuid.UUID) -> list[PostPayload]:
+        """
+        一次取得多篇貼文的完整內容 (與 get_by_id 相同的輸出)，依 post_ids 的順序回傳 (重複的只回傳一次)。
+        不存在、或作者與目前使用者有封鎖關係的貼文直接略過。
+        黑名單只解析一次；快取未命中的貼文、留言與所有按讚狀態各以一句 IN 查詢取得 (分片時每個分片各一句)。
+        """
+        post_ids = list(dict.fromkeys(post_ids))
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
+
+        found: dict[uuid.UUID, CachedPost] = {}
+        if settings.POST_CACHE_ENABLED:
+            for post_id in post_ids:
+                cached = post_cache.get(post_id)
+                if cached is not None:
+                    found[post_id] = cached
+        missing = [post_id for post_id in post_ids if post_id not in found]
+        if missing:
+            generation = post_cache.generation()
+            groups = group_by_shard(missing)
+            loaded = await gather_shards(
+                db, lambda s, shard: PostService._load_posts(s, groups[shard], blocked_ids), list(groups)
             )
-            .where(Post.id == post_id)
+            for posts in loaded:
+                for cached in posts:
+                    found[cached.id] = cached
+                    if settings.POST_CACHE_ENABLED and cached.comments is not None:
+                        post_cache.put(cached.id, cached, generation)
+
+        visible = [
+            found[post_id] for post_id in post_ids
+            if post_id in found and found[post_id].owner["id"] not in blocked_ids
+        ]
+        parts = [PostService._visible_parts(cached, blocked_ids) for cached in visible]
+        liked_ids = await PostService.get_liked_post_ids(db, current_user_id, [
+            post_id
+            for cached, (visible_comments, top_comment) in zip(visible, parts)
+            for post_id in PostService._liked_targets(cached, visible_comments, top_comment)
+        ])
+        return [
+            PostService._to_payload(cached, visible_comments, top_comment, liked_ids)
+            for cached, (visible_comments, top_comment) in zip(visible, parts)
+        ]
+
+    @staticmethod
+    def _visible_parts(cached: CachedPost, blocked_ids: frozenset[uuid.UUID]) -> tuple[list[dict], dict | None]:
+        """
+        依檢視者的黑名單過濾留言與置頂留言
+        """
+        visible_comments = [r for r in cached.comments if r["owner"]["id"] not in blocked_ids]
+        top_comment = cached.top_comment
+        if top_comment and top_comment["owner"]["id"] in blocked_ids:
+            top_comment = None
+        return visible_comments, top_comment
+
+    @staticmethod
+    def _liked_targets(cached: CachedPost, visible_comments: list[dict], top_comment: dict | None) -> list[uuid.UUID]:
+        """
+        需要查詢按讚狀態的貼文：主貼文、留言與置頂留言
+        """
+        post_ids = [cached.id] + [r["id"] for r in visible_comments]
+        if top_comment:
+            post_ids.append(top_comment["id"])
+        return post_ids
+
+    @staticmethod
+    def _to_payload(
+        cached: CachedPost, visible_comments: list[dict], top_comment: dict | None, liked_ids: set[uuid.UUID]
+    ) -> PostPayload:
+        """
+        套用檢視者的按讚狀態，組成 PostPublic 的輸出格式
+        """
+        def for_viewer(r: dict) -> dict:
+            # 快取中的 dict 是共用的，複製一份再套用檢視者的按讚狀態 (鍵的順序不變)
+            return {
+                **r,
+                "likes_count": PostService.get_likes_count(r["id"], r["likes_count"]),
+                "is_liked": r["id"] in liked_ids
+            }
+
+        simple = serialization.post_simple(
+            cached.id,
+            cached.content,
+            cached.owner,
+            cached.createdDateTime,
+            PostService.get_likes_count(cached.id, cached.likes_count),
+            cached.id in liked_ids
         )
-        
-        result = await db.execute(query)
-        p = result.scalar_one_or_none()
-        
-        if not p:
+        data = serialization.post_public(
+            simple,
+            cached.updatedDateTime,
+            cached.parent_id,
+            for_viewer(top_comment) if top_comment else None,
+            [for_viewer(r) for r in visible_comments]
+        )
+        return PostPayload(cached.id, cached.owner["id"], cached.version, data)
+
+    @staticmethod
+    async def _load_post(db: AsyncSession, post_id: uuid.UUID, blocked_ids: frozenset[uuid.UUID]) -> CachedPost | None:
+        """
+        從 DB 載入貼文內容 (唯讀查詢，只選需要的欄位)。
+        1. 貼文、作者、置頂留言與其作者以 JOIN 一次查出。
+        2. 作者在 blocked_ids 中時不載入留言 (comments 為 None)。
+        3. 留言在 SQL 端排除 blocked_ids 的使用者與置頂留言。
+        """
+        found = await read_queries.fetch_post_detail(db, post_id)
+        if found is None:
             return None
-                    
-        final_top_comment = None
-        if p.top_comment and p.top_comment.owner_id not in blocked_ids:
-            final_top_comment = PostSimple.model_validate(p.top_comment)
-
-        # 轉成 Pydantic Schema 回傳
-        return PostPublic(
-            id=p.id,            
-            content=p.content,            
+        p, top_comment = found
+        cached = PostService._to_cached(p, top_comment)
+        if p.owner_id in blocked_ids:
+            return cached
+
+        # 抓出子貼文(留言)
+        comments = await read_queries.fetch_comments(db, post_id, blocked_ids, p.top_comment_id)
+        cached.comments = [r.simple(r.likes_count, False) for r in comments]
+        return cached
+
+    @staticmethod
+    async def _load_posts(
+        db: AsyncSession, post_ids: list[uuid.UUID], viewer_blocked_ids: frozenset[uuid.UUID]
+    ) -> list[CachedPost]:
+        """
+        與 _load_post 相同，以 IN 查詢一次載入多篇貼文與它們的留言。
+        作者被 viewer_blocked_ids 封鎖的貼文不會回傳給檢視者，不載入留言 (comments 為 None)；
+        使用快取時其他貼文的留言不過濾黑名單，才能放進快取。
+        """
+        comment_blocked_ids = frozenset() if settings.POST_CACHE_ENABLED else viewer_blocked_ids
+        rows = await read_queries.fetch_post_details(db, post_ids)
+        posts = [PostService._to_cached(p, top_comment) for p, top_comment in rows]
+        wanted = [cached for cached in posts if cached.owner["id"] not in viewer_blocked_ids]
+        comments = await read_queries.fetch_comments_of(
+            db,
+            [cached.id for cached in wanted],
+            comment_blocked_ids,
+            [p.top_comment_id for p, _ in rows if p.top_comment_id]
+        )
+        for cached in wanted:
+            cached.comments = [r.simple(r.likes_count, False) for r in comments.get(cached.id, [])]
+        return posts
+
+    @staticmethod
+    def _to_cached(p: read_queries.PostDetailRecord, top_comment: PostRecord | None) -> CachedPost:
+        """
+        查詢結果轉成快取的格式 (留言由呼叫端載入)
+        """
+        return CachedPost(
+            id=p.id,
+            content=p.content,
+            owner=p.owner(),
             createdDateTime=p.createdDateTime,
             updatedDateTime=p.updatedDateTime,
             parent_id=p.parent_id,
-            likes_count=len(p.liked_by_users),
-            is_liked=any(user.id == current_user_id for user in p.liked_by_users),
-            owner=p.user,              
-            top_comment=final_top_comment,            
-            comment=[PostSimple.model_validate(r) for r in p.comments if r.id != p.top_comment_id and r.owner_id not in blocked_ids] #目前找不到更適合的方式用SQL過濾暫時由輸出時來過濾
-        )     
+            likes_count=p.likes_count,
+            version=p.version,
+            # 留言存成 PostSimple 的輸出格式，is_liked 在回應時依檢視者套用
+            top_comment=top_comment.simple(top_comment.likes_count, False) if top_comment else None,
+            comments=None
+        )
+
+    @staticmethod
+    async def get_thread(
+        db: AsyncSession,
+        post_id: uuid.UUID,
+        current_user_id: uuid.UUID,
+        max_depth: int = 3,
+        limit: int = 10,
+        cursor: str | None = None
+    ) -> PostThread | None:
+        """
+        以一次遞迴 CTE 查出整棵留言樹。
+        1. 每個節點最多取 limit 則回覆 (依建立時間由舊到新)，超過的部分回傳游標。
+        2. 超過 max_depth 的回覆不展開，只標記 has_more_replies。
+        3. 黑名單使用者的留言 (連同底下的回覆) 直接在 SQL 過濾。
+        4. cursor 用於載入 post_id 底下更多的直接回覆。
+        """
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
+
+        # 遞迴步驟中參照 CTE 本身用的佔位表
+        thread_ref = table("thread", column("id", Post.id.type), column("depth", Integer))
+        child = aliased(Post)
+        sibling = aliased(Post)
+
+        # 每個節點只展開前 limit + 1 則可見回覆 (多一則用來判斷是否被截斷)
+        sibling_filter = [sibling.parent_id == child.parent_id, sibling.owner_id.not_in(blocked_ids)]
+        if cursor:
+            created, last_id = CursorHelper.decode(cursor)
+            sibling_filter.append(or_(
+                sibling.parent_id != post_id,
+                tuple_(sibling.createdDateTime, sibling.id) > tuple_(type_coerce(created, String), last_id)
+            ))
+        first_replies = (
+            select(sibling.id)
+            .where(*sibling_filter)
+            .order_by(sibling.createdDateTime, sibling.id)
+            .limit(limit + 1)
+        )
+
+        anchor = select(
+            Post.id, Post.createdDateTime, literal(0, Integer).label("depth")
+        ).where(Post.id == post_id)
+        step = (
+            select(child.id, child.createdDateTime, thread_ref.c.depth + 1)
+            .select_from(thread_ref.join(child, child.parent_id == thread_ref.c.id))
+            .where(thread_ref.c.depth < max_depth, child.id.in_(first_replies))
+        )
+        # ORDER BY depth 讓 SQLite 以廣度優先展開，LIMIT 限制整棵樹的節點數；
+        # 同一層再依建立時間排序，被 LIMIT 截斷時每個節點保留的一定是最早的幾則回覆
+        thread = (
+            union_all(anchor, step)
+            .order_by(literal_column("depth"), literal_column('"createdDateTime"'), literal_column("id"))
+            .limit(settings.THREAD_MAX_NODES)
+            .cte("thread", recursive=True)
+        )
+
+        grandchild = aliased(Post)
+        has_replies = (
+            select(grandchild.id)
+            .where(grandchild.parent_id == thread.c.id, grandchild.owner_id.not_in(blocked_ids))
+            .exists()
+        )
+        query = (
+            select(thread.c.depth, has_replies.label("has_replies"), Post, User, like_counter.likes_column())
+            .join(Post, Post.id == thread.c.id)
+            .join(User, User.id == Post.owner_id)
+            .order_by(thread.c.depth, Post.createdDateTime, Post.id)
+        )
+        async with post_session(db, post_id) as pdb:
+            rows = (await pdb.execute(query)).all()
+        if not rows:
+            return None
+        node_limit_hit = len(rows) >= settings.THREAD_MAX_NODES
+
+        liked_ids = await PostService.get_liked_post_ids(db, current_user_id, [p.id for _, _, p, _, _ in rows])
+
+        nodes: dict[uuid.UUID, PostThread] = {}
+        raw_replies: dict[uuid.UUID, list] = {}
+        for depth, node_has_replies, p, u, likes_count in rows:
+            # 上層節點已被截斷的回覆不顯示
+            if depth > 0 and p.parent_id not in nodes:
+                continue
+            nodes[p.id] = PostThread(
+                id=p.id,
+                content=p.content,
+                owner=UserPublic.model_validate(u),
+                createdDateTime=p.createdDateTime,
+                likes_count=PostService.get_likes_count(p.id, likes_count),
+                is_liked=p.id in liked_ids,
+                parent_id=p.parent_id,
+                has_more_replies=bool(node_has_replies)
+            )
+            if depth > 0:
+                replies = raw_replies.setdefault(p.parent_id, [])
+                if len(replies) < limit:
+                    replies.append(p)
+                    nodes[p.parent_id].replies.append(nodes[p.id])
+                else:
+                    # 第 limit + 1 則：代表還有更多回覆，由最後一則顯示的回覆產生游標
+                    del nodes[p.id]
+                    last = replies[-1]
+                    nodes[p.parent_id].replies_cursor = CursorHelper.encode(last.createdDateTime, last.id)
+
+        for node_id, node in nodes.items():
+            if not node.has_more_replies or node.replies_cursor:
+                continue
+            if node.replies:
+                if node_limit_hit:
+                    # 觸及節點上限，回覆可能只載入一部分，從最後一則之後繼續
+                    last = raw_replies[node_id][-1]
+                    node.replies_cursor = CursorHelper.encode(last.createdDateTime, last.id)
+                else:
+                    node.has_more_replies = False
+
+        return nodes.get(post_id)
+
+    @staticmethod
+    def get_likes_count(post_id: uuid.UUID, likes_count: int) -> int:
+        """
+        取得按讚數，延遲寫入模式下加上尚未寫入的增減
+        """
+        if like_buffer.enabled:
+            return like_buffer.likes_count(post_id, likes_count)
+        return likes_count
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """
+        貼文內容快取的命中統計
+        """
+        return post_cache.stats()
+
+    @staticmethod
+    async def get_liked_post_ids(db: AsyncSession, user_id: uuid.UUID, post_ids: list[uuid.UUID]) -> set[uuid.UUID]:
+        """
+        一次查出使用者在 post_ids 中按過讚的貼文，只走 like 的主鍵，不載入任何 User。
+        分片時按讚與貼文在同一個分片，每個分片各查一次。
+        """
+        if not post_ids:
+            return set()
+        groups = group_by_shard(post_ids)
+
+        async def fetch(s: AsyncSession, shard: int):
+            result = await s.execute(
+                select(Like.post_id).where(Like.user_id == user_id, Like.post_id.in_(groups[shard]))
+            )
+            return result.scalars().all()
+        liked_ids = set().union(*await gather_shards(db, fetch, list(groups)))
+        if like_buffer.enabled:
+            # 延遲寫入模式下，補上還在緩衝區的切換
+            liked_ids = like_buffer.apply_liked(user_id, post_ids, liked_ids)
+        return liked_ids
         
     #確認是否有該筆post
     @staticmethod
     async def check_post(db: AsyncSession, post_id: uuid.UUID) -> bool:        
-        result = await db.execute(
-            select(Post.id).where(Post.id == post_id)
-        )
-        return result.first() is not None            
+        async with post_session(db, post_id) as pdb:
+            result = await pdb.execute(
+                select(Post.id).where(Post.id == post_id)
+            )
+            return result.first() is not None            
 
     @staticmethod
     async def get_owner_id(db: AsyncSession, post_id: uuid.UUID) -> uuid.UUID | None:
         """
         取得貼文作者 ID，用於權限或黑名單校驗
         """
-        result = await db.execute(
-            select(Post.owner_id).where(Post.id == post_id)
-        )
-        return result.scalar()
+        async with post_session(db, post_id) as pdb:
+            result = await pdb.execute(
+                select(Post.owner_id).where(Post.id == post_id)
+            )
+            return result.scalar()
     
     @staticmethod
     async def is_comment_belong_to_post(db: AsyncSession, post_id: uuid.UUID, comment_id: uuid.UUID) -> bool:
@@ -103,51 +450,229 @@ class PostService:
         檢查 comment_id 是否真的為 post_id 的回覆
         """
         query = select(Post).where(Post.id == comment_id, Post.parent_id == post_id)
-        result = await db.execute(query)
-        return result.scalar_one_or_none() is not None
+        async with post_session(db, post_id) as pdb:
+            result = await pdb.execute(query)
+            return result.scalar_one_or_none() is not None
 
     @staticmethod
-    async def get_posts(db: AsyncSession, current_user_id: uuid.UUID, skip: int = 0, limit: int = 20):
+    async def get_posts(
+        db: AsyncSession,
+        current_user_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 20,
+        cursor: str | None = None
+    ) -> tuple[list[PostPayload], str | None]:
         """
-        依skip、limit搜尋貼文內容
+        取得主貼文列表，依 (createdDateTime, id) 由新到舊排序。
+        有 cursor 時改用游標分頁 (忽略 skip)，skip 僅為相容舊版保留。
+        回傳 (貼文列表, 下一頁游標)，沒有下一頁時游標為 None。
         """        
         
         # 找出黑名單
         blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
         
-        query = (
-            select(Post)
-            .options(
-                selectinload(Post.liked_by_users),
-                selectinload(Post.user)                
-            ) 
-            .where(
-                Post.parent_id == None,
-                not_(Post.owner_id.in_(blocked_ids))
+        # 只查出列表需要的欄位 (含作者)，不建立 ORM 物件
+        posts = await read_queries.fetch_feed(db, blocked_ids, skip, limit, cursor)
+
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = CursorHelper.encode(posts[-1].createdDateTime, posts[-1].id)
+
+        items = await PostService._to_feed_items(db, current_user_id, posts)
+        return items, next_cursor
+
+    @staticmethod
+    async def get_home_posts(
+        db: AsyncSession,
+        current_user_id: uuid.UUID,
+        limit: int = 20,
+        cursor: str | None = None
+    ) -> tuple[list[PostPayload], str | None]:
+        """
+        取得首頁動態 (自己與追蹤對象的主貼文)，依 (createdDateTime, id) 由新到舊排序。
+        1. 一般情況只需在 timeline 上依 user_id 做一次游標範圍掃描。
+        2. 追蹤對象中有不 fan-out 的大量追蹤者帳號時，另外以作者索引查出他們的貼文再合併。
+        回傳 (貼文列表, 下一頁游標)，沒有下一頁時游標為 None。
+        """
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
+        posts = await read_queries.fetch_timeline(db, current_user_id, blocked_ids, limit, cursor)
+
+        # fan-out-on-read：大量追蹤者帳號的貼文沒有寫入時間軸，從作者索引取出同一個範圍後合併
+        high_fanout_ids = [
+            id for id in await FollowService.get_high_fanout_followees(current_user_id, db)
+            if id not in blocked_ids
+        ]
+        if high_fanout_ids:
+            # 超過門檻前發的貼文可能已經在時間軸裡，以 id 去除重複
+            merged = {p.id: p for p in posts}
+            merged.update(
+                (p.id, p) for p in await read_queries.fetch_authors_posts(db, high_fanout_ids, limit, cursor)
             )
-            .offset(skip)
-            .limit(limit)
-        )
-        
-        result = await db.execute(query)
+            posts = sorted(merged.values(), key=lambda p: (p.createdDateTime, p.id.hex), reverse=True)
+
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = CursorHelper.encode(posts[-1].createdDateTime, posts[-1].id)
+
+        items = await PostService._to_feed_items(db, current_user_id, posts)
+        return items, next_cursor
+
+    @staticmethod
+    async def search_posts(
+        db: AsyncSession,
+        current_user_id: uuid.UUID,
+        q: str,
+        limit: int = 20,
+        cursor: str | None = None
+    ) -> tuple[list[PostPayload], str | None]:
+        """
+        以全文檢索 (FTS5 + trigram) 搜尋主貼文內容，依 BM25 相關度排序，相同分數再依 id 排序。
+        1. 以空白分隔的每個關鍵字都要出現 (AND)；不到 3 個字的關鍵字 (trigram 的限制) 改以子字串比對篩選。
+        2. 全部關鍵字都不到 3 個字時沒有相關度可用，改依發文時間由新到舊列出符合的貼文。
+        3. 自動排除黑名單用戶的內容。
+        4. 游標記錄上一頁最後一筆的 (分數, id)；分數會隨新貼文加入而變動，翻頁期間可能有少量重複或遺漏。
+        """
+        match, short_terms = PostService._fts_query(q)
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
+
+        if match is None:
+            posts = await read_queries.fetch_search_recent(db, short_terms, blocked_ids, limit, cursor)
+            next_cursor = None
+            if len(posts) > limit:
+                posts = posts[:limit]
+                next_cursor = CursorHelper.encode(posts[-1].createdDateTime, posts[-1].id)
+            return await PostService._to_feed_items(db, current_user_id, posts), next_cursor
 
-        posts = result.scalars().all() # 這裡拿到的是 Post 物件列表
+        after = CursorHelper.decode_rank(cursor) if cursor else None
+        rows = await read_queries.fetch_search(db, match, short_terms, blocked_ids, limit, after)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last, rank = rows[-1]
+            next_cursor = CursorHelper.encode_rank(rank, last.id)
+
+        items = await PostService._to_feed_items(db, current_user_id, [post for post, _ in rows])
+        return items, next_cursor
+
+    @staticmethod
+    async def export_posts(db: AsyncSession, owner_id: uuid.UUID) -> AsyncIterator[bytes]:
+        """
+        匯出使用者寫的所有主貼文與留言 (依建立時間由舊到新)，每次產生一塊 NDJSON (EXPORT_BATCH_SIZE 行)。
+        留言以 parent_id 指向所回覆的貼文，可據此重建討論串。
+        資料以資料庫游標邊讀邊輸出，呼叫端寫出 (或用戶端收下) 一塊之後才會讀下一批，記憶體用量固定。
+        """
+        # 用戶端中途斷線時立即關閉游標並歸還 (分片的) 連線，不等垃圾回收
+        async with aclosing(read_queries.stream_user_posts(db, owner_id, settings.EXPORT_BATCH_SIZE)) as batches:
+            async for rows in batches:
+                yield serialization.ndjson(
+                    serialization.post_export(
+                        row.id, row.parent_id, row.content, row.createdDateTime, row.updatedDateTime,
+                        PostService.get_likes_count(row.id, row.likes_count)
+                    )
+                    for row in rows
+                )
+
+    @staticmethod
+    def _fts_query(q: str) -> tuple[str | None, list[str]]:
+        """
+        把使用者輸入轉成 FTS5 查詢：每個關鍵字都當成字串片語 (避免 AND/OR/NEAR、引號等被當成語法)，彼此為 AND。
+        trigram 無法比對不到 3 個字的關鍵字，這些關鍵字另外回傳由呼叫端以子字串比對；沒有可用的長關鍵字時查詢為 None。
+        """
+        terms = q.split()
+        if not terms:
+            raise errors.SearchErrors.EmptyQuery()
+        long_terms = [term for term in terms if len(term) >= 3]
+        short_terms = [term for term in terms if len(term) < 3]
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in long_terms) or None
+        return match, short_terms
+
+    @staticmethod
+    async def _to_feed_items(db: AsyncSession, current_user_id: uuid.UUID, posts: list[PostRecord]) -> list[PostPayload]:
+        """
+        把查出的紀錄直接組成列表項目 (PostSimple 的輸出格式)，按讚狀態一次查出
+        """
+        liked_ids = await PostService.get_liked_post_ids(db, current_user_id, [p.id for p in posts])
     
         return [
-            PostSimple(
-                id=p.id,                
-                content=p.content,
-                owner=p.user,
-                createdDateTime=p.createdDateTime,                  
-                likes_count=len(p.liked_by_users),
-                is_liked=any(user.id == current_user_id for user in p.liked_by_users)  
-            ) for p in posts
+            PostPayload(
+                p.id,
+                p.owner_id,
+                p.version,
+                p.simple(PostService.get_likes_count(p.id, p.likes_count), p.id in liked_ids)
+            )
+            for p in posts
         ]
 
     @staticmethod
-    async def toggle_like(db: AsyncSession, post_id: uuid.UUID, owner_id: uuid.UUID) -> bool:
+    def make_etag(current_user_id: uuid.UUID, blocked_ids: frozenset[uuid.UUID], versions, *extra) -> str:
+        """
+        由檢視者、封鎖名單與各貼文版本產生 ETag。
+        is_liked 與黑名單過濾因人而異，所以檢視者與封鎖名單也要算進去。
+        """
+        parts = [current_user_id, hash(blocked_ids), *extra]
+        parts.extend(f"{id}:{version}" for id, version in versions)
+        if like_buffer.enabled:
+            # 延遲寫入模式下按讚尚未反映到 version，任何切換都讓 ETag 失效
+            parts.append(like_buffer.toggles)
+        return ETagHelper.make(*parts)
+
+    @staticmethod
+    async def get_feed_etag(
+        db: AsyncSession,
+        current_user_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 20,
+        cursor: str | None = None
+    ) -> str:
+        """
+        只查出該頁貼文的 (id, version) 來計算 ETag，不載入內容
+        """
+        blocked_ids = await BlacklistService.get_blocked_ids(current_user_id, db)
+        rows = await read_queries.fetch_feed_versions(db, blocked_ids, skip, limit, cursor)
+        return PostService.make_etag(current_user_id, blocked_ids, rows[:limit], len(rows) > limit)
+
+    @staticmethod
+    def get_feed_etag_from_items(
+        current_user_id: uuid.UUID,
+        blocked_ids: frozenset[uuid.UUID],
+        posts: list[PostPayload],
+        next_cursor: str | None
+    ) -> str:
+        return PostService.make_etag(
+            current_user_id, blocked_ids, [(p.id, p.version) for p in posts], next_cursor is not None
+        )
+
+    @staticmethod
+    async def get_version(db: AsyncSession, post_id: uuid.UUID) -> tuple[uuid.UUID, int] | None:
+        """
+        以主鍵查出 (作者, 版本)，給條件式請求在載入內容前判斷是否可以直接回 304
+        """
+        async with post_session(db, post_id) as pdb:
+            result = await pdb.execute(select(Post.owner_id, like_counter.version_column()).where(Post.id == post_id))
+            row = result.first()
+        return (row.owner_id, row.version) if row else None
+
+    @staticmethod
+    async def toggle_like(
+        db: AsyncSession, post_id: uuid.UUID, owner_id: uuid.UUID, read_db: AsyncSession | None = None
+    ) -> bool:
             """
-            切換按讚狀態        
+            切換按讚狀態，並在同一個交易內同步 post.likes_count
+            延遲寫入模式下只更新緩衝區，由背景批次寫入 (讀取目前狀態時使用 read_db)
+            """
+            if like_buffer.enabled:
+                return await like_buffer.toggle(read_db or db, post_id, owner_id)
+
+            async with post_session(db, post_id, write=True) as pdb:
+                return await PostService._toggle_like(pdb, post_id, owner_id)
+
+    @staticmethod
+    async def _toggle_like(db: AsyncSession, post_id: uuid.UUID, owner_id: uuid.UUID) -> bool:
+            """
+            直接寫入 DB 的按讚切換 (db 為貼文所在資料庫的 Session)
             """
             # 檢查是否已經按過讚
             like_query = select(Like).where(
@@ -160,17 +685,117 @@ class PostService:
             if existing_like:
                 # 如果存在，則刪除 (取消按讚)
                 await db.delete(existing_like)
+                parent_id = await PostService._apply_like_delta(db, post_id, -1)
                 await db.commit()
+                invalidate_posts(post_id, parent_id)
                 return False
             else:
                 # 如果不存在，則建立 (按讚)
                 new_like = Like(post_id=post_id, user_id=owner_id)
                 db.add(new_like)
                 try:
+                    parent_id = await PostService._apply_like_delta(db, post_id, 1)
                     await db.commit()
                 except Exception:
                     # 以防貼文不存或按讚失敗rollback
                     await db.rollback()
                     raise Exception("貼文不存在或按讚失敗")
+                invalidate_posts(post_id, parent_id)
                 return True
-        
+
+    @staticmethod
+    async def _apply_like_delta(db: AsyncSession, post_id: uuid.UUID, delta: int) -> uuid.UUID | None:
+        """
+        以原子遞增/遞減更新按讚數並遞增版本；按讚不算編輯貼文，保留原本的 updatedDateTime。
+        留言的按讚數顯示在上層貼文的內容中，上層貼文的版本也要遞增。
+        開啟 LIKE_COUNTER_SLOTS 時改為累加到計數槽位，不更新 post。
+        回傳上層貼文 id (沒有則為 None)，供呼叫端清除快取。
+        """
+        if like_counter.enabled():
+            result = await db.execute(select(Post.parent_id).where(Post.id == post_id))
+            parent_id = result.scalar_one()
+            changes = [(post_id, delta, 1)]
+            if parent_id is not None:
+                changes.append((parent_id, 0, 1))
+            await like_counter.add(db, changes)
+            return parent_id
+
+        result = await db.execute(
+            update(Post)
+            .where(Post.id == post_id)
+            .values(
+                likes_count=Post.likes_count + delta,
+                version=Post.version + 1,
+                updatedDateTime=Post.updatedDateTime
+            )
+            .returning(Post.parent_id)
+        )
+        parent_id = result.scalar_one()
+        if parent_id is not None:
+            await db.execute(PostService._version_update(Post.id == parent_id))
+        return parent_id
+
+    @staticmethod
+    async def set_likes(
+        db: AsyncSession, owner_id: uuid.UUID, desired: dict[uuid.UUID, bool], read_db: AsyncSession | None = None
+    ) -> dict[uuid.UUID, bool]:
+        """
+        批次按讚/取消按讚：desired 為每篇貼文的目標狀態 (不是切換，已是目標狀態的略過)，回傳套用後的狀態。
+        1. 先以 IN 查詢確認貼文都存在，任一篇不存在時全部不執行 (PostErrors.NotFound)。
+        2. 所有變更在同一個交易內寫入，按讚數與版本以批次更新；分片時每個分片各一個交易。
+        3. 延遲寫入模式下只更新緩衝區，由背景批次寫入。
+        """
+        groups = group_by_shard(desired)
+
+        async def fetch(s: AsyncSession, shard: int):
+            # 貼文是否存在與目前的按讚狀態一次查出
+            result = await s.execute(
+                select(Post.id, Like.post_id)
+                .outerjoin(Like, and_(Like.post_id == Post.id, Like.user_id == owner_id))
+                .where(Post.id.in_(groups[shard]))
+            )
+            return result.all()
+        rows = [row for rows in await gather_shards(read_db or db, fetch, list(groups)) for row in rows]
+        if len(rows) < len(desired):
+            raise errors.PostErrors.NotFound()
+
+        if like_buffer.enabled:
+            like_buffer.set_liked(owner_id, desired, {liked_id for _, liked_id in rows if liked_id is not None})
+            return dict(desired)
+
+        for post_ids in groups.values():
+            async with post_session(db, post_ids[0], write=True) as pdb:
+                await PostService._set_likes(pdb, owner_id, {post_id: desired[post_id] for post_id in post_ids})
+        return dict(desired)
+
+    @staticmethod
+    async def _set_likes(db: AsyncSession, owner_id: uuid.UUID, desired: dict[uuid.UUID, bool]) -> None:
+        """
+        直接寫入 DB 的批次按讚 (db 為貼文所在資料庫的 Session)，以交易內實際的按讚狀態決定要新增或刪除的資料
+        """
+        result = await db.execute(
+            select(Like.post_id).where(Like.user_id == owner_id, Like.post_id.in_(list(desired)))
+        )
+        liked = set(result.scalars())
+        to_insert = [post_id for post_id, want in desired.items() if want and post_id not in liked]
+        to_delete = [post_id for post_id, want in desired.items() if not want and post_id in liked]
+        if to_insert:
+            await db.execute(insert(Like), [{"user_id": owner_id, "post_id": post_id} for post_id in to_insert])
+        if to_delete:
+            await db.execute(delete(Like).where(Like.user_id == owner_id, Like.post_id.in_(to_delete)))
+        deltas = {post_id: 1 for post_id in to_insert} | {post_id: -1 for post_id in to_delete}
+        parent_ids = await like_counter.apply_deltas(db, deltas)
+        await db.commit()
+        # 交易完成後才清除快取，避免在提交前被舊資料回填
+        invalidate_posts(*deltas, *parent_ids)
+
+    @staticmethod
+    def _version_update(condition):
+        """
+        遞增符合條件貼文的版本 (不更動 updatedDateTime)
+        """
+        return (
+            update(Post)
+            .where(condition)
+            .values(version=Post.version + 1, updatedDateTime=Post.updatedDateTime)
+        )
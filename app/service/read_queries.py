@@ -0,0 +1,437 @@
+import heapq
+import uuid
+from contextlib import AsyncExitStack, aclosing
+from itertools import islice
+from typing import AsyncIterator
+from sqlalchemy import select, and_, or_, not_, tuple_, type_coerce, literal_column, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import serialization
+from app.core.pagination import CursorHelper
+from app.database import gather_shards, is_sharded, shard_read_session_factories
+from app.models import Follow, Post, Timeline, User
+from app.models.post_fts import FTS_TABLE_NAME, post_fts
+from app.service.like_counter import likes_column, version_column
+
+# 唯讀查詢層 (列表、貼文內容、使用者列表)
+# 這些路徑只需要少數欄位，查出後也不會修改，所以直接對 Table 下 Core 查詢：
+# 只選需要的欄位 (不會讀出 password、用不到的時間欄位)，不建立 ORM 物件、不進 Session 的 identity map，
+# 資料列轉成只有 __slots__ 的輕量紀錄。需要寫入或關聯載入的地方仍使用 ORM 模型。
+# 貼文分片時，列表類查詢在每個分片各做一次相同的 keyset 掃描 (各取一頁)，再依排序鍵做 k-way merge。
+
+post_table = Post.__table__
+user_table = User.__table__
+follow_table = Follow.__table__
+timeline_table = Timeline.__table__
+
+class UserRecord:
+    """
+    使用者的公開欄位
+    """
+    __slots__ = ("id", "email", "name", "role")
+
+    def __init__(self, id: uuid.UUID, email: str, name: str | None, role: int):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+
+    def public(self) -> dict:
+        return serialization.user_public(self.id, self.email, self.name, self.role)
+
+class PostRecord:
+    """
+    列表項目 (主貼文或留言) 與作者的欄位
+    """
+    __slots__ = ("id", "content", "createdDateTime", "likes_count", "version", "owner_id", "email", "name", "role")
+
+    def __init__(self, id, content, createdDateTime, likes_count, version, owner_id, email, name, role):
+        self.id = id
+        self.content = content
+        self.createdDateTime = createdDateTime
+        self.likes_count = likes_count
+        self.version = version
+        self.owner_id = owner_id
+        self.email = email
+        self.name = name
+        self.role = role
+
+    def owner(self) -> dict:
+        return serialization.user_public(self.owner_id, self.email, self.name, self.role)
+
+    def simple(self, likes_count: int, is_liked: bool) -> dict:
+        """
+        PostSimple 的輸出格式，按讚數與按讚狀態由呼叫端依檢視者提供
+        """
+        return serialization.post_simple(
+            self.id, self.content, self.owner(), self.createdDateTime, likes_count, is_liked
+        )
+
+class PostDetailRecord(PostRecord):
+    """
+    貼文內容頁另外需要的欄位
+    """
+    __slots__ = ("updatedDateTime", "parent_id", "top_comment_id")
+
+    def __init__(self, *columns):
+        super().__init__(*columns[:-3])
+        self.updatedDateTime, self.parent_id, self.top_comment_id = columns[-3:]
+
+USER_COLUMNS = (user_table.c.id, user_table.c.email, user_table.c.name, user_table.c.role)
+
+def _post_columns(post, user) -> tuple:
+    # 順序與 PostRecord.__slots__ 相同；按讚數與版本含尚未合併的計數槽位 (LIKE_COUNTER_SLOTS)
+    return (
+        post.c.id, post.c.content, post.c.createdDateTime, likes_column(post), version_column(post),
+        post.c.owner_id, user.c.email, user.c.name, user.c.role
+    )
+
+POST_COLUMNS = _post_columns(post_table, user_table)
+POST_DETAIL_COLUMNS = POST_COLUMNS + (post_table.c.updatedDateTime, post_table.c.parent_id, post_table.c.top_comment_id)
+# 匯出用：貼文本身的欄位 (作者就是匯出的使用者，不 JOIN user)
+EXPORT_COLUMNS = (
+    post_table.c.id, post_table.c.parent_id, post_table.c.content,
+    post_table.c.createdDateTime, post_table.c.updatedDateTime, likes_column()
+)
+
+def _with_owner(source=post_table, post=post_table, user=user_table):
+    return source.join(user, user.c.id == post.c.owner_id)
+
+def _older_than(cursor: str, created_column, id_column):
+    created, last_id = CursorHelper.decode(cursor)
+    # createdDateTime 以儲存的字串比較，避免被綁定成帶微秒的格式而比對不到相同時間的資料
+    return tuple_(created_column, id_column) < tuple_(type_coerce(created, String), last_id)
+
+def feed_query(columns, blocked_ids, skip: int, limit: int, cursor: str | None, join_owner: bool = True):
+    """
+    主貼文列表的篩選、排序與分頁條件，依 (createdDateTime, id) 由新到舊。
+    多抓一筆用來判斷是否還有下一頁；有 cursor 時改用游標分頁 (忽略 skip)。
+    """
+    query = (
+        select(*columns)
+        .select_from(_with_owner() if join_owner else post_table)
+        .where(post_table.c.parent_id == None, not_(post_table.c.owner_id.in_(blocked_ids)))
+        .order_by(post_table.c.createdDateTime.desc(), post_table.c.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(_older_than(cursor, post_table.c.createdDateTime, post_table.c.id))
+    else:
+        query = query.offset(skip)
+    return query
+
+def _newest_first(row) -> tuple:
+    # 與 SQL 的 ORDER BY createdDateTime DESC, id DESC 相同 (UUID 以 32 字元的 hex 儲存與比較)
+    return row.createdDateTime, row.id.hex
+
+def merge_newest(lists, limit: int, skip: int = 0) -> list:
+    """
+    合併各分片已依 (createdDateTime, id) 由新到舊排好的結果，取 skip 之後的 limit 筆
+    """
+    return list(islice(heapq.merge(*lists, key=_newest_first, reverse=True), skip, skip + limit))
+
+async def _fetch_records(db: AsyncSession, query) -> list[PostRecord]:
+    return [PostRecord(*row) for row in await db.execute(query)]
+
+async def fetch_feed(db: AsyncSession, blocked_ids, skip: int, limit: int, cursor: str | None) -> list[PostRecord]:
+    if not is_sharded():
+        return await _fetch_records(db, feed_query(POST_COLUMNS, blocked_ids, skip, limit, cursor))
+    # 位移分頁無法在各分片各自位移，每個分片都要取前 skip + limit 筆再合併
+    shard_skip = 0 if cursor else skip
+    lists = await gather_shards(db, lambda s, _: _fetch_records(
+        s, feed_query(POST_COLUMNS, blocked_ids, 0, shard_skip + limit, cursor)
+    ))
+    return merge_newest(lists, limit + 1, shard_skip)
+
+async def fetch_feed_versions(
+    db: AsyncSession, blocked_ids, skip: int, limit: int, cursor: str | None
+) -> list[tuple[uuid.UUID, int]]:
+    """
+    列表該頁 (多一筆) 的 (id, version)，給 ETag 使用，不 JOIN 作者
+    """
+    columns = (post_table.c.createdDateTime, post_table.c.id, version_column())
+    if not is_sharded():
+        rows = await db.execute(feed_query(columns, blocked_ids, skip, limit, cursor, join_owner=False))
+        return [(row.id, row.version) for row in rows]
+    shard_skip = 0 if cursor else skip
+
+    async def fetch(s, _):
+        query = feed_query(columns, blocked_ids, 0, shard_skip + limit, cursor, join_owner=False)
+        return (await s.execute(query)).all()
+    rows = merge_newest(await gather_shards(db, fetch), limit + 1, shard_skip)
+    return [(row.id, row.version) for row in rows]
+
+async def fetch_timeline(
+    db: AsyncSession, user_id: uuid.UUID, blocked_ids, limit: int, cursor: str | None
+) -> list[PostRecord]:
+    """
+    在 timeline 上依 user_id 做游標範圍掃描 (多抓一筆)
+    """
+    query = (
+        select(*POST_COLUMNS)
+        .select_from(_with_owner(post_table.join(timeline_table, timeline_table.c.post_id == post_table.c.id)))
+        .where(timeline_table.c.user_id == user_id, not_(timeline_table.c.author_id.in_(blocked_ids)))
+        .order_by(timeline_table.c.createdDateTime.desc(), timeline_table.c.post_id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(_older_than(cursor, timeline_table.c.createdDateTime, timeline_table.c.post_id))
+    if not is_sharded():
+        return await _fetch_records(db, query)
+    # 時間軸在主資料庫，每個分片的連線只 JOIN 得到自己分片的貼文，各自取一頁後合併
+    return merge_newest(await gather_shards(db, lambda s, _: _fetch_records(s, query)), limit + 1)
+
+async def fetch_authors_posts(
+    db: AsyncSession, author_ids: list[uuid.UUID], limit: int, cursor: str | None
+) -> list[PostRecord]:
+    """
+    以作者索引查出指定作者們的主貼文 (多抓一筆)
+    """
+    query = (
+        select(*POST_COLUMNS)
+        .select_from(_with_owner())
+        .where(post_table.c.owner_id.in_(author_ids), post_table.c.parent_id == None)
+        .order_by(post_table.c.createdDateTime.desc(), post_table.c.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(_older_than(cursor, post_table.c.createdDateTime, post_table.c.id))
+    if not is_sharded():
+        return await _fetch_records(db, query)
+    return merge_newest(await gather_shards(db, lambda s, _: _fetch_records(s, query)), limit + 1)
+
+async def fetch_recent_post_keys(db: AsyncSession, owner_id: uuid.UUID, limit: int) -> list:
+    """
+    作者最近的主貼文 (id, owner_id, createdDateTime)，追蹤時回填時間軸用 (分片時各分片取 limit 筆後合併)。
+    createdDateTime 取出儲存的原始字串，寫回時間軸時格式不變 (時間軸的游標以字串比較)。
+    """
+    query = (
+        select(
+            post_table.c.id,
+            post_table.c.owner_id,
+            type_coerce(post_table.c.createdDateTime, String).label("createdDateTime")
+        )
+        .where(post_table.c.owner_id == owner_id, post_table.c.parent_id == None)
+        .order_by(post_table.c.createdDateTime.desc(), post_table.c.id.desc())
+        .limit(limit)
+    )
+
+    async def fetch(s, _):
+        return (await s.execute(query)).all()
+    return merge_newest(await gather_shards(db, fetch), limit)
+
+def _contains_all(terms: list[str]) -> list:
+    # 不到 3 個字的關鍵字 trigram 索引比對不到，改以子字串逐筆比對 (與 trigram 相同，英文字母不分大小寫)
+    return [post_table.c.content.contains(term, autoescape=True) for term in terms]
+
+async def fetch_search(
+    db: AsyncSession, match: str, short_terms: list[str], blocked_ids, limit: int,
+    after: tuple[float, uuid.UUID] | None
+) -> list[tuple[PostRecord, float]]:
+    """
+    全文檢索主貼文 (short_terms 為另外逐筆比對的短關鍵字)，依 (rank, id) 排序 (多抓一筆)，回傳 (紀錄, rank)
+    """
+    source = post_fts.join(post_table, literal_column("post.rowid") == post_fts.c.rowid)
+    query = (
+        select(*POST_COLUMNS, post_fts.c.rank)
+        .select_from(_with_owner(source))
+        .where(
+            literal_column(FTS_TABLE_NAME).op("MATCH")(match),
+            post_table.c.parent_id == None,
+            not_(post_table.c.owner_id.in_(blocked_ids)),
+            *_contains_all(short_terms)
+        )
+        .order_by(post_fts.c.rank, post_table.c.id)
+        .limit(limit + 1)
+    )
+    if after:
+        last_rank, last_id = after
+        query = query.where(
+            or_(post_fts.c.rank > last_rank, and_(post_fts.c.rank == last_rank, post_table.c.id > last_id))
+        )
+
+    async def fetch(s, _):
+        return [(PostRecord(*row[:-1]), row[-1]) for row in await s.execute(query)]
+    if not is_sharded():
+        return await fetch(db, 0)
+    # BM25 分數依各分片自己的詞頻統計計算，分片間只是近似可比
+    merged = heapq.merge(*await gather_shards(db, fetch), key=lambda r: (r[1], r[0].id.hex))
+    return list(islice(merged, limit + 1))
+
+async def fetch_search_recent(
+    db: AsyncSession, short_terms: list[str], blocked_ids, limit: int, cursor: str | None
+) -> list[PostRecord]:
+    """
+    只有短關鍵字時沒有全文索引可用 (也就沒有相關度)：沿著主貼文列表由新到舊逐筆比對，取符合的前 limit + 1 筆
+    """
+    query = feed_query(POST_COLUMNS, blocked_ids, 0, limit, cursor).where(*_contains_all(short_terms))
+    return merge_newest(await gather_shards(db, lambda s, _: _fetch_records(s, query)), limit + 1)
+
+def _post_detail_query():
+    """
+    貼文、作者、置頂留言與其作者的 JOIN (由呼叫端加上貼文 id 條件)
+    """
+    top = post_table.alias("top_comment")
+    top_user = user_table.alias("top_comment_user")
+    source = (
+        _with_owner()
+        .outerjoin(top, top.c.id == post_table.c.top_comment_id)
+        .outerjoin(top_user, top_user.c.id == top.c.owner_id)
+    )
+    return select(*POST_DETAIL_COLUMNS, *_post_columns(top, top_user)).select_from(source)
+
+def _post_detail_row(row) -> tuple[PostDetailRecord, PostRecord | None]:
+    split = len(POST_DETAIL_COLUMNS)
+    top_comment = PostRecord(*row[split:]) if row[split] is not None else None
+    return PostDetailRecord(*row[:split]), top_comment
+
+async def fetch_post_detail(db: AsyncSession, post_id: uuid.UUID) -> tuple[PostDetailRecord, PostRecord | None] | None:
+    """
+    貼文、作者、置頂留言與其作者以一次 JOIN 查出
+    """
+    row = (await db.execute(_post_detail_query().where(post_table.c.id == post_id))).first()
+    if row is None:
+        return None
+    return _post_detail_row(row)
+
+async def fetch_post_details(
+    db: AsyncSession, post_ids: list[uuid.UUID]
+) -> list[tuple[PostDetailRecord, PostRecord | None]]:
+    """
+    與 fetch_post_detail 相同，以一句 IN 查詢查出多篇貼文 (不存在的略過，順序不固定)
+    """
+    rows = await db.execute(_post_detail_query().where(post_table.c.id.in_(post_ids)))
+    return [_post_detail_row(row) for row in rows]
+
+async def fetch_comments(
+    db: AsyncSession, post_id: uuid.UUID, blocked_ids, exclude_id: uuid.UUID | None = None
+) -> list[PostRecord]:
+    """
+    貼文底下的留言 (依建立時間由舊到新)，排除 blocked_ids 的使用者與 exclude_id (置頂留言)
+    """
+    query = (
+        select(*POST_COLUMNS)
+        .select_from(_with_owner())
+        .where(post_table.c.parent_id == post_id, post_table.c.owner_id.not_in(blocked_ids))
+        .order_by(post_table.c.createdDateTime, post_table.c.id)
+    )
+    if exclude_id:
+        query = query.where(post_table.c.id != exclude_id)
+    return [PostRecord(*row) for row in await db.execute(query)]
+
+async def fetch_comments_of(
+    db: AsyncSession, post_ids: list[uuid.UUID], blocked_ids, exclude_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, list[PostRecord]]:
+    """
+    以一句 IN 查詢查出多篇貼文的留言，依上層貼文分組 (各組依建立時間由舊到新)；
+    排除 blocked_ids 的使用者與 exclude_ids (各貼文的置頂留言)
+    """
+    if not post_ids:
+        return {}
+    query = (
+        select(*POST_COLUMNS, post_table.c.parent_id)
+        .select_from(_with_owner())
+        .where(post_table.c.parent_id.in_(post_ids), post_table.c.owner_id.not_in(blocked_ids))
+        .order_by(post_table.c.parent_id, post_table.c.createdDateTime, post_table.c.id)
+    )
+    if exclude_ids:
+        query = query.where(post_table.c.id.not_in(exclude_ids))
+    comments: dict[uuid.UUID, list[PostRecord]] = {}
+    for row in await db.execute(query):
+        comments.setdefault(row[-1], []).append(PostRecord(*row[:-1]))
+    return comments
+
+def _oldest_first(row) -> tuple:
+    return row.createdDateTime, row.id.hex
+
+async def _rows(result) -> AsyncIterator:
+    async for partition in result.partitions():
+        for row in partition:
+            yield row
+
+async def _merge_oldest(results, batch_size: int) -> AsyncIterator[list]:
+    """
+    合併各分片已依 (createdDateTime, id) 由舊到新排好的串流，每湊滿 batch_size 筆輸出一批；
+    每個串流只在目前那筆被取走後才往下讀
+    """
+    streams = [_rows(result) for result in results]
+    heap = []
+    for i, stream in enumerate(streams):
+        row = await anext(stream, None)
+        if row is not None:
+            heap.append((_oldest_first(row), i, row))
+    heapq.heapify(heap)
+    batch = []
+    while heap:
+        _, i, row = heap[0]
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+        row = await anext(streams[i], None)
+        if row is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (_oldest_first(row), i, row))
+    if batch:
+        yield batch
+
+async def stream_user_posts(db: AsyncSession, owner_id: uuid.UUID, batch_size: int) -> AsyncIterator[list]:
+    """
+    以伺服器端游標依 (createdDateTime, id) 由舊到新讀出使用者寫的所有貼文與留言 (匯出用)，每批最多 batch_size 筆。
+    每次只向資料庫取 batch_size 筆，呼叫端還沒處理完上一批時不會往下讀，記憶體用量與資料量無關。
+    整個匯出在同一個讀取交易內，內容是開始匯出當下的快照。
+    分片時在每個分片各開一個游標，依排序鍵逐筆合併；未分片時直接使用傳入的 db。
+    """
+    query = (
+        select(*EXPORT_COLUMNS)
+        .where(post_table.c.owner_id == owner_id)
+        .order_by(post_table.c.createdDateTime, post_table.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async with AsyncExitStack() as stack:
+        if not is_sharded():
+            result = await db.stream(query)
+            stack.push_async_callback(result.close)
+            async for partition in result.partitions():
+                yield partition
+            return
+
+        results = []
+        for session_factory in shard_read_session_factories:
+            session = await stack.enter_async_context(session_factory())
+            result = await session.stream(query)
+            stack.push_async_callback(result.close)
+            results.append(result)
+        async with aclosing(_merge_oldest(results, batch_size)) as batches:
+            async for batch in batches:
+                yield batch
+
+async def fetch_users(db: AsyncSession, name: str | None = None, skip: int = 0, limit: int = 20) -> list[UserRecord]:
+    """
+    使用者列表，依建立時間由新到舊
+    """
+    query = select(*USER_COLUMNS)
+    if name:
+        query = query.where(user_table.c.name.icontains(name))
+    query = query.order_by(user_table.c.createdDateTime.desc()).offset(skip).limit(limit)
+    return [UserRecord(*row) for row in await db.execute(query)]
+
+async def fetch_follow_users(
+    db: AsyncSession, user_id: uuid.UUID, followers: bool, skip: int = 0, limit: int = 20
+) -> list[UserRecord]:
+    """
+    followers 為 False 時是 user_id 追蹤的使用者，True 時是追蹤 user_id 的使用者，依追蹤時間由新到舊
+    """
+    if followers:
+        on, where = follow_table.c.follower_id, follow_table.c.followee_id
+    else:
+        on, where = follow_table.c.followee_id, follow_table.c.follower_id
+    query = (
+        select(*USER_COLUMNS)
+        .select_from(user_table.join(follow_table, on == user_table.c.id))
+        .where(where == user_id)
+        .order_by(follow_table.c.createdDateTime.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return [UserRecord(*row) for row in await db.execute(query)]
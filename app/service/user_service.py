@@ -1,27 +1,43 @@
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from app.models.user import User
-from app.schemas.user import UserCreate, UserPublic
+from app.schemas.user import UserCreate
 from app.core.security import SecurityHelper
+from app.service import read_queries
+from app.service.read_queries import UserRecord
 
 class UserService:
     @staticmethod
-    async def create_user(obj_in: UserCreate, db: AsyncSession):
+    async def create_user(obj_in: UserCreate, db: AsyncSession, read_db: AsyncSession | None = None):
+        """
+        建立使用者，Email 已被使用時回傳 None
+        信箱檢查走 read_db、密碼雜湊在寫入前完成，等待雜湊的期間不占用連線
+        """
         #驗證是否有相同信箱
-        if await UserService.is_email_taken(obj_in.email, db): return None
-    
-        # 建立 SQLAlchemy Model 實例 (直接並加密密碼)
+        check_db = read_db or db
+        if await UserService.is_email_taken(obj_in.email, check_db): return None
+        # 結束查詢的交易並歸還連線，等待雜湊時不占用任何連線 (Session 之後仍可繼續使用)
+        await check_db.close()
+
+        # 密碼加密
+        password = await SecurityHelper.get_password_hash_async(obj_in.password)
+
+        # 建立 SQLAlchemy Model 實例
         user_data = User(
             name=obj_in.name,
             email=obj_in.email,
-            # 密碼加密
-            password=SecurityHelper.get_password_hash(obj_in.password),         
-        ) # 將資料轉成 dict讓SQLAlchemy能看懂內容        
-                            
-        # 存入資料庫
+            password=password,
+        )
+
+        # 存入資料庫；同時註冊相同信箱時由 unique 限制擋下
         db.add(user_data)
-        await db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
         await db.refresh(user_data)
         return user_data
     
@@ -34,7 +50,7 @@ class UserService:
         
         # 比對密碼
         # obj_in.password 明碼 user.password 加密後的密碼
-        if not SecurityHelper.verify_password(obj_in.password, user.password): 
+        if not await SecurityHelper.verify_password_async(obj_in.password, user.password): 
             return None # 密碼錯了            
         return user #驗證完成回傳user
     
@@ -51,12 +67,9 @@ class UserService:
         return result.scalars().first()
     
     @staticmethod
-    async def get_users(db:AsyncSession, name:str = None, skip: int = 0, limit: int = 20) -> list[UserPublic]:
-        query = select(User)
-        if name:
-            query = query.where(User.name.icontains(name))
-        result = await db.execute(query.order_by(User.createdDateTime.desc()).offset(skip).limit(limit))
-        return [UserPublic.model_validate(u) for u in result.scalars().all()]
+    async def get_users(db:AsyncSession, name:str = None, skip: int = 0, limit: int = 20) -> list[UserRecord]:
+        # 唯讀查詢，只選公開欄位 (不讀出 password)
+        return await read_queries.fetch_users(db, name, skip, limit)
 
     
     # 確認是否有相同的信件
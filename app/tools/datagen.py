@@ -0,0 +1,233 @@
+"""
+壓力測試用的合成資料產生器
+
+依指定規模產生使用者、主貼文與多層回覆、冪律 (power-law) 分佈的按讚、追蹤關係與黑名單，
+直接以 sqlite3 批次寫入 (executemany + 大交易 + 關閉同步)，百萬筆等級的資料也能在數分鐘內載入。
+資料表結構一律先跑 Alembic 遷移建立，反正規化欄位 (likes_count、followers_count、timeline) 一併算好。
+
+所有產生的使用者密碼都是 password123，email 為 load{i}@example.com。
+
+使用方式：
+    python -m app.tools.datagen --database load.db --users 100000 --posts 1000000
+    python -m app.tools.datagen --help
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# 搜尋用的詞彙，壓力測試的搜尋關鍵字也從這裡挑
+VOCABULARY = [
+    "今天天氣很好", "午餐吃什麼", "週末去爬山", "新開的咖啡廳", "推薦一本好書", "工作好累",
+    "貓咪好可愛", "下雨天", "期末考加油", "旅行計畫", "健身房打卡", "演唱會門票",
+    "新手機開箱", "程式寫不完", "夜市美食", "搬家心得", "電影推薦", "早餐店",
+]
+
+LOGIN_PASSWORD = "password123"
+
+BATCH_SIZE = 50_000
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="產生壓力測試用的合成資料")
+    parser.add_argument("--database", required=True, help="SQLite 檔案路徑 (不存在會自動建立)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=100_000, help="貼文總數 (含回覆)")
+    parser.add_argument("--reply-ratio", type=float, default=0.7, help="貼文中回覆所佔的比例")
+    parser.add_argument("--max-depth", type=int, default=4, help="回覆最多幾層")
+    parser.add_argument("--like-alpha", type=float, default=1.2, help="每篇按讚數的 Pareto 指數，越小越集中在熱門貼文")
+    parser.add_argument("--max-likes", type=int, default=5_000, help="單篇貼文按讚數上限")
+    parser.add_argument("--follows-per-user", type=float, default=20, help="平均每人追蹤幾人")
+    parser.add_argument("--blocks-per-user", type=float, default=0.5, help="平均每人封鎖幾人")
+    parser.add_argument("--skew", type=float, default=2.0, help="熱門使用者的集中程度 (越大越集中)")
+    parser.add_argument("--days", type=int, default=365, help="貼文分佈在最近幾天內")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+def popular_user(n: int, skew: float) -> int:
+    """
+    以 u ** skew 取樣，編號越小的使用者越容易被選到 (近似冪律)
+    """
+    return min(n - 1, int(n * random.random() ** skew))
+
+def pareto_count(alpha: float, upper: int) -> int:
+    return min(upper, int(random.paretovariate(alpha)) - 1)
+
+def batched(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def insert_rows(conn: sqlite3.Connection, sql: str, rows) -> int:
+    count = 0
+    for batch in batched(rows):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+def timestamp(value: datetime) -> str:
+    # 與 SQLite CURRENT_TIMESTAMP 相同的格式，游標分頁才比對得到
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def generate(conn: sqlite3.Connection, args: argparse.Namespace, password_hash: str, fanout_max: int) -> dict:
+    random.seed(args.seed)
+    counts = {}
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=args.days)
+
+    # --- 使用者 ---
+    user_ids = [uuid.UUID(int=random.getrandbits(128), version=4).hex for _ in range(args.users)]
+    user_created = timestamp(start)
+    counts["user"] = insert_rows(
+        conn,
+        'INSERT INTO user (id, password, name, email, role, followers_count, "createdDateTime", "updatedDateTime") '
+        "VALUES (?, ?, ?, ?, 1, 0, ?, ?)",
+        (
+            (user_ids[i], password_hash, f"load{i}", f"load{i}@example.com", user_created, user_created)
+            for i in range(args.users)
+        )
+    )
+
+    # --- 貼文與回覆 (依時間遞增產生，回覆一定晚於上層貼文) ---
+    post_ids: list[str] = []
+    depths = bytearray()
+    step = (now - start) / max(args.posts, 1)
+    like_counts: list[int] = []
+
+    def posts():
+        for i in range(args.posts):
+            post_id = uuid.UUID(int=random.getrandbits(128), version=4).hex
+            parent = None
+            depth = 0
+            if post_ids and random.random() < args.reply_ratio:
+                # 偏好最近的貼文，模擬討論集中在新貼文
+                candidate = len(post_ids) - 1 - min(len(post_ids) - 1, int(random.expovariate(1 / 200)))
+                if depths[candidate] < args.max_depth:
+                    parent = post_ids[candidate]
+                    depth = depths[candidate] + 1
+            post_ids.append(post_id)
+            depths.append(depth)
+            likes = pareto_count(args.like_alpha, min(args.max_likes, args.users))
+            like_counts.append(likes)
+            created = timestamp(start + step * i)
+            owner = user_ids[popular_user(args.users, args.skew)]
+            words = random.sample(VOCABULARY, 2)
+            content = f"{words[0]}，{words[1]} #{i}"
+            yield (post_id, content, likes, 0, owner, parent, created, created)
+
+    counts["post"] = insert_rows(
+        conn,
+        'INSERT INTO post (id, content, likes_count, version, owner_id, parent_id, "createdDateTime", "updatedDateTime") '
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        posts()
+    )
+
+    # --- 按讚 (每篇的按讚數已在上面依 Pareto 分佈決定) ---
+    def likes():
+        for post_id, n in zip(post_ids, like_counts):
+            if n == 0:
+                continue
+            for liker in random.sample(range(args.users), n):
+                yield (user_ids[liker], post_id, user_created, user_created)
+
+    counts["like"] = insert_rows(
+        conn,
+        'INSERT INTO "like" (user_id, post_id, "createdDateTime", "updatedDateTime") VALUES (?, ?, ?, ?)',
+        likes()
+    )
+
+    # --- 追蹤 (被追蹤者偏向熱門使用者) ---
+    def follows():
+        for i in range(args.users):
+            n = min(args.users - 1, int(random.expovariate(1 / args.follows_per_user))) if args.follows_per_user else 0
+            seen = set()
+            for _ in range(n):
+                target = popular_user(args.users, args.skew)
+                if target != i and target not in seen:
+                    seen.add(target)
+                    yield (user_ids[i], user_ids[target], user_created, user_created)
+
+    counts["follow"] = insert_rows(
+        conn,
+        'INSERT INTO follow (follower_id, followee_id, "createdDateTime", "updatedDateTime") VALUES (?, ?, ?, ?)',
+        follows()
+    )
+
+    # --- 黑名單 ---
+    def blocks():
+        for i in range(args.users):
+            n = min(args.users - 1, int(random.expovariate(1 / args.blocks_per_user))) if args.blocks_per_user else 0
+            seen = set()
+            for _ in range(n):
+                target = random.randrange(args.users)
+                if target != i and target not in seen:
+                    seen.add(target)
+                    yield (user_ids[i], user_ids[target], user_created, user_created)
+
+    counts["blacklist"] = insert_rows(
+        conn,
+        'INSERT INTO blacklist (user_id, blocked_user_id, "createdDateTime", "updatedDateTime") VALUES (?, ?, ?, ?)',
+        blocks()
+    )
+
+    # --- 反正規化欄位與首頁時間軸 (與 FollowService.fan_out 相同規則) ---
+    conn.execute(
+        "UPDATE user SET followers_count = (SELECT COUNT(*) FROM follow WHERE follow.followee_id = user.id)"
+    )
+    conn.execute(
+        'INSERT INTO timeline (user_id, post_id, author_id, "createdDateTime", "updatedDateTime") '
+        'SELECT owner_id, id, owner_id, "createdDateTime", "createdDateTime" FROM post WHERE parent_id IS NULL'
+    )
+    conn.execute(
+        'INSERT INTO timeline (user_id, post_id, author_id, "createdDateTime", "updatedDateTime") '
+        'SELECT follow.follower_id, post.id, post.owner_id, post."createdDateTime", post."createdDateTime" '
+        "FROM post JOIN follow ON follow.followee_id = post.owner_id JOIN user ON user.id = post.owner_id "
+        "WHERE post.parent_id IS NULL AND user.followers_count <= ?",
+        (fanout_max,)
+    )
+    counts["timeline"] = conn.execute("SELECT COUNT(*) FROM timeline").fetchone()[0]
+    return counts
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    path = os.path.abspath(args.database)
+    # 必須在載入 app 之前設定，遷移才會建在指定的檔案上
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+
+    from app.core.config import settings
+    from app.core.security import _hash_password
+    from app.database import DatabaseInitializer
+
+    started_at = time.perf_counter()
+    DatabaseInitializer.upgrade_schema()
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    # 只在載入期間關閉同步與回滾日誌，中途失敗就整個檔案重建
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    conn.execute("PRAGMA foreign_keys=OFF")
+    conn.execute("BEGIN")
+    counts = generate(conn, args, _hash_password(LOGIN_PASSWORD), settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+    conn.execute("COMMIT")
+    # 恢復應用程式使用的 WAL 模式
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    elapsed = time.perf_counter() - started_at
+    total = sum(counts.values())
+    for name, count in counts.items():
+        print(f"{name:>10}: {count:,}")
+    print(f"共 {total:,} 筆，耗時 {elapsed:.1f} 秒 ({total / elapsed:,.0f} 筆/秒)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
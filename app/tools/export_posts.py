@@ -0,0 +1,69 @@
+"""
+匯出使用者的貼文與留言 (NDJSON)
+
+與 GET /posts/export 相同的輸出：依建立時間由舊到新，每行一篇主貼文或留言，
+以資料庫游標邊讀邊寫出，資料量再大記憶體用量也固定，適合備份或搬移資料。
+未指定 --database 時使用設定 (.env) 中的 DATABASE_URL，開啟 POST_SHARDS 時會一併讀取各分片。
+
+使用方式：
+    python -m app.tools.export_posts --email user1@example.com > user1.ndjson
+    python -m app.tools.export_posts --email user1@example.com --database load.db --output user1.ndjson
+    python -m app.tools.export_posts --help
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="匯出使用者的貼文與留言 (NDJSON)")
+    parser.add_argument("--email", required=True, help="要匯出的使用者 email")
+    parser.add_argument("--database", help="SQLite 檔案路徑 (預設使用設定中的 DATABASE_URL)")
+    parser.add_argument("--output", help="輸出檔案 (預設寫到標準輸出)")
+    return parser.parse_args(argv)
+
+async def export(email: str, out) -> int | None:
+    """
+    寫出該使用者的所有貼文與留言，回傳行數；找不到使用者時回傳 None
+    """
+    from app.database import all_engines, read_session_factory
+    from app.service.post_service import PostService
+    from app.service.user_service import UserService
+
+    try:
+        async with read_session_factory() as db:
+            user = await UserService.get_user_by_email(email, db)
+            if user is None:
+                return None
+            lines = 0
+            async for chunk in PostService.export_posts(db, user.id):
+                out.write(chunk)
+                lines += chunk.count(b"\n")
+            return lines
+    finally:
+        for target in all_engines().values():
+            await target.dispose()
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    if args.database:
+        # 必須在載入 app 之前設定
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.abspath(args.database)}"
+
+    started_at = time.perf_counter()
+    if args.output:
+        with open(args.output, "wb") as out:
+            lines = asyncio.run(export(args.email, out))
+    else:
+        lines = asyncio.run(export(args.email, sys.stdout.buffer))
+        sys.stdout.buffer.flush()
+
+    if lines is None:
+        print(f"找不到使用者 {args.email}", file=sys.stderr)
+        return 1
+    print(f"已匯出 {lines} 筆 ({time.perf_counter() - started_at:.1f}s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,277 @@
+"""
+行程內壓力測試
+
+不經過網路，直接以 httpx 的 ASGITransport 呼叫 FastAPI app (含 lifespan)，
+依權重隨機打各個 API，統計每個 API 的 p50/p95/p99 延遲與吞吐量，結果存成 JSON 方便比較不同版本。
+資料請先用 app.tools.datagen 產生。
+
+使用方式：
+    python -m app.tools.loadtest --database load.db --duration 30 --concurrency 16 --output run.json
+    python -m app.tools.loadtest --database load.db --output new.json --compare old.json
+    python -m app.tools.loadtest --help
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+# 各 API 的預設權重 (大致依讀多寫少的實際流量比例)
+DEFAULT_WEIGHTS = {
+    "feed": 30,
+    "feed_cursor": 10,
+    "home": 20,
+    "detail": 20,
+    "thread": 5,
+    "search": 5,
+    "like": 8,
+    "create": 2,
+}
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="行程內壓力測試")
+    parser.add_argument("--database", required=True, help="由 app.tools.datagen 產生的 SQLite 檔案")
+    parser.add_argument("--duration", type=float, default=30, help="測試秒數 (不含暖機)")
+    parser.add_argument("--warmup", type=float, default=3, help="暖機秒數，這段時間的結果不計入")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時進行的請求數")
+    parser.add_argument("--sessions", type=int, default=50, help="登入幾位不同的使用者輪流發送請求")
+    parser.add_argument(
+        "--weights",
+        default=",".join(f"{name}={weight}" for name, weight in DEFAULT_WEIGHTS.items()),
+        help="各 API 的權重，例如 feed=1,detail=1 (未列出的不測)"
+    )
+    parser.add_argument("--output", help="結果 JSON 的輸出路徑")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+def parse_weights(value: str) -> dict[str, float]:
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_WEIGHTS:
+            raise SystemExit(f"未知的 API: {name} (可用: {', '.join(DEFAULT_WEIGHTS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    nearest-rank 百分位數
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: list[float], statuses: dict[int, int], elapsed: float) -> dict:
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "count": count,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if count else 0.0,
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+        "errors": sum(n for code, n in statuses.items() if code >= 500),
+    }
+
+def sample_dataset(path: str, seed: int) -> dict:
+    """
+    從資料庫挑出要打的貼文、使用者與游標 (直接用 sqlite3，不算進測試時間)
+    """
+    conn = sqlite3.connect(path)
+    random.seed(seed)
+    counts = {
+        name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+        for name in ("user", "post", "like", "follow", "blacklist", "timeline")
+    }
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM post").fetchone()[0] or 0
+    rowids = [random.randint(1, max_rowid) for _ in range(2000)] if max_rowid else []
+    rows = []
+    for i in range(0, len(rowids), 500):
+        chunk = rowids[i:i + 500]
+        rows += conn.execute(
+            f'SELECT id, parent_id, "createdDateTime" FROM post WHERE rowid IN ({",".join("?" * len(chunk))})',
+            chunk
+        ).fetchall()
+    emails = [
+        row[0] for row in conn.execute(
+            "SELECT email FROM user WHERE email LIKE 'load%@example.com' ORDER BY random() LIMIT 2000"
+        )
+    ]
+    conn.close()
+
+    posts = [str(uuid.UUID(row[0])) for row in rows]
+    roots = [str(uuid.UUID(row[0])) for row in rows if row[1] is None]
+    return {"counts": counts, "posts": posts, "roots": roots or posts, "rows": rows, "emails": emails}
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_requests(data: dict):
+    """
+    每個 API 回傳 (method, url, 參數) 的產生函式
+    """
+    from app.core.pagination import CursorHelper
+    from app.tools.datagen import VOCABULARY
+
+    cursors = [
+        CursorHelper.encode(datetime.fromisoformat(created), uuid.UUID(id))
+        for id, parent_id, created in data["rows"] if parent_id is None
+    ] or [None]
+
+    return {
+        "feed": lambda: ("GET", "/posts/", {"params": {"limit": 20}}),
+        "feed_cursor": lambda: ("GET", "/posts/", {"params": {"limit": 20, "cursor": random.choice(cursors)}}),
+        "home": lambda: ("GET", "/posts/home", {"params": {"limit": 20}}),
+        "detail": lambda: ("GET", f"/posts/{random.choice(data['roots'])}/", {}),
+        "thread": lambda: ("GET", f"/posts/{random.choice(data['roots'])}/thread", {}),
+        "search": lambda: ("GET", "/posts/search", {"params": {"q": random.choice(VOCABULARY)}}),
+        "like": lambda: ("POST", f"/posts/{random.choice(data['posts'])}/like", {}),
+        "create": lambda: ("POST", "/posts/create", {"json": {"content": f"壓力測試 {random.choice(VOCABULARY)}"}}),
+    }
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+    from app.core.config import settings
+    from app.main import app
+    from app.tools.datagen import LOGIN_PASSWORD
+
+    weights = parse_weights(args.weights)
+    data = sample_dataset(os.path.abspath(args.database), args.seed)
+    if not data["posts"] or not data["emails"]:
+        raise SystemExit("資料庫沒有測試資料，請先執行 python -m app.tools.datagen")
+    requests = build_requests(data)
+    names = list(weights)
+    weight_values = [weights[name] for name in names]
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            async def login(email: str) -> dict:
+                r = await client.post("/users/login", data={"username": email, "password": LOGIN_PASSWORD})
+                r.raise_for_status()
+                return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+            headers = await asyncio.gather(*(login(email) for email in data["emails"][:args.sessions]))
+
+            recording = False
+            deadline = 0.0
+
+            async def worker():
+                while time.perf_counter() < deadline:
+                    name = random.choices(names, weights=weight_values)[0]
+                    method, url, kwargs = requests[name]()
+                    started_at = time.perf_counter()
+                    r = await client.request(method, url, headers=random.choice(headers), **kwargs)
+                    elapsed = time.perf_counter() - started_at
+                    if recording:
+                        latencies[name].append(elapsed)
+                        statuses[name][r.status_code] += 1
+
+            if args.warmup > 0:
+                deadline = time.perf_counter() + args.warmup
+                await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+            recording = True
+            started_at = time.perf_counter()
+            deadline = started_at + args.duration
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started_at
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    all_statuses: dict[int, int] = defaultdict(int)
+    for codes in statuses.values():
+        for code, n in codes.items():
+            all_statuses[code] += n
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpu_count": os.cpu_count(),
+            "duration": elapsed,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "sessions": len(headers),
+            "weights": weights,
+            "dataset": data["counts"],
+            # 記錄影響效能的設定，比較時才知道兩次執行的差異
+            "settings": {
+                key: value for key, value in settings.model_dump().items()
+                if key not in ("SECRET_KEY", "DATABASE_URL")
+            },
+        },
+        "endpoints": {name: summarize(latencies[name], statuses[name], elapsed) for name in names},
+        "total": summarize(all_latencies, all_statuses, elapsed),
+    }
+
+def print_report(result: dict, baseline: dict | None = None) -> None:
+    header = f"{'endpoint':<12}{'count':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'5xx':>6}"
+    if baseline:
+        header += f"{'Δp95':>10}{'Δrps':>10}"
+    print(header)
+    rows = list(result["endpoints"].items()) + [("total", result["total"])]
+    for name, stats in rows:
+        line = (
+            f"{name:<12}{stats['count']:>8}{stats['throughput_rps']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['errors']:>6}"
+        )
+        if baseline:
+            old = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+            if old and old["count"]:
+                line += f"{percent_change(old['p95_ms'], stats['p95_ms']):>10}"
+                line += f"{percent_change(old['throughput_rps'], stats['throughput_rps']):>10}"
+        print(line)
+
+def percent_change(old: float, new: float) -> str:
+    if not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    # 必須在載入 app 之前設定
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.abspath(args.database)}"
+    random.seed(args.seed)
+
+    result = asyncio.run(run(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+        print(f"\n結果已儲存至 {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,219 @@
+"""
+查詢計畫回歸檢查
+
+在暫存的 SQLite 資料庫上執行 Alembic 遷移與少量測試資料，逐一呼叫各 Service 方法，
+攔截實際送出的 SQL，再以 EXPLAIN QUERY PLAN 檢查是否有整張資料表掃描 (full table scan)。
+走完整個索引的掃描 (SCAN ... USING INDEX) 也算，除非是由 LIMIT 與索引順序限制住的分頁掃描。
+有任何一句 SQL 掃描整張表就以 exit code 1 結束，可放進 CI；ACCEPTED_SCANS 列出已知且可接受的例外。
+
+使用方式：
+    python -m app.tools.query_plan_check        # 只列出結果
+    python -m app.tools.query_plan_check -v     # 一併列出每句 SQL 的查詢計畫
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+# 必須在載入 app 之前設定：改用暫存資料庫、單一連線池，並關閉黑名單快取讓查詢真的送到 DB
+_tmp_dir = tempfile.mkdtemp(prefix="query_plan_check_")
+_db_path = os.path.join(_tmp_dir, "plan_check.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_path}"
+os.environ["SQLITE_PROFILE"] = "default"
+os.environ["BLACKLIST_CACHE_ENABLED"] = "false"
+
+from sqlalchemy import event, select
+
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.pagination import CursorHelper
+from app.database import DatabaseInitializer, async_session_factory, engine
+from app.models import Blacklist, Follow, Like, Post, User
+from app.schemas.post import PostCreate
+from app.schemas.user import UserCreate, UserLogin
+from app.service.black_list_service import BlacklistService
+from app.service.follow_service import FollowService
+from app.service.like_counter import like_counter_compactor
+from app.service.post_service import PostService
+from app.service.user_service import UserService
+
+# 沒有使用索引的整表掃描，例如 "SCAN post"
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# 依索引順序讀過整個索引，例如 "SCAN user USING INDEX ix_user_createdDateTime"
+INDEX_SCAN = re.compile(r"^SCAN (\w+) USING (?:COVERING )?INDEX \w+$")
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+CTE_NAME = re.compile(r"\bWITH(?: RECURSIVE)? (\w+)", re.IGNORECASE)
+# 子查詢先物化成暫存結果，例如 "MATERIALIZE anon_1" (之後的 "SCAN anon_1" 讀的是暫存結果，讀取資料表的步驟另外列出)
+MATERIALIZED = re.compile(r"^MATERIALIZE (\w+)$")
+DML = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# 已知會掃描、但可以接受的呼叫 -> 原因 (仍會列出，不算失敗)
+ACCEPTED_SCANS = {
+    "UserService.get_users(name)": "名稱以子字串 (LIKE '%x%') 搜尋，索引無法使用；只有管理員能呼叫，且依建立時間分頁",
+}
+
+captured: list[tuple[str, tuple]] = []
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith(DML) and not executemany:
+        captured.append((statement, tuple(parameters or ())))
+
+async def seed() -> dict:
+    """
+    建立最少量的資料，讓每個 Service 方法都會走到完整的查詢路徑
+    """
+    async with async_session_factory() as db:
+        alice = User(name="alice", email="alice@example.com", password="x")
+        bob = User(name="bob", email="bob@example.com", password="x")
+        carol = User(name="carol", email="carol@example.com", password="x")
+        db.add_all([alice, bob, carol])
+        await db.flush()
+        root = Post(content="root", owner_id=alice.id)
+        db.add(root)
+        await db.flush()
+        comment = Post(content="comment", owner_id=bob.id, parent_id=root.id)
+        db.add(comment)
+        await db.flush()
+        reply = Post(content="reply", owner_id=alice.id, parent_id=comment.id)
+        db.add_all([
+            reply,
+            Like(user_id=bob.id, post_id=root.id),
+            Follow(follower_id=bob.id, followee_id=alice.id),
+            Blacklist(user_id=carol.id, blocked_user_id=bob.id)
+        ])
+        await db.commit()
+        return {"alice": alice, "bob": bob, "carol": carol, "root": root, "comment": comment}
+
+async def drain(stream) -> None:
+    async for _ in stream:
+        pass
+
+async def refollow_at_fanout_limit(db, follower, followee) -> None:
+    """
+    重新追蹤後再取消，取消時追蹤者數量剛好降回 fan-out 門檻，會走到回填所有追蹤者時間軸的路徑
+    """
+    await FollowService.follow(follower.id, followee.id, db)
+    followers_count = await db.scalar(select(User.followers_count).where(User.id == followee.id))
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    settings.TIMELINE_FANOUT_MAX_FOLLOWERS = followers_count - 1
+    try:
+        await FollowService.unfollow(follower.id, followee.id, db)
+    finally:
+        settings.TIMELINE_FANOUT_MAX_FOLLOWERS = limit
+
+def service_calls(data: dict) -> list:
+    alice, bob, carol = data["alice"], data["bob"], data["carol"]
+    root, comment = data["root"], data["comment"]
+    cursor = CursorHelper.encode(root.createdDateTime, root.id)
+    return [
+        ("PostService.get_posts", lambda db: PostService.get_posts(db, alice.id)),
+        ("PostService.get_posts(cursor)", lambda db: PostService.get_posts(db, alice.id, cursor=cursor)),
+        ("PostService.get_by_id", lambda db: PostService.get_by_id(db, root.id, alice.id)),
+        ("PostService.get_by_ids", lambda db: PostService.get_by_ids(db, [root.id, comment.id], alice.id)),
+        ("PostService.get_thread", lambda db: PostService.get_thread(db, root.id, alice.id)),
+        ("PostService.get_thread(cursor)", lambda db: PostService.get_thread(db, root.id, alice.id, cursor=cursor)),
+        ("PostService.get_liked_post_ids", lambda db: PostService.get_liked_post_ids(db, bob.id, [root.id, comment.id])),
+        ("PostService.check_post", lambda db: PostService.check_post(db, root.id)),
+        ("PostService.get_owner_id", lambda db: PostService.get_owner_id(db, root.id)),
+        ("PostService.is_comment_belong_to_post", lambda db: PostService.is_comment_belong_to_post(db, root.id, comment.id)),
+        ("PostService.get_home_posts", lambda db: PostService.get_home_posts(db, bob.id)),
+        ("PostService.get_home_posts(cursor)", lambda db: PostService.get_home_posts(db, bob.id, cursor=cursor)),
+        ("PostService.search_posts", lambda db: PostService.search_posts(db, alice.id, "root")),
+        ("PostService.search_posts(cursor)", lambda db: PostService.search_posts(db, alice.id, "root", cursor=CursorHelper.encode_rank(-1.0, root.id))),
+        ("PostService.search_posts(short)", lambda db: PostService.search_posts(db, alice.id, "root ro")),
+        ("PostService.search_posts(short only)", lambda db: PostService.search_posts(db, alice.id, "ro")),
+        ("PostService.search_posts(short only, cursor)", lambda db: PostService.search_posts(db, alice.id, "ro", cursor=cursor)),
+        ("PostService.export_posts", lambda db: drain(PostService.export_posts(db, alice.id))),
+        ("PostService.create_post", lambda db: PostService.create_post(db, PostCreate(content="new", parent_id=root.id), alice.id)),
+        ("PostService.create_post(root)", lambda db: PostService.create_post(db, PostCreate(content="new"), alice.id)),
+        ("PostService.set_top_comment", lambda db: PostService.set_top_comment(db, root.id, alice.id, comment.id)),
+        ("PostService.toggle_like(like)", lambda db: PostService.toggle_like(db, comment.id, alice.id)),
+        ("PostService.toggle_like(unlike)", lambda db: PostService.toggle_like(db, comment.id, alice.id)),
+        ("PostService.set_likes", lambda db: PostService.set_likes(db, bob.id, {root.id: True, comment.id: False})),
+        ("LikeCounterCompactor.compact", lambda db: like_counter_compactor.compact()),
+        ("BlacklistService.get_blocked_ids", lambda db: BlacklistService.get_blocked_ids(bob.id, db)),
+        ("BlacklistService.is_blocked", lambda db: BlacklistService.is_blocked(alice.id, bob.id, db)),
+        ("BlacklistService.block_user", lambda db: BlacklistService.block_user(alice.id, carol.id, db)),
+        ("BlacklistService.unblock_user", lambda db: BlacklistService.unblock_user(alice.id, carol.id, db)),
+        ("FollowService.is_following", lambda db: FollowService.is_following(carol.id, alice.id, db)),
+        ("FollowService.follow", lambda db: FollowService.follow(carol.id, alice.id, db)),
+        ("FollowService.get_following", lambda db: FollowService.get_following(carol.id, db)),
+        ("FollowService.get_followers", lambda db: FollowService.get_followers(alice.id, db)),
+        ("FollowService.unfollow", lambda db: FollowService.unfollow(carol.id, alice.id, db)),
+        ("FollowService.unfollow(fan-out limit)", lambda db: refollow_at_fanout_limit(db, carol, alice)),
+        ("UserService.get_user_by_id", lambda db: UserService.get_user_by_id(alice.id, db)),
+        ("UserService.get_user_by_email", lambda db: UserService.get_user_by_email(alice.email, db)),
+        ("UserService.get_users", lambda db: UserService.get_users(db)),
+        ("UserService.get_users(name)", lambda db: UserService.get_users(db, "ali")),
+        ("UserService.create_user", lambda db: UserService.create_user(UserCreate(email="dave@example.com", password="password123", name="dave"), db)),
+        ("UserService.authenticate_user", lambda db: UserService.authenticate_user(UserLogin(email="dave@example.com", password="password123"), db)),
+        ("InvalidationBus._poll", lambda db: invalidation_bus._poll()),
+        ("InvalidationBus._prune", lambda db: invalidation_bus._prune()),
+    ]
+
+def explain(conn: sqlite3.Connection, statement: str, parameters: tuple) -> list[str]:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+def bounded_index_scan(statement: str, plan: list[str], table: str) -> bool:
+    """
+    索引掃描由 LIMIT 與索引順序限制住時才不算整表掃描：語句有 LIMIT、排序與分組不需要暫存 B-tree，
+    而且 WHERE 沒有只能逐筆過濾這張表的條件 (WHERE 提到這張表時，計畫中要另有以索引 SEARCH 它的步驟)，
+    否則符合條件的資料很少時會讀完整個索引
+    """
+    if not LIMIT.search(statement) or any(detail.startswith("USE TEMP B-TREE") for detail in plan):
+        return False
+    filtered = re.search(rf"\bWHERE\b.*\b\"?{table}\"?\.", statement, re.IGNORECASE | re.DOTALL)
+    return not filtered or any(detail.startswith(f"SEARCH {table} ") for detail in plan)
+
+def scans(statement: str, plan: list[str]) -> list[str]:
+    derived = set(CTE_NAME.findall(statement))
+    derived.update(m.group(1) for detail in plan if (m := MATERIALIZED.match(detail)))
+    found = []
+    for detail in plan:
+        if (m := FULL_SCAN.match(detail)) and m.group(1) not in derived:
+            found.append(detail)
+        elif (m := INDEX_SCAN.match(detail)) and not bounded_index_scan(statement, plan, m.group(1)):
+            found.append(detail)
+    return found
+
+async def run(verbose: bool) -> int:
+    await asyncio.get_running_loop().run_in_executor(None, DatabaseInitializer.upgrade_schema)
+    data = await seed()
+
+    conn = sqlite3.connect(_db_path)
+    failures = 0
+    for label, call in service_calls(data):
+        captured.clear()
+        async with async_session_factory() as db:
+            await call(db)
+        problems = []
+        for statement, parameters in captured:
+            plan = explain(conn, statement, parameters)
+            found = scans(statement, plan)
+            if found:
+                problems.append((statement, plan, found))
+            if verbose:
+                print(f"    {' '.join(statement.split())}")
+                for detail in plan:
+                    print(f"      - {detail}")
+        accepted = ACCEPTED_SCANS.get(label)
+        status = ("accepted" if accepted else "FAIL") if problems else "ok"
+        print(f"[{status}] {label} ({len(captured)} statements)")
+        if problems and accepted:
+            print(f"    {accepted}")
+        for statement, plan, found in problems:
+            if not accepted:
+                failures += 1
+            print(f"    full scan: {', '.join(found)}")
+            print(f"    {' '.join(statement.split())}")
+    conn.close()
+    await engine.dispose()
+
+    print(f"\n{failures} statement(s) with full table scans" if failures else "\nno full table scans")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run("-v" in sys.argv[1:])))
@@ -0,0 +1,168 @@
+"""
+回應序列化的微基準測試
+
+比較列表 (PostSimple) 與貼文內容 (PostPublic) 兩種輸出方式的 CPU 時間：
+    pydantic：原本的路徑。由 ORM 物件建立 Pydantic 模型 (作者以 from_attributes 驗證)，
+              再模擬 FastAPI 依 response_model 驗證一次、轉成 JSON 模式的 dict，最後以標準庫 json 編碼。
+    fast：    app.core.serialization 的快速路徑。由資料列直接組成 dict，以 orjson 編碼。
+兩種輸出會先比對是否逐位元組相同，不同就以 exit code 1 結束。不需要資料庫。
+
+使用方式：
+    python -m app.tools.serialization_bench
+    python -m app.tools.serialization_bench --items 100 --comments 50 --rounds 500
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core import serialization
+from app.models.user import UserRole
+from app.schemas.post import PostPublic, PostSimple
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="回應序列化的微基準測試")
+    parser.add_argument("--items", type=int, default=100, help="列表一頁的貼文數")
+    parser.add_argument("--comments", type=int, default=50, help="貼文內容的留言數")
+    parser.add_argument("--rounds", type=int, default=300, help="每種方式重複幾次")
+    return parser.parse_args(argv)
+
+def make_rows(n: int) -> list[SimpleNamespace]:
+    """
+    模擬查詢結果：欄位與 ORM 的 Post 相同，user 為作者
+    """
+    base = datetime(2026, 1, 1, 8, 0, 0)
+    users = [
+        SimpleNamespace(id=uuid.uuid4(), email=f"user{i}@example.com", name=f"使用者{i}", role=UserRole.USER)
+        for i in range(20)
+    ]
+    rows = []
+    for i in range(n):
+        user = users[i % len(users)]
+        rows.append(SimpleNamespace(
+            id=uuid.uuid4(),
+            content=f"今天天氣很好，週末去爬山 #{i} " + "內容" * (i % 30),
+            createdDateTime=base + timedelta(seconds=i * 37),
+            updatedDateTime=base + timedelta(seconds=i * 37),
+            likes_count=i * 3,
+            version=i,
+            owner_id=user.id,
+            email=user.email,
+            name=user.name,
+            role=user.role,
+            user=user
+        ))
+    return rows
+
+def pydantic_feed(rows, adapter: TypeAdapter) -> bytes:
+    items = [
+        PostSimple(
+            id=r.id,
+            content=r.content,
+            owner=r.user,
+            createdDateTime=r.createdDateTime,
+            likes_count=r.likes_count,
+            is_liked=i % 2 == 0
+        )
+        for i, r in enumerate(rows)
+    ]
+    # FastAPI 的 serialize_response：依 response_model 再驗證一次並轉成 JSON 模式，再交給 JSONResponse
+    content = adapter.dump_python(adapter.validate_python(items), mode="json")
+    return JSONResponse(content).body
+
+def fast_feed(rows) -> bytes:
+    items = [
+        serialization.post_simple(
+            r.id,
+            r.content,
+            serialization.user_public(r.owner_id, r.email, r.name, r.role),
+            r.createdDateTime,
+            r.likes_count,
+            i % 2 == 0
+        )
+        for i, r in enumerate(rows)
+    ]
+    return serialization.json_response(items).body
+
+def pydantic_detail(post, comments, adapter: TypeAdapter) -> bytes:
+    result = PostPublic(
+        id=post.id,
+        content=post.content,
+        owner=post.user,
+        createdDateTime=post.createdDateTime,
+        updatedDateTime=post.updatedDateTime,
+        likes_count=post.likes_count,
+        is_liked=True,
+        top_comment=PostSimple.model_validate(comments[0]),
+        comment=[PostSimple.model_validate(c) for c in comments[1:]]
+    )
+    content = adapter.dump_python(adapter.validate_python(result), mode="json")
+    return JSONResponse(content).body
+
+def fast_detail(post, comments) -> bytes:
+    def simple(r, is_liked: bool) -> dict:
+        owner = serialization.user_public(r.owner_id, r.email, r.name, r.role)
+        return serialization.post_simple(r.id, r.content, owner, r.createdDateTime, r.likes_count, is_liked)
+
+    data = serialization.post_public(
+        simple(post, True),
+        post.updatedDateTime,
+        None,
+        simple(comments[0], False),
+        [simple(c, False) for c in comments[1:]]
+    )
+    return serialization.json_response(data).body
+
+def measure(fn, rounds: int) -> float:
+    """
+    回傳每次呼叫的平均秒數 (先執行幾次暖機)
+    """
+    for _ in range(min(rounds, 20)):
+        fn()
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started_at) / rounds
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    feed_rows = make_rows(args.items)
+    detail_rows = make_rows(args.comments + 1)
+    post, comments = detail_rows[0], detail_rows[1:] or detail_rows[:1]
+    feed_adapter = TypeAdapter(list[PostSimple])
+    detail_adapter = TypeAdapter(PostPublic)
+
+    cases = [
+        (
+            f"feed ({args.items} 則)",
+            lambda: pydantic_feed(feed_rows, feed_adapter),
+            lambda: fast_feed(feed_rows)
+        ),
+        (
+            f"detail ({len(comments)} 則留言)",
+            lambda: pydantic_detail(post, comments, detail_adapter),
+            lambda: fast_detail(post, comments)
+        ),
+    ]
+
+    print(f"{'case':<24}{'pydantic µs':>14}{'fast µs':>12}{'speedup':>10}{'bytes':>10}")
+    for name, slow, fast in cases:
+        expected, actual = slow(), fast()
+        if expected != actual:
+            print(f"{name}: 輸出不一致\n  pydantic: {expected[:200]!r}\n  fast:     {actual[:200]!r}")
+            return 1
+        slow_time = measure(slow, args.rounds)
+        fast_time = measure(fast, args.rounds)
+        print(
+            f"{name:<24}{slow_time * 1e6:>14.1f}{fast_time * 1e6:>12.1f}"
+            f"{slow_time / fast_time:>9.1f}x{len(actual):>10}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
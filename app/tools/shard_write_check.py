@@ -0,0 +1,91 @@
+"""
+分片寫入並行檢查
+
+在暫存的 SQLite 資料庫上開啟兩個貼文分片，讓其中一個分片 (或主資料庫) 的寫入交易保持開啟，
+同時在另一個分片與主資料庫寫入並提交。分片的寫入鎖若互相影響 (例如寫入連線 ATTACH 了主資料庫，
+BEGIN IMMEDIATE 會一併鎖住所有掛上的檔案)，另一邊的寫入會等到 busy_timeout 後以 "database is locked" 失敗。
+任何一項被擋住就以 exit code 1 結束，可放進 CI。
+
+使用方式：
+    python -m app.tools.shard_write_check
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 必須在載入 app 之前設定：改用暫存資料庫與兩個分片，busy_timeout 縮短讓被擋住的寫入很快失敗
+_tmp_dir = tempfile.mkdtemp(prefix="shard_write_check_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp_dir, 'shard_check.db')}"
+os.environ["POST_SHARDS"] = "2"
+os.environ["SQLITE_BUSY_TIMEOUT_MS"] = "500"
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import DatabaseInitializer, all_engines, async_session_factory, new_post_id, shard_session_factories
+from app.models import Post, User
+
+async def write_user(db: AsyncSession, name: str) -> None:
+    db.add(User(name=name, email=f"{name}@example.com", password="x"))
+    await db.flush()
+
+async def write_post(db: AsyncSession, shard: int, owner_id) -> None:
+    db.add(Post(id=new_post_id(shard), content="shard write check", owner_id=owner_id))
+    await db.flush()
+
+async def check(label: str, holder, hold, writer, write) -> bool:
+    """
+    holder 的寫入交易保持開啟 (尚未提交) 時，writer 能否寫入並提交
+    """
+    async with holder() as held:
+        await hold(held)
+        started_at = time.perf_counter()
+        try:
+            async with writer() as db:
+                await write(db)
+                await db.commit()
+        except Exception as e:
+            print(f"[FAIL] {label}: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+            return False
+        finally:
+            await held.rollback()
+    print(f"[ok] {label} ({(time.perf_counter() - started_at) * 1000:.1f} ms)")
+    return True
+
+async def run() -> int:
+    await asyncio.get_running_loop().run_in_executor(None, DatabaseInitializer.upgrade_schema)
+    await DatabaseInitializer.init_shards()
+    async with async_session_factory() as db:
+        owner = User(name="owner", email="owner@example.com", password="x")
+        db.add(owner)
+        await db.commit()
+
+    shard0, shard1 = shard_session_factories
+    results = [
+        await check(
+            "shard0 寫入中，shard1 寫入", shard0, lambda db: write_post(db, 0, owner.id),
+            shard1, lambda db: write_post(db, 1, owner.id)
+        ),
+        await check(
+            "shard1 寫入中，shard0 寫入", shard1, lambda db: write_post(db, 1, owner.id),
+            shard0, lambda db: write_post(db, 0, owner.id)
+        ),
+        await check(
+            "shard0 寫入中，主資料庫寫入", shard0, lambda db: write_post(db, 0, owner.id),
+            async_session_factory, lambda db: write_user(db, "main_writer")
+        ),
+        await check(
+            "主資料庫寫入中，shard1 寫入", async_session_factory, lambda db: write_user(db, "main_holder"),
+            shard1, lambda db: write_post(db, 1, owner.id)
+        ),
+    ]
+    for target in all_engines().values():
+        await target.dispose()
+
+    failures = results.count(False)
+    print(f"\n{failures} write(s) blocked by another database's lock" if failures else "\nshard writes do not block each other")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))